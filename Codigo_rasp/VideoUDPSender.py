@@ -5,12 +5,64 @@ import numpy as np
 import time
 import threading
 import random
+import select
+from collections import deque
+
+
+class ClockEstimator:
+    """
+    Estima RTT, desfase de reloj y jitter a partir de intercambios ping/pong (estilo NTP)
+
+    Cada muestra usa cuatro marcas de tiempo: t0 (envío del sync, reloj emisor),
+    t1 (recepción en el receptor), t2 (envío del pong, reloj receptor) y t3
+    (recepción del pong, reloj emisor).
+    """
+    WINDOW = 8  # Muestras recientes usadas para elegir el desfase
+
+    def __init__(self):
+        self.samples = deque(maxlen=self.WINDOW)  # (rtt, desfase)
+        self.srtt = None  # RTT suavizado
+        self.rttvar = 0.0  # Variación del RTT (jitter)
+        self.offset = None  # Desfase reloj receptor - reloj emisor
+
+    def add_sample(self, t0, t1, t2, t3):
+        """Añade una muestra de un intercambio ping/pong completo"""
+        rtt = max(0.0, (t3 - t0) - (t2 - t1))
+        offset = ((t1 - t0) + (t2 - t3)) / 2.0
+        self.samples.append((rtt, offset))
+
+        # Suavizado como en el cálculo de RTO de TCP (RFC 6298)
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2.0
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+        # El desfase de la muestra con menor RTT es el menos afectado por colas
+        self.offset = min(self.samples)[1]
+
+    def get_estimate(self):
+        """Devuelve las estimaciones actuales o None si aún no hay muestras"""
+        if self.srtt is None:
+            return None
+        return {
+            'rtt': self.srtt,
+            'offset': self.offset,
+            'jitter': self.rttvar,
+            'one_way_delay': min(self.samples)[0] / 2.0,
+            'samples': len(self.samples)
+        }
+
 
 class VideoUDPSender:
     MAX_SEQUENCE_NUMBER = 5000
     SYNC_INTERVAL = 3.0  # Segundos entre mensajes de sincronizacion
+    TRANSPORT_MODES = ('jpeg', 'delta')  # Modos de transporte soportados
+    DELTA_SIZE = (160, 120)  # Resolución reducida para comparar frames en modo delta
 
-    def __init__(self, host='localhost', port=5000, max_packet_size=60000, jpeg_quality=60):
+    def __init__(self, host='localhost', port=5000, max_packet_size=60000, jpeg_quality=60,
+                 transport_mode='jpeg', pixel_threshold=15, skip_ratio=0.0005, keyframe_interval=30):
         """
         Emisor de video UDP con numero de secuencia para reordenar frames y sync periódico
         
@@ -18,11 +70,28 @@ class VideoUDPSender:
             host: Dirección IP destino
             port: Puerto UDP destino  
             max_packet_size: Tamaño máximo por paquete UDP (bytes)
+            jpeg_quality: Calidad JPEG (1-100)
+            transport_mode: 'jpeg' envía todos los frames completos, 'delta' sustituye
+                los frames casi idénticos al último keyframe por un paquete 'repeat'
+            pixel_threshold: Diferencia (0-255) para considerar que un píxel de la
+                miniatura ha cambiado respecto al último keyframe
+            skip_ratio: Fracción de píxeles cambiados por debajo de la cual un frame se
+                considera repetido en modo delta. Se decide por píxeles y no por la
+                diferencia media para que un objeto pequeño (un peatón lejano) no se
+                diluya en el resto del frame
+            keyframe_interval: Máximo de repeticiones seguidas antes de forzar un keyframe
         """
+        if transport_mode not in self.TRANSPORT_MODES:
+            raise ValueError(f"transport_mode debe ser uno de {self.TRANSPORT_MODES}")
+
         self.host = host # Dirección IP destino
         self.port = port # Puerto UDP destino
         self.max_packet_size = max_packet_size # Tamaño máximo por paquete UDP
         self.jpeg_quality = jpeg_quality # Calidad JPEG (1-100)
+        self.transport_mode = transport_mode # Modo de transporte
+        self.pixel_threshold = pixel_threshold # Diferencia para considerar un píxel cambiado
+        self.skip_ratio = skip_ratio # Fracción de píxeles cambiados para repetir frame
+        self.keyframe_interval = keyframe_interval # Repeticiones máximas entre keyframes
         self.socket = None # Socket UDP
         self.sequence_number = 0  # Secuencia inicial
         self.frame_count = 0 # Contador de frames enviados
@@ -34,6 +103,14 @@ class VideoUDPSender:
         self.last_sync_time = 0
         self.is_streaming = False
         self.sync_thread = None
+        self.pong_thread = None
+        self.clock = ClockEstimator()  # Estimación de RTT y desfase con el receptor
+
+        # Variables para el modo delta
+        self.last_key_thumb = None  # Miniatura del último keyframe enviado
+        self.last_key_sequence = None  # Secuencia del último keyframe enviado
+        self.repeats_since_key = 0  # Repeticiones enviadas desde el último keyframe
+        self.frames_skipped = 0  # Total de frames sustituidos por 'repeat'
 
         # Configurar el socket inmediatamente
         if self.setup_udp_socket():
@@ -63,8 +140,10 @@ class VideoUDPSender:
             return
             
         self.is_streaming = True
-        self.sync_thread = threading.Thread(target=self._sync_worker, daemon=True)
+        self.sync_thread = threading.Thread(target=self._sync_worker, name="udp-sync", daemon=True)
         self.sync_thread.start()
+        self.pong_thread = threading.Thread(target=self._pong_worker, name="udp-pong", daemon=True)
+        self.pong_thread.start()
         print("Envío de mensajes de sincronizacion periódicos iniciado")
 
     def stop_periodic_sync(self):
@@ -72,15 +151,44 @@ class VideoUDPSender:
         self.is_streaming = False
         if self.sync_thread and self.sync_thread.is_alive():
             self.sync_thread.join(timeout=1.0)
+        if self.pong_thread and self.pong_thread.is_alive():
+            self.pong_thread.join(timeout=1.0)
         print("DDetenido envío de mensajes de sincronizacion periódicos")
 
 
-    def send_sync(self, is_new_stream=False):
+    def _pong_worker(self):
+        """Hilo que recibe los pong del receptor y actualiza la estimación de reloj"""
+        while self.is_streaming:
+            sock = self.socket
+            if sock is None:
+                time.sleep(0.5)
+                continue
+            try:
+                readable, _, _ = select.select([sock], [], [], 0.5)
+                if not readable:
+                    continue
+                data, _ = sock.recvfrom(4096)
+                t3 = time.time()
+                pong = pickle.loads(data)
+            except Exception:
+                continue  # Socket cerrado o paquete no válido
+
+            if pong.get('type') != 'pong' or pong.get('stream_id') != self.stream_id:
+                continue
+            self.clock.add_sample(pong['t0'], pong['t1'], pong['t2'], t3)
+
+    def get_clock_estimate(self):
+        """Devuelve RTT, desfase y jitter estimados con el receptor (o None)"""
+        return self.clock.get_estimate()
+
+    def send_sync(self, is_new_stream=False, heartbeat=False, motion_stats=None):
         """
         Envía mensaje de sincronización
         
         Argumentos:
             is_new_stream: Si es True, indica reinicio de stream
+            heartbeat: Si es True, es un latido enviado mientras no se envían frames
+            motion_stats: Estadísticas del detector de movimiento a adjuntar
         """
         if self.socket is None:
             if not self.setup_udp_socket():
@@ -93,15 +201,21 @@ class VideoUDPSender:
             'stream_id': self.stream_id,
             'frame_count': self.frame_count,
             'timestamp': time.time(),
-            'is_new_stream': is_new_stream
+            'is_new_stream': is_new_stream,
+            'heartbeat': heartbeat
         }
+        if motion_stats is not None:
+            sync_message['motion'] = motion_stats
+        clock = self.clock.get_estimate()
+        if clock is not None:
+            sync_message['clock'] = clock  # El receptor usa estas estimaciones
         
         try:
             self.socket.sendto(pickle.dumps(sync_message), (self.host, self.port))
             
             if is_new_stream:
                 print(f"Sincronización inicial - Stream: {self.stream_id}, Secuencia: {self.sequence_number}")
-            else:
+            elif not heartbeat:
                 # Logear cada 2 mensajes de sync
                 if self.sync_sequence % 2 == 0:
                     print(f"Sincronización periódica número {self.sync_sequence} - Frame: {self.sequence_number}")
@@ -114,12 +228,20 @@ class VideoUDPSender:
 
 
 
-    def send_frame(self, frame: np.ndarray) -> bool:
+    def send_heartbeat(self, motion_stats=None):
+        """
+        Envía un latido (sync ligero) para indicar que el emisor sigue activo
+        aunque no se estén enviando frames por falta de movimiento
+        """
+        self.send_sync(is_new_stream=False, heartbeat=True, motion_stats=motion_stats)
+
+    def send_frame(self, frame: np.ndarray, capture_time: float = None) -> bool:
         """
         Envía un frame via UDP con número de secuencia consecutivo
         
         Argumentos:
             frame: Frame de video como numpy array
+            capture_time: Instante de captura del frame (time.time()); por defecto, ahora
             
         Devuelve:
             bool: True si se envió correctamente
@@ -128,6 +250,9 @@ class VideoUDPSender:
         if self.socket is None:
             if not self.setup_udp_socket():
                 return False
+
+        if capture_time is None:
+            capture_time = time.time()
         
         # Iniciar la sincronización periódica si no está activa al enviar el primer frame
         if not self.is_streaming:
@@ -137,8 +262,16 @@ class VideoUDPSender:
         if self.sequence_number >= self.MAX_SEQUENCE_NUMBER:
             print(f"LÍMITE ALCANZADO: Reiniciando secuencia de {self.sequence_number} a 0")
             self.sequence_number = 0
+            self.last_key_thumb = None  # Forzar keyframe tras el reinicio
             self.send_sync(is_new_stream=True)  # Mensaje de sincronización de reinicio
 
+        # En modo delta, los frames casi idénticos al último keyframe no se codifican
+        thumb = None
+        if self.transport_mode == 'delta':
+            thumb = self._make_thumb(frame)
+            if self._is_repeat(thumb):
+                return self._send_repeat(capture_time)
+
         try:
             # Codificar frame a JPEG
             encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality]
@@ -155,6 +288,7 @@ class VideoUDPSender:
                 'sequence': self.sequence_number,  #id para reordenar
                 'jpeg_data': jpeg_data, # Datos JPEG
                 'timestamp': time.time(), # Marca de tiempo
+                'capture_time': capture_time, # Instante de captura
                 'frame_shape': frame.shape, # Forma del frame
                 'frame_count': self.frame_count, # Contador de frames enviados
                 'stream_id': self.stream_id # id del stream
@@ -165,12 +299,18 @@ class VideoUDPSender:
             
             # Verificar si necesita fragmentación
             if len(data) > self.max_packet_size:
-                success = self._send_fragmented(frame)
+                success = self._send_fragmented(frame, capture_time)
             else:
                 self.socket.sendto(data, (self.host, self.port))
                 success = True
             
             if success:
+                # Recordar el keyframe para comparar los siguientes frames
+                if thumb is not None:
+                    self.last_key_thumb = thumb
+                    self.last_key_sequence = self.sequence_number
+                    self.repeats_since_key = 0
+
                 # INCREMENTAR secuencia después de enviar exitosamente
                 self.sequence_number += 1
                 self.frame_count += 1
@@ -187,7 +327,51 @@ class VideoUDPSender:
             print(f"Error enviando frame: {e}")
             return False
 
-    def _send_fragmented(self, frame: np.ndarray) -> bool:
+    def _make_thumb(self, frame: np.ndarray) -> np.ndarray:
+        """Miniatura en escala de grises usada para comparar frames en modo delta"""
+        thumb = cv2.resize(frame, self.DELTA_SIZE, interpolation=cv2.INTER_AREA)
+        if thumb.ndim == 3:
+            thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+        return thumb
+
+    def _is_repeat(self, thumb: np.ndarray) -> bool:
+        """Indica si el frame es casi idéntico al último keyframe enviado"""
+        if self.last_key_thumb is None:
+            return False
+        if self.repeats_since_key >= self.keyframe_interval:
+            return False  # Refrescar periódicamente aunque la escena no cambie
+        diff = cv2.absdiff(thumb, self.last_key_thumb)
+        changed_pixels = cv2.countNonZero(
+            cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1]
+        )
+        return changed_pixels < self.skip_ratio * diff.size
+
+    def _send_repeat(self, capture_time: float) -> bool:
+        """
+        Envía un paquete 'repeat' que indica al receptor que reutilice el último keyframe
+        """
+        message = {
+            'type': 'repeat',
+            'sequence': self.sequence_number,
+            'ref_sequence': self.last_key_sequence,  # Keyframe a reutilizar
+            'timestamp': time.time(),
+            'capture_time': capture_time,
+            'frame_count': self.frame_count,
+            'stream_id': self.stream_id
+        }
+        try:
+            self.socket.sendto(pickle.dumps(message), (self.host, self.port))
+        except Exception as e:
+            print(f"Error enviando repeat: {e}")
+            return False
+
+        self.sequence_number += 1
+        self.frame_count += 1
+        self.repeats_since_key += 1
+        self.frames_skipped += 1
+        return True
+
+    def _send_fragmented(self, frame: np.ndarray, capture_time: float = None) -> bool:
         """
         Envía un frame fragmentado con la misma secuencia para todos los fragmentos
         """
@@ -213,6 +397,8 @@ class VideoUDPSender:
             start_message = {
                 'total_packets': total_packets,
                 'sequence': self.sequence_number,  # Misma secuencia para todos los fragmentos
+                'timestamp': time.time(),
+                'capture_time': capture_time,
                 'frame_shape': frame.shape,
                 'frame_count': self.frame_count,
                 'stream_id': self.stream_id
@@ -284,12 +470,17 @@ class VideoUDPSender:
         """Retorna estadísticas de envío"""
         return {
             'frames_sent': self.frame_count,
+            'frames_skipped': self.frames_skipped,
+            'transport_mode': self.transport_mode,
+            'clock': self.clock.get_estimate(),
             'current_sequence': self.sequence_number,
             'target': f"{self.host}:{self.port}"
         }
 
     def release(self):
         """Cierra la conexión UDP"""
+        if self.is_streaming:
+            self.stop_periodic_sync()
         if self.socket:
             self.socket.close()
             self.socket = None
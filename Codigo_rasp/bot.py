@@ -1,7 +1,10 @@
 from telegram.ext import ApplicationBuilder, CommandHandler
-import subprocess
+import asyncio
 import io
-from staticmap import StaticMap, CircleMarker
+from gps_service import SOCKET_PATH, fix_from_json
+from map_cache import MapRenderer
+from posicion import MAX_FIX_AGE, leer_modem
+from supervisor import Supervisor, Worker
 
 TOKEN = "" # TOKEN eliminado por seguridad
 
@@ -11,7 +14,16 @@ PYTHON_ENV = "/home/grupo4/entorno/bin/python3"
 # Scripts
 UDP_SCRIPT = "/home/grupo4/camera_UDP/UDP_envio_def/main.py"
 GPS_SCRIPT = "/home/grupo4/gps.py"
-POS_SCRIPT = "/home/grupo4/posicion.py"
+
+# Procesos lanzados desde el bot: se vigilan, se relanzan si fallan y se paran
+# junto con todos sus hijos
+supervisor = Supervisor()
+supervisor.add(Worker("cam", [PYTHON_ENV, UDP_SCRIPT]))
+supervisor.add(Worker("gps", [PYTHON_ENV, GPS_SCRIPT]))
+supervisor.add(Worker("5G", ["sudo", "waveshare-CM"]))
+
+# Mapas de /posicion (teselas e imágenes cacheadas en disco)
+map_renderer = MapRenderer()
 
 
 
@@ -37,7 +49,8 @@ async def comandos_handler(update, context):
         "/gps — Iniciar GPS\n"
         "/gpsstop — Parar GPS\n"
         "/posicion — Obtener mapa con coordenada actual\n"
-        "/5G — Activar 5G\n",
+        "/5G — Activar 5G\n"
+        "/status — Estado de los procesos\n",
         parse_mode="Markdown"
     )
 
@@ -48,7 +61,9 @@ async def comandos_handler(update, context):
 
 async def cam_handler(update, context):
     await update.message.reply_text("Iniciando camara...")
-    subprocess.Popen([PYTHON_ENV, UDP_SCRIPT])
+    if not await supervisor.start("cam"):
+        await update.message.reply_text("La camara ya estaba grabando")
+        return
     await update.message.reply_text("Camara grabando")
 
 
@@ -57,7 +72,9 @@ async def cam_handler(update, context):
 
 async def camstop_handler(update, context):
     await update.message.reply_text("Cortando camara...")
-    subprocess.run(["pkill", "-f", "UDPv5.py"])
+    if not await supervisor.stop("cam"):
+        await update.message.reply_text("La camara no estaba en marcha")
+        return
     await update.message.reply_text("Camara apagada")
 
 
@@ -66,7 +83,9 @@ async def camstop_handler(update, context):
 
 async def gps_handler(update, context):
     await update.message.reply_text("Iniciando GPS...")
-    subprocess.Popen([PYTHON_ENV, GPS_SCRIPT])
+    if not await supervisor.start("gps"):
+        await update.message.reply_text("El GPS ya estaba en marcha")
+        return
     await update.message.reply_text("GPS lanzando")
 
 
@@ -75,55 +94,54 @@ async def gps_handler(update, context):
 
 async def gpsstop_handler(update, context):
     await update.message.reply_text("Cortando GPS...")
-    subprocess.run(["pkill", "-f", "gps.py"])
+    if not await supervisor.stop("gps"):
+        await update.message.reply_text("El GPS no estaba en marcha")
+        return
     await update.message.reply_text("GPS cortado")
 
 
 
 #  /posicion
 
+async def leer_posicion(timeout=1.0, max_age=MAX_FIX_AGE):
+    """
+    Lee la última posición del servicio GPS de gps.py por su socket local.
+    Si gps.py no está en marcha, se consulta el módem directamente en un hilo;
+    si está en marcha pero no tiene una posición reciente, se devuelve None
+    (el puerto del módem es suyo y no se abre otra vez).
+    """
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(SOCKET_PATH), timeout
+        )
+        try:
+            data = await asyncio.wait_for(reader.read(), timeout)
+        finally:
+            writer.close()
+    except (OSError, asyncio.TimeoutError):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, leer_modem)
+
+    fix = fix_from_json(data, max_age)
+    return (fix.lat, fix.lon) if fix is not None else None
+
+
 async def posicion_handler(update, context):
     await update.message.reply_text("Obteniendo posición actual...")
 
-    try:
-        output = subprocess.check_output(
-            [PYTHON_ENV, POS_SCRIPT],
-            stderr=subprocess.STDOUT
-        ).decode().strip()
-    except subprocess.CalledProcessError as e:
-        await update.message.reply_text("Error ejecutando posicion.py")
-        return
-
-    if "No se obtuvo ninguna coordenada" in output:
+    posicion = await leer_posicion()
+    if posicion is None:
         await update.message.reply_text("No se pudo obtener la posición GPS.")
         return
+    lat, lon = posicion
 
+    # Generar el mapa fuera del bucle de eventos (descarga teselas y dibuja)
     try:
-        lines = output.splitlines()
-        lat_line = [l for l in lines if "Latitud" in l][0]
-        lon_line = [l for l in lines if "Longitud" in l][0]
-
-        lat = float(lat_line.split(":")[1])
-        lon = float(lon_line.split(":")[1])
-    except Exception:
-        await update.message.reply_text(
-            "No se pudieron interpretar las coordenadas:\n" + output
-        )
-        return
-
-    # Generar el mapa
-    try:
-        m = StaticMap(600, 400)
-        marker = CircleMarker((lon, lat), "red", 12)
-        m.add_marker(marker)
-        image = m.render()
-
-        buf = io.BytesIO()
-        image.save(buf, format="PNG")
-        buf.seek(0)
+        loop = asyncio.get_running_loop()
+        png = await loop.run_in_executor(None, map_renderer.render, lat, lon)
 
         caption = f"Posición actual:\nLat: {lat:.5f}\nLon: {lon:.5f}"
-        await update.message.reply_photo(photo=buf, caption=caption)
+        await update.message.reply_photo(photo=io.BytesIO(png), caption=caption)
     except Exception as e:
         await update.message.reply_text(f"Error generando mapa: {e}")
 
@@ -133,14 +151,45 @@ async def posicion_handler(update, context):
 
 async def cincoG_handler(update, context):
     await update.message.reply_text("Conectando a la red 5G...")
-    subprocess.Popen(["sudo", "ip", "link", "set", "wwan0", "up"])
-    subprocess.Popen(["sudo", "waveshare-CM"])
+    code, output = await supervisor.run_command(["sudo", "ip", "link", "set", "wwan0", "up"])
+    if code != 0:
+        await update.message.reply_text(f"Error activando wwan0: {output}")
+        return
+    await supervisor.start("5G")
     await update.message.reply_text("Red 5G conectada.")
 
 
+
+#  /status
+
+async def status_handler(update, context):
+    lines = []
+    for status in supervisor.get_all_status():
+        if not status["running"]:
+            estado = "parado"
+            if status["last_exit_code"] is not None:
+                estado += f" (código {status['last_exit_code']})"
+        else:
+            estado = f"en marcha {status['uptime'] / 60:.0f} min"
+            if status["fps"] is not None:
+                estado += f" | {status['fps']:.1f} FPS"
+            if status["cpu_percent"] is not None:
+                estado += f" | CPU {status['cpu_percent']:.0f}%"
+            if status["rss_mb"] is not None:
+                estado += f" | {status['rss_mb']:.0f} MB"
+        if status["restarts"]:
+            estado += f" | {status['restarts']} reinicios"
+        lines.append(f"{status['name']}: {estado}")
+    await update.message.reply_text("\n".join(lines))
+
+
+async def parar_workers(app):
+    await supervisor.stop_all()
+
+
 def main():
     print("Entré al main()")
-    app = ApplicationBuilder().token(TOKEN).build()
+    app = ApplicationBuilder().token(TOKEN).post_shutdown(parar_workers).build()
 
     app.add_handler(CommandHandler("hola", hola_handler))
     app.add_handler(CommandHandler("comandos", comandos_handler))
@@ -155,6 +204,8 @@ def main():
 
     app.add_handler(CommandHandler("5G", cincoG_handler))
 
+    app.add_handler(CommandHandler("status", status_handler))
+
 
     app.run_polling()
 
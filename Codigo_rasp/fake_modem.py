@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+import os
+import pty
+import select
+import threading
+import time
+import tty
+
+
+def _nmea_coord(value, is_lat):
+    """Convierte grados decimales al formato NMEA (ddmm.mmmm, dddmm.mmmm)"""
+    hemisphere = ("N" if value >= 0 else "S") if is_lat else ("E" if value >= 0 else "W")
+    value = abs(value)
+    degrees = int(value)
+    minutes = (value - degrees) * 60
+    width = 2 if is_lat else 3
+    return f"{degrees:0{width}d}{minutes:07.4f}", hemisphere
+
+
+def _with_checksum(body):
+    checksum = 0
+    for char in body:
+        checksum ^= ord(char)
+    return f"${body}*{checksum:02X}"
+
+
+class FakeModem:
+
+    def __init__(self, lat=43.5361, lon=-5.6612, nmea_interval=None):
+        """
+        Módem GPS simulado sobre un pseudoterminal (pty) para probar GPSService sin hardware
+
+        Responde a AT+QGPS=1 y AT+QGPSLOC? como un módem Quectel y, si se indica
+        nmea_interval, emite sentencias $GPRMC/$GPGGA periódicamente.
+
+        Argumentos:
+            lat, lon: Posición simulada (grados decimales)
+            nmea_interval: Segundos entre sentencias NMEA (None para no emitirlas)
+        """
+        self.lat = lat
+        self.lon = lon
+        self.nmea_interval = nmea_interval
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)  # Ruta a pasar a GPSService
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.commands = []  # Comandos AT recibidos
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=2.0)
+        os.close(self.master)
+        os.close(self.slave)
+
+    def set_position(self, lat, lon):
+        self.lat = lat
+        self.lon = lon
+
+    def emit(self, line):
+        """Envía una línea tal cual al puerto (p. ej. una sentencia mal formada)"""
+        self._send(line)
+
+    def _send(self, text):
+        os.write(self.master, (text + "\r\n").encode())
+
+    def _qgpsloc(self):
+        lat, ns = _nmea_coord(self.lat, True)
+        lon, ew = _nmea_coord(self.lon, False)
+        utc = time.strftime("%H%M%S.0", time.gmtime())
+        date = time.strftime("%d%m%y", time.gmtime())
+        return f"+QGPSLOC: {utc},{lat}{ns},{lon}{ew},0.9,230.0,3,0.00,0.0,0.0,{date},08"
+
+    def _nmea(self):
+        lat, ns = _nmea_coord(self.lat, True)
+        lon, ew = _nmea_coord(self.lon, False)
+        utc = time.strftime("%H%M%S.00", time.gmtime())
+        date = time.strftime("%d%m%y", time.gmtime())
+        return [
+            _with_checksum(f"GPRMC,{utc},A,{lat},{ns},{lon},{ew},0.0,0.0,{date},,,A"),
+            _with_checksum(f"GPGGA,{utc},{lat},{ns},{lon},{ew},1,08,0.9,230.0,M,50.0,M,,"),
+        ]
+
+    def _serve(self):
+        buffer = b""
+        next_nmea = time.time()
+        while not self.stop_event.is_set():
+            readable, _, _ = select.select([self.master], [], [], 0.05)
+            if readable:
+                buffer += os.read(self.master, 1024)
+                while b"\r" in buffer:
+                    command, buffer = buffer.split(b"\r", 1)
+                    command = command.strip().decode(errors="ignore")
+                    if not command:
+                        continue
+                    self.commands.append(command)
+                    if command == "AT+QGPSLOC?":
+                        self._send(self._qgpsloc())
+                    self._send("OK")
+
+            if self.nmea_interval and time.time() >= next_nmea:
+                for sentence in self._nmea():
+                    self._send(sentence)
+                next_nmea = time.time() + self.nmea_interval
+
+
+if __name__ == "__main__":
+    modem = FakeModem(nmea_interval=1.0).start()
+    print(f"Módem GPS simulado en {modem.port} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        modem.stop()
@@ -1,106 +1,50 @@
-import serial
 import time
-import re
-import json
-import requests
-
-PORT = "/dev/ttyUSB2"
-BAUD = 115200
+from gps_service import GPSService, PORT, BAUD, SOCKET_PATH
+from gps_uploader import GPSUploader
 
 SERVER_IP = "192.168.0.211"
 URL = f"http://{SERVER_IP}:3000/gps"
 
-# ---------------------------------------------------------
-# Convertir coordenadas NMEA a decimal
-# ---------------------------------------------------------
-def nmea_to_decimal(value):
-    """
-    Convierte '4321.6677N' o '00551.6287W' en decimal.
-    """
-    direction = value[-1]        # N / S / E / W
-    raw = value[:-1]             # '4321.6677'
-
-    if direction in ["N", "S"]:
-        deg = int(raw[:2])
-        minutes = float(raw[2:])
-    else:
-        deg = int(raw[:3])
-        minutes = float(raw[3:])
-
-    decimal = deg + minutes / 60.0
-
-    if direction in ["S", "W"]:
-        decimal = -decimal
-
-    return decimal
-
-
-# ---------------------------------------------------------
-def obtener_gps(ser):
-    ser.write(b"AT+QGPSLOC?\r")
-    time.sleep(0.5)
-    data = ser.read(2000).decode(errors="ignore")
-
-    print("\n======= RAW DATA =======")
-    print(repr(data))
-    print("========================\n")
-
-    m = re.search(r'\+QGPSLOC:\s*([^ \r\n]+)', data)
-    if not m:
-        return None
-
-    campos = m.group(1).split(',')
-    lat_raw = campos[1]
-    lon_raw = campos[2]
-
-    # Convertir a decimal
-    lat_dec = nmea_to_decimal(lat_raw)
-    lon_dec = nmea_to_decimal(lon_raw)
-
-    return lat_dec, lon_dec
+POLL_INTERVAL = 2.0  # Segundos entre posiciones enviadas
+MAX_FIX_AGE = 5.0  # Antigüedad máxima de una posición para enviarla (segundos)
+SPOOL_PATH = "/home/grupo4/gps_pendientes.json"  # Posiciones pendientes entre reinicios
 
 
 # ---------------------------------------------------------
 def main():
-    ser = serial.Serial(PORT, BAUD, timeout=1)
-    time.sleep(1)
-
+    # El servicio mantiene el puerto abierto y la última posición en memoria
     print("Activando GPS ...")
-    ser.write(b"AT+QGPS=1\r")
-    time.sleep(2)
-    ser.read(2000)
-
+    gps = GPSService(PORT, BAUD)
+    gps.start()
+    gps.serve_socket(SOCKET_PATH)  # El bot lee la posición de aquí
     print("GPS activado.\n")
 
-    last_lat = None
-    last_lon = None
-
-    while True:
-        pos = obtener_gps(ser)
-
-        if pos:
-            last_lat, last_lon = pos
-            print("[OK] Decimal:", last_lat, last_lon)
-        else:
-            print("[FALLO] No se encontró +QGPSLOC en la respuesta.")
-
-        if last_lat:
-            payload = {
-                "latitud": last_lat,
-                "longitud": last_lon
-            }
-
-            print("POST a:", URL)
-            print("Payload:", payload)
-
-            try:
-                r = requests.post(URL, json=payload)
-                print("→ Enviado, status:", r.status_code)
-            except Exception as e:
-                print("Error enviando:", e)
-
-        print()
-        time.sleep(2)
+    # Las posiciones se envían en lotes desde otro hilo: la red no afecta al sondeo
+    uploader = GPSUploader(URL, spool_path=SPOOL_PATH)
+    uploader.start()
+
+    last_sent = None
+    next_poll = time.monotonic()
+    try:
+        while True:
+            fix = gps.get_fix(max_age=MAX_FIX_AGE)
+
+            if fix and fix is not last_sent:
+                uploader.push(fix.lat, fix.lon, fix.timestamp)
+                last_sent = fix
+                stats = uploader.get_stats()
+                print(f"[OK] {fix.lat:.6f}, {fix.lon:.6f} | pendientes: {stats['pending']}")
+            elif not fix:
+                print("[FALLO] No hay posición GPS reciente.")
+
+            # Mantener la cadencia fija independientemente de lo que tarde el envío
+            next_poll += POLL_INTERVAL
+            time.sleep(max(0.0, next_poll - time.monotonic()))
+    except KeyboardInterrupt:
+        print("\nDetenido por usuario")
+    finally:
+        uploader.stop()
+        gps.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,361 @@
+import json
+import os
+import re
+import socket
+import threading
+import time
+from collections import namedtuple
+
+import serial
+
+PORT = "/dev/ttyUSB2"
+BAUD = 115200
+SOCKET_PATH = "/tmp/hired_gps.sock"  # Socket local por el que se sirve la última posición
+
+# Última posición conocida. timestamp es el instante (time.time()) en que se recibió
+GPSFix = namedtuple(
+    "GPSFix",
+    ["lat", "lon", "altitude", "speed_kmh", "satellites", "hdop", "utc", "timestamp", "source"],
+)
+
+QGPSLOC_RE = re.compile(r'\+QGPSLOC:\s*([^ \r\n]+)')
+
+
+# ---------------------------------------------------------
+# Convertir coordenadas NMEA a decimal
+# ---------------------------------------------------------
+def nmea_to_decimal(value):
+    """
+    Convierte '4321.6677N' o '00551.6287W' en decimal.
+    """
+    direction = value[-1]        # N / S / E / W
+    raw = value[:-1]             # '4321.6677'
+
+    if direction in ["N", "S"]:
+        deg = int(raw[:2])
+        minutes = float(raw[2:])
+    else:
+        deg = int(raw[:3])
+        minutes = float(raw[3:])
+
+    decimal = deg + minutes / 60.0
+
+    if direction in ["S", "W"]:
+        decimal = -decimal
+
+    return decimal
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def nmea_checksum_ok(sentence):
+    """Comprueba el checksum '*XX' de una sentencia NMEA (si lo tiene)"""
+    if "*" not in sentence:
+        return True
+    body, checksum = sentence[1:].split("*", 1)
+    calculated = 0
+    for char in body:
+        calculated ^= ord(char)
+    try:
+        return calculated == int(checksum[:2], 16)
+    except ValueError:
+        return False
+
+
+def parse_nmea(sentence):
+    """
+    Interpreta sentencias NMEA RMC y GGA de cualquier constelación ($GP, $GN, ...).
+    Devuelve un GPSFix o None si la sentencia no tiene una posición válida
+    """
+    if not sentence.startswith("$") or not nmea_checksum_ok(sentence):
+        return None
+    fields = sentence.split("*", 1)[0].split(",")
+    kind = fields[0][3:]
+
+    if kind == "RMC" and len(fields) >= 8:
+        # $xxRMC,hhmmss,estado,lat,N/S,lon,E/W,velocidad(nudos),...
+        if fields[2] != "A" or not fields[3] or not fields[5]:
+            return None
+        knots = _to_float(fields[7]) if fields[7] else None
+        return GPSFix(
+            lat=nmea_to_decimal(fields[3] + fields[4]),
+            lon=nmea_to_decimal(fields[5] + fields[6]),
+            altitude=None,
+            speed_kmh=knots * 1.852 if knots is not None else None,
+            satellites=None,
+            hdop=None,
+            utc=fields[1],
+            timestamp=time.time(),
+            source="nmea",
+        )
+
+    if kind == "GGA" and len(fields) >= 10:
+        # $xxGGA,hhmmss,lat,N/S,lon,E/W,calidad,satélites,hdop,altitud,...
+        if fields[6] in ("", "0") or not fields[2] or not fields[4]:
+            return None
+        return GPSFix(
+            lat=nmea_to_decimal(fields[2] + fields[3]),
+            lon=nmea_to_decimal(fields[4] + fields[5]),
+            altitude=_to_float(fields[9]) if fields[9] else None,
+            speed_kmh=None,
+            satellites=int(fields[7]) if fields[7].isdigit() else None,
+            hdop=_to_float(fields[8]) if fields[8] else None,
+            utc=fields[1],
+            timestamp=time.time(),
+            source="nmea",
+        )
+
+    return None
+
+
+def parse_qgpsloc(line):
+    """
+    Interpreta la respuesta '+QGPSLOC: <utc>,<lat>,<lon>,<hdop>,<altitud>,<fix>,
+    <cog>,<spkm>,<spkn>,<fecha>,<satélites>' del módem. Devuelve un GPSFix o None
+    """
+    m = QGPSLOC_RE.search(line)
+    if not m:
+        return None
+    campos = m.group(1).split(',')
+    if len(campos) < 3:
+        return None
+    try:
+        return GPSFix(
+            lat=nmea_to_decimal(campos[1]),
+            lon=nmea_to_decimal(campos[2]),
+            altitude=_to_float(campos[4]) if len(campos) > 4 else None,
+            speed_kmh=_to_float(campos[7]) if len(campos) > 7 else None,
+            satellites=int(campos[10]) if len(campos) > 10 and campos[10].isdigit() else None,
+            hdop=_to_float(campos[3]) if len(campos) > 3 else None,
+            utc=campos[0],
+            timestamp=time.time(),
+            source="qgpsloc",
+        )
+    except (ValueError, IndexError):
+        return None
+
+
+def query_fix_socket(path=SOCKET_PATH, timeout=0.5, max_age=None):
+    """
+    Pide la última posición a un GPSService de otro proceso por su socket local.
+    Devuelve un GPSFix, o None si el servicio aún no tiene posición (o es más
+    antigua que max_age). Lanza OSError si no hay servicio escuchando
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(path)
+        data = b""
+        while True:
+            chunk = client.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+    return fix_from_json(data, max_age)
+
+
+def read_fix_from_socket(path=SOCKET_PATH, timeout=0.5, max_age=None):
+    """Como query_fix_socket, pero devuelve None también si no hay servicio"""
+    try:
+        return query_fix_socket(path, timeout, max_age)
+    except OSError:
+        return None
+
+
+def fix_from_json(data, max_age=None):
+    """
+    Convierte la respuesta JSON del socket en un GPSFix (o None).
+    Si se indica max_age, devuelve None si la posición es más antigua que esos segundos
+    """
+    try:
+        fields = json.loads(data)
+    except ValueError:
+        return None
+    if not fields:
+        return None
+    fix = GPSFix(**fields)
+    if max_age is not None and time.time() - fix.timestamp > max_age:
+        return None
+    return fix
+
+
+class GPSService:
+
+    def __init__(self, port=PORT, baud=BAUD, query_interval=1.0, read_timeout=0.2):
+        """
+        Servicio de GPS que mantiene abierto el puerto del módem y guarda en memoria
+        la última posición, para que cualquier consumidor la obtenga al instante.
+
+        Un hilo lee el puerto línea a línea e interpreta tanto sentencias NMEA
+        (si el puerto las emite) como respuestas +QGPSLOC. Si query_interval > 0
+        el servicio además pide la posición periódicamente con AT+QGPSLOC?, sin
+        esperar a la respuesta: la recoge el hilo lector cuando llega.
+
+        Argumentos:
+            port: Puerto serie del módem (o de un módem simulado sobre un pty)
+            baud: Velocidad del puerto
+            query_interval: Segundos entre peticiones AT+QGPSLOC? (0 = solo escuchar NMEA)
+            read_timeout: Timeout de lectura del puerto (segundos)
+        """
+        self.port = port
+        self.baud = baud
+        self.query_interval = query_interval
+        self.read_timeout = read_timeout
+
+        # Estado interno
+        self.ser = None
+        self.fix = None  # Última posición (se reemplaza de forma atómica)
+        self.fix_event = threading.Event()  # Se activa con la primera posición
+        self.stop_event = threading.Event()
+        self.write_lock = threading.Lock()
+        self.reader_thread = None
+        self.query_thread = None
+        self.server_socket = None
+        self.socket_path = None
+
+        # Estadísticas
+        self.lines_read = 0
+        self.fixes_parsed = 0
+        self.errors = 0
+
+    def start(self):
+        """Abre el puerto, activa el GPS y arranca los hilos de lectura y consulta"""
+        self.ser = serial.Serial(self.port, self.baud, timeout=self.read_timeout)
+        self.stop_event.clear()
+        self.reader_thread = threading.Thread(target=self._reader, daemon=True)
+        self.reader_thread.start()
+
+        # La respuesta (OK o error si ya estaba activo) la consume el hilo lector
+        self._write(b"AT+QGPS=1\r")
+
+        if self.query_interval > 0:
+            self.query_thread = threading.Thread(target=self._query_worker, daemon=True)
+            self.query_thread.start()
+        print(f"Servicio GPS iniciado en {self.port}")
+
+    def serve_socket(self, path=SOCKET_PATH):
+        """
+        Sirve la última posición por un socket Unix local: cada conexión recibe un
+        JSON con los campos de GPSFix (o null) y se cierra. Lo usan otros procesos
+        (p. ej. el bot de Telegram) sin abrir el puerto del módem
+        """
+        if os.path.exists(path):
+            os.unlink(path)
+        self.server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server_socket.bind(path)
+        self.server_socket.listen(8)
+        self.socket_path = path
+        threading.Thread(target=self._socket_worker, daemon=True).start()
+        print(f"Posición GPS disponible en {path}")
+
+    def _socket_worker(self):
+        while not self.stop_event.is_set():
+            try:
+                client, _ = self.server_socket.accept()
+            except OSError:
+                break  # Socket cerrado al parar
+            fix = self.fix
+            try:
+                client.sendall(json.dumps(fix._asdict() if fix else None).encode())
+            except OSError:
+                pass
+            finally:
+                client.close()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.server_socket:
+            self.server_socket.close()
+            self.server_socket = None
+            if self.socket_path and os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+        for thread in (self.reader_thread, self.query_thread):
+            if thread and thread.is_alive():
+                thread.join(timeout=2.0)
+        if self.ser:
+            self.ser.close()
+            self.ser = None
+
+    def _write(self, data):
+        with self.write_lock:
+            if self.ser:
+                self.ser.write(data)
+
+    def _query_worker(self):
+        """Pide la posición periódicamente sin bloquear a nadie esperando la respuesta"""
+        while not self.stop_event.wait(self.query_interval):
+            try:
+                self._write(b"AT+QGPSLOC?\r")
+            except serial.SerialException as e:
+                self.errors += 1
+                print(f"Error escribiendo en el puerto GPS: {e}")
+
+    def _reader(self):
+        """Hilo que lee el puerto línea a línea y actualiza la última posición"""
+        while not self.stop_event.is_set():
+            try:
+                raw = self.ser.readline()
+            except (serial.SerialException, OSError, TypeError, AttributeError):
+                if self.stop_event.is_set():
+                    break  # Puerto cerrado al parar
+                self.errors += 1
+                time.sleep(self.read_timeout)
+                continue
+            if not raw:
+                continue
+
+            line = raw.decode(errors="ignore").strip()
+            self.lines_read += 1
+            self.handle_line(line)
+
+    def handle_line(self, line):
+        """
+        Interpreta una línea recibida del módem y devuelve la posición que contiene
+        (o None). Una línea mal formada se cuenta como error y no para al hilo lector
+        """
+        try:
+            if line.startswith("$"):
+                fix = parse_nmea(line)
+            elif line.startswith("+QGPSLOC"):
+                fix = parse_qgpsloc(line)
+            else:
+                return None  # OK, ERROR, eco de comandos...
+        except (ValueError, IndexError):
+            # Checksum correcto pero algún campo no numérico o incompleto
+            self.errors += 1
+            return None
+        if fix is not None:
+            self.fix = fix
+            self.fixes_parsed += 1
+            self.fix_event.set()
+        return fix
+
+    def get_fix(self, max_age=None):
+        """
+        Devuelve la última posición (GPSFix) o None.
+        Si se indica max_age, devuelve None si es más antigua que esos segundos
+        """
+        fix = self.fix
+        if fix is None:
+            return None
+        if max_age is not None and time.time() - fix.timestamp > max_age:
+            return None
+        return fix
+
+    def wait_for_fix(self, timeout=None):
+        """Espera a la primera posición y la devuelve (o None si vence el timeout)"""
+        self.fix_event.wait(timeout)
+        return self.fix
+
+    def get_stats(self):
+        """Retorna estadísticas del servicio"""
+        return {
+            'lines_read': self.lines_read,
+            'fixes_parsed': self.fixes_parsed,
+            'errors': self.errors,
+            'last_fix_age': time.time() - self.fix.timestamp if self.fix else None,
+        }
@@ -0,0 +1,187 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class GPSUploader:
+
+    def __init__(self, url, max_buffer=10000, batch_size=50, spool_path=None,
+                 connect_timeout=3.0, read_timeout=5.0, flush_interval=2.0,
+                 min_backoff=1.0, max_backoff=60.0):
+        """
+        Envío de posiciones GPS en lotes desde un hilo en segundo plano
+
+        Las posiciones se guardan en un buffer circular acotado y nunca bloquean
+        al hilo que lee el GPS. Si el servidor no responde, se reintenta con
+        espera exponencial sin perder posiciones (salvo que se llene el buffer).
+
+        Argumentos:
+            url: URL del endpoint /gps del servidor
+            max_buffer: Máximo de posiciones pendientes (se descartan las más antiguas)
+            batch_size: Máximo de posiciones por petición
+            spool_path: Fichero donde persistir las posiciones pendientes entre reinicios
+                (None para mantenerlas solo en memoria)
+            connect_timeout: Timeout de conexión (segundos)
+            read_timeout: Timeout de respuesta (segundos)
+            flush_interval: Tiempo máximo que una posición espera a completar un lote
+            min_backoff: Espera inicial tras un fallo (segundos)
+            max_backoff: Espera máxima entre reintentos (segundos)
+        """
+        self.url = url
+        self.batch_size = batch_size
+        self.spool_path = spool_path
+        self.timeout = (connect_timeout, read_timeout)
+        self.flush_interval = flush_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        # Estado interno
+        self.buffer = deque(maxlen=max_buffer)  # Posiciones pendientes de enviar
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.spool_dirty = False  # Hay cambios sin persistir en el spool
+
+        # Sesión HTTP con keep-alive (una sola conexión reutilizada)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # Estadísticas
+        self.sent = 0
+        self.dropped = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_success_time = None
+
+        self._load_spool()
+
+    def push(self, lat, lon, timestamp=None):
+        """Añade una posición al buffer (no bloquea)"""
+        fix = {
+            "latitud": lat,
+            "longitud": lon,
+            "timestamp": timestamp if timestamp is not None else time.time(),
+        }
+        with self.condition:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1  # Se pierde la posición más antigua
+            self.buffer.append(fix)
+            self.spool_dirty = True
+            if len(self.buffer) >= self.batch_size:
+                self.condition.notify()
+
+    def start(self):
+        if not self.thread.is_alive():
+            self.thread.start()
+            print(f"Envío de posiciones GPS a {self.url} iniciado")
+
+    def stop(self, timeout=5.0):
+        """Detiene el hilo intentando enviar lo pendiente y persiste el resto"""
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify()
+        if self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+        self._save_spool()
+        self.session.close()
+
+    def _next_batch(self):
+        with self.condition:
+            return [self.buffer[i] for i in range(min(self.batch_size, len(self.buffer)))]
+
+    def _send_batch(self, batch):
+        """Envía un lote. Devuelve True si el servidor lo aceptó"""
+        try:
+            response = self.session.post(self.url, json={"fixes": batch}, timeout=self.timeout)
+            if response.status_code < 300:
+                return True
+            self.last_error = f"HTTP {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            self.last_error = str(e)
+        return False
+
+    def _worker(self):
+        """Hilo que envía las posiciones pendientes en lotes"""
+        backoff = self.min_backoff
+        last_spool_time = time.monotonic()
+
+        while True:
+            with self.condition:
+                if not self.stop_event.is_set() and len(self.buffer) < self.batch_size:
+                    self.condition.wait(timeout=self.flush_interval)
+            stopping = self.stop_event.is_set()
+
+            batch = self._next_batch()
+            if batch:
+                if self._send_batch(batch):
+                    with self.condition:
+                        # Eliminar las posiciones enviadas que sigan al principio del buffer
+                        # (las más antiguas pueden haberse descartado si se llenó)
+                        sent_ids = {id(fix) for fix in batch}
+                        while self.buffer and id(self.buffer[0]) in sent_ids:
+                            self.buffer.popleft()
+                        self.spool_dirty = True
+                    self.sent += len(batch)
+                    backoff = self.min_backoff
+                    self.last_success_time = time.time()
+                    continue  # Puede haber más lotes pendientes
+                self.failures += 1
+                if stopping:
+                    break
+                # Espera exponencial con algo de aleatoriedad entre reintentos
+                print(f"Error enviando posiciones GPS ({self.last_error}). Reintento en {backoff:.1f} s")
+                self.stop_event.wait(backoff * random.uniform(0.8, 1.2))
+                backoff = min(self.max_backoff, backoff * 2)
+
+            # Persistir lo pendiente de vez en cuando (no en cada posición)
+            if self.spool_dirty and time.monotonic() - last_spool_time > 30:
+                self._save_spool()
+                last_spool_time = time.monotonic()
+
+            if stopping:
+                break
+
+    def _load_spool(self):
+        """Recupera las posiciones pendientes de una ejecución anterior"""
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return
+        try:
+            with open(self.spool_path) as f:
+                self.buffer.extend(json.load(f))
+            print(f"Recuperadas {len(self.buffer)} posiciones GPS pendientes")
+        except (OSError, ValueError) as e:
+            print(f"Error leyendo posiciones pendientes: {e}")
+
+    def _save_spool(self):
+        """Persiste las posiciones pendientes de forma atómica"""
+        if not self.spool_path:
+            return
+        with self.condition:
+            pending = list(self.buffer)
+            self.spool_dirty = False
+        tmp_path = self.spool_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(pending, f)
+            os.replace(tmp_path, self.spool_path)
+        except OSError as e:
+            print(f"Error guardando posiciones pendientes: {e}")
+
+    def get_stats(self):
+        """Retorna estadísticas de envío"""
+        return {
+            "pending": len(self.buffer),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_success_time": self.last_success_time,
+        }
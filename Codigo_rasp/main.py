@@ -2,6 +2,7 @@
 import cv2
 import time
 from VideoUDPSender import VideoUDPSender
+from motion import MotionDetector
 from picamera2 import Picamera2
 
 def main():
@@ -10,6 +11,14 @@ def main():
     SERVER_PORT = 5000
     FPS = 30
     FRAME_INTERVAL = 1.0 / FPS
+    TRANSPORT_MODE = "jpeg"  # "jpeg": todos los frames completos, "delta": omite frames casi idénticos
+    PIXEL_THRESHOLD = 15  # Diferencia (0-255) para considerar un píxel cambiado en modo delta
+    SKIP_RATIO = 0.0005  # Fracción de píxeles cambiados por debajo de la cual un frame se repite
+    KEYFRAME_INTERVAL = 30  # Forzar un frame completo al menos cada 30 frames
+    MOTION_GATING = True  # No enviar frames mientras no haya movimiento
+    MOTION_ROI = None  # Región (x, y, ancho, alto) en fracciones del frame, None = completo
+    IDLE_FRAME_INTERVAL = 2.0  # Segundos entre frames enviados sin movimiento (0 = ninguno)
+    HEARTBEAT_INTERVAL = 1.0  # Segundos entre latidos mientras no se envían frames
     
     # Inicializar cámara
     print("Inicializando Picamera2...")
@@ -20,7 +29,18 @@ def main():
     time.sleep(2)  # Esperar inicio cámara
     
     # Inicializar emisor UDP
-    sender = VideoUDPSender(host=SERVER_IP, port=SERVER_PORT, jpeg_quality=60)
+    sender = VideoUDPSender(
+        host=SERVER_IP,
+        port=SERVER_PORT,
+        jpeg_quality=60,
+        transport_mode=TRANSPORT_MODE,
+        pixel_threshold=PIXEL_THRESHOLD,
+        skip_ratio=SKIP_RATIO,
+        keyframe_interval=KEYFRAME_INTERVAL,
+    )
+
+    # Inicializar detector de movimiento
+    motion_detector = MotionDetector(roi=MOTION_ROI) if MOTION_GATING else None
     
     print("Iniciando transmisión...")
     print(f"{FPS} FPS -> {SERVER_IP}:{SERVER_PORT}")
@@ -29,6 +49,8 @@ def main():
     frame_count = 0
     start_time = time.time()
     last_frame_time = 0
+    last_sent_time = 0
+    last_heartbeat_time = 0
     
     try:
         while True:
@@ -38,10 +60,21 @@ def main():
             if current_time - last_frame_time >= FRAME_INTERVAL:
                 # Capturar frame
                 frame = picam2.capture_array()
+                capture_time = time.time()
                 frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
                 
-                # Enviar frame
-                sender.send_frame(frame_bgr)
+                # Enviar el frame solo si hay movimiento (o periódicamente si no lo hay)
+                moving = motion_detector.update(frame_bgr) if motion_detector else True
+                idle_frame_due = (
+                    IDLE_FRAME_INTERVAL > 0
+                    and current_time - last_sent_time >= IDLE_FRAME_INTERVAL
+                )
+                if moving or idle_frame_due:
+                    sender.send_frame(frame_bgr, capture_time=capture_time)
+                    last_sent_time = current_time
+                elif current_time - last_heartbeat_time >= HEARTBEAT_INTERVAL:
+                    sender.send_heartbeat(motion_detector.get_stats())
+                    last_heartbeat_time = current_time
                 frame_count += 1
                 last_frame_time = current_time
                 
@@ -49,7 +82,12 @@ def main():
                 if frame_count % FPS == 0:
                     elapsed = time.time() - start_time
                     actual_fps = frame_count / elapsed
-                    print(f"Frame {frame_count} | FPS: {actual_fps:.1f}")
+                    skipped = sender.get_stats()['frames_skipped']
+                    log = f"Frame {frame_count} | FPS: {actual_fps:.1f} | Repetidos: {skipped}"
+                    if motion_detector:
+                        stats = motion_detector.get_stats()
+                        log += f" | Movimiento: {stats['motion_fraction']:.0%} ({stats['last_score']:.3f})"
+                    print(log)
             
             time.sleep(0.001)
             
@@ -0,0 +1,170 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from staticmap import StaticMap, CircleMarker
+
+CACHE_DIR = os.path.expanduser("~/.cache/hired_maps")
+MAP_SIZE = (600, 400)
+MAP_ZOOM = 16  # Zoom fijo: misma clave de caché para la misma zona
+COORD_DECIMALS = 4  # Cuantización de la posición (~10 m)
+MAX_TILES = 2000
+MAX_IMAGES = 500
+
+
+class DiskLRUCache:
+
+    def __init__(self, directory, max_entries=1000):
+        """
+        Caché en disco con expulsión LRU (un fichero por entrada)
+
+        El orden de uso se guarda en memoria y se reconstruye al arrancar a partir
+        de la fecha de modificación de los ficheros, que se actualiza en cada acierto.
+
+        Argumentos:
+            directory: Carpeta donde se guardan las entradas
+            max_entries: Máximo de entradas antes de borrar las menos usadas
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self.lock = threading.Lock()  # Se usa desde varios hilos (executor, descarga de teselas)
+        self.entries = OrderedDict()  # {fichero: None}, de menos a más reciente
+
+        # Estadísticas
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+        files = [f for f in os.listdir(directory) if not f.endswith(".tmp")]
+        files.sort(key=lambda f: os.path.getmtime(os.path.join(directory, f)))
+        for name in files:
+            self.entries[name] = None
+
+    @staticmethod
+    def _filename(key):
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def get(self, key):
+        """Devuelve los bytes guardados para la clave o None"""
+        name = self._filename(key)
+        path = os.path.join(self.directory, name)
+        with self.lock:
+            if name not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self.entries.pop(name, None)
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Guarda los bytes de forma atómica y expulsa las entradas menos usadas"""
+        name = self._filename(key)
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error guardando en caché: {e}")
+            return
+
+        with self.lock:
+            self.entries[name] = None
+            self.entries.move_to_end(name)
+            expired = []
+            while len(self.entries) > self.max_entries:
+                expired.append(self.entries.popitem(last=False)[0])
+                self.evictions += 1
+        for old in expired:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except OSError:
+                pass
+
+    def get_stats(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class CachedStaticMap(StaticMap):
+    """StaticMap que reutiliza las teselas descargadas guardándolas en disco"""
+
+    def __init__(self, width, height, tile_cache, **kwargs):
+        super().__init__(width, height, **kwargs)
+        self.tile_cache = tile_cache
+
+    def get(self, url, **kwargs):
+        content = self.tile_cache.get(url)
+        if content is not None:
+            return 200, content
+        status_code, content = super().get(url, **kwargs)
+        if status_code == 200:
+            self.tile_cache.put(url, content)
+        return status_code, content
+
+
+class MapRenderer:
+
+    def __init__(self, cache_dir=CACHE_DIR, size=MAP_SIZE, zoom=MAP_ZOOM,
+                 decimals=COORD_DECIMALS, max_tiles=MAX_TILES, max_images=MAX_IMAGES):
+        """
+        Genera el mapa PNG de una posición con caché de teselas y de imágenes
+
+        La posición se redondea a `decimals` decimales y el zoom es fijo, de modo
+        que peticiones desde el mismo sitio devuelven la imagen ya generada sin
+        descargar ni dibujar nada.
+
+        Argumentos:
+            cache_dir: Carpeta base de las cachés
+            size: Tamaño de la imagen (ancho, alto)
+            zoom: Nivel de zoom del mapa
+            decimals: Decimales a los que se redondea la posición
+            max_tiles: Máximo de teselas guardadas
+            max_images: Máximo de mapas generados guardados
+        """
+        self.size = size
+        self.zoom = zoom
+        self.decimals = decimals
+        self.tiles = DiskLRUCache(os.path.join(cache_dir, "tiles"), max_tiles)
+        self.images = DiskLRUCache(os.path.join(cache_dir, "images"), max_images)
+
+    def render(self, lat, lon):
+        """Devuelve el PNG (bytes) del mapa centrado en la posición cuantizada"""
+        lat = round(lat, self.decimals)
+        lon = round(lon, self.decimals)
+        key = f"{self.zoom}/{lat:.{self.decimals}f}/{lon:.{self.decimals}f}/{self.size[0]}x{self.size[1]}"
+
+        png = self.images.get(key)
+        if png is not None:
+            return png
+
+        m = CachedStaticMap(self.size[0], self.size[1], self.tiles)
+        m.add_marker(CircleMarker((lon, lat), "red", 12))
+        image = m.render(zoom=self.zoom, center=(lon, lat))
+
+        buf = io.BytesIO()
+        image.save(buf, format="PNG")
+        png = buf.getvalue()
+        self.images.put(key, png)
+        return png
+
+    def get_stats(self):
+        return {"tiles": self.tiles.get_stats(), "images": self.images.get_stats()}
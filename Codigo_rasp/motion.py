@@ -0,0 +1,130 @@
+import cv2
+import numpy as np
+import time
+
+
+class MotionDetector:
+
+    def __init__(self, roi=None, downscale_width=160, learning_rate=0.05,
+                 pixel_threshold=25, motion_ratio=0.01, hangover_frames=15):
+        """
+        Detector de movimiento barato basado en sustracción de fondo sobre un frame reducido
+
+        Argumentos:
+            roi: Región de interés (x, y, ancho, alto) en fracciones del frame (0-1).
+                None para usar el frame completo
+            downscale_width: Ancho al que se reduce el frame antes de comparar
+            learning_rate: Velocidad de adaptación del fondo (0-1)
+            pixel_threshold: Diferencia (0-255) para considerar un píxel en movimiento
+            motion_ratio: Fracción de píxeles en movimiento para considerar que hay movimiento
+            hangover_frames: Frames que se sigue considerando movimiento tras dejar de detectarlo
+        """
+        self.roi = roi
+        self.downscale_width = downscale_width
+        self.learning_rate = learning_rate
+        self.pixel_threshold = pixel_threshold
+        self.motion_ratio = motion_ratio
+        self.hangover_frames = hangover_frames
+
+        # Estado interno
+        self.background = None  # Fondo acumulado (float32)
+        self.frame_shape = None  # Forma del frame original usada para calcular la ROI
+        self.roi_slice = None  # Recorte de la ROI sobre el frame reducido
+        self.small_size = None  # Tamaño (ancho, alto) del frame reducido
+        self.frames_since_motion = None  # Frames desde el último movimiento detectado
+
+        # Estadísticas
+        self.frames_evaluated = 0
+        self.frames_with_motion = 0
+        self.motion_events = 0  # Transiciones de reposo a movimiento
+        self.last_score = 0.0  # Fracción de píxeles en movimiento del último frame
+        self.total_time = 0.0  # Tiempo total de procesamiento (segundos)
+        self.motion = False
+        self.idle_since = time.time()
+
+    def _configure(self, shape):
+        """Calcula el tamaño reducido y la ROI para una resolución de entrada"""
+        height, width = shape[:2]
+        scale = self.downscale_width / float(width)
+        self.small_size = (self.downscale_width, max(1, int(height * scale)))
+        small_w, small_h = self.small_size
+
+        if self.roi is None:
+            self.roi_slice = (slice(0, small_h), slice(0, small_w))
+        else:
+            x, y, w, h = self.roi
+            x0, y0 = int(x * small_w), int(y * small_h)
+            x1, y1 = int((x + w) * small_w), int((y + h) * small_h)
+            if x1 <= x0 or y1 <= y0:
+                raise ValueError("La ROI de movimiento está vacía")
+            self.roi_slice = (slice(y0, y1), slice(x0, x1))
+
+        self.frame_shape = shape
+        self.background = None
+
+    def update(self, frame: np.ndarray) -> bool:
+        """
+        Evalúa un frame y actualiza el fondo
+
+        Devuelve:
+            bool: True si hay movimiento (o si aún no ha pasado el tiempo de hangover)
+        """
+        start = time.perf_counter()
+
+        if frame.shape != self.frame_shape:
+            self._configure(frame.shape)
+
+        small = cv2.resize(frame, self.small_size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(small[self.roi_slice], (5, 5), 0)
+
+        if self.background is None:
+            # Primer frame: se toma como fondo y se considera movimiento
+            self.background = gray.astype(np.float32)
+            score = 1.0
+        else:
+            diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+            moving_pixels = cv2.countNonZero(
+                cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1]
+            )
+            score = moving_pixels / float(diff.size)
+            cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+
+        if score >= self.motion_ratio:
+            self.frames_since_motion = 0
+        elif self.frames_since_motion is not None:
+            self.frames_since_motion += 1
+
+        motion = (
+            self.frames_since_motion is not None
+            and self.frames_since_motion <= self.hangover_frames
+        )
+
+        # Actualizar estadísticas
+        if motion and not self.motion:
+            self.motion_events += 1
+        elif not motion and self.motion:
+            self.idle_since = time.time()
+        self.motion = motion
+        self.last_score = score
+        self.frames_evaluated += 1
+        if motion:
+            self.frames_with_motion += 1
+        self.total_time += time.perf_counter() - start
+
+        return motion
+
+    def get_stats(self):
+        """Retorna estadísticas de movimiento"""
+        evaluated = max(1, self.frames_evaluated)
+        return {
+            'motion': self.motion,
+            'frames_evaluated': self.frames_evaluated,
+            'frames_with_motion': self.frames_with_motion,
+            'motion_fraction': self.frames_with_motion / evaluated,
+            'motion_events': self.motion_events,
+            'last_score': self.last_score,
+            'idle_seconds': 0.0 if self.motion else time.time() - self.idle_since,
+            'avg_time_ms': 1000.0 * self.total_time / evaluated,
+        }
@@ -1,63 +1,36 @@
-import serial
-import time
-import re
-
-PORT = "/dev/ttyUSB2"
-BAUD = 115200
-
-
-# Convertir coordenadas NMEA a decimal
-
-def nmea_to_decimal(value):
-    direction = value[-1]
-    raw = value[:-1]
-
-    if direction in ["N", "S"]:
-        deg = int(raw[:2])
-        minutes = float(raw[2:])
-    else:
-        deg = int(raw[:3])
-        minutes = float(raw[3:])
-
-    decimal = deg + minutes / 60.0
-
-    if direction in ["S", "W"]:
-        decimal = -decimal
-
-    return decimal
-
-
-def obtener_gps():
-    ser = serial.Serial(PORT, BAUD, timeout=1)
-    time.sleep(1)
-
-    # Activar GPS
-    ser.write(b"AT+QGPS=1\r")
-    time.sleep(2)
-    ser.read(2000)
-
-    # Solicitar posición
-    ser.write(b"AT+QGPSLOC?\r")
-    time.sleep(0.5)
-    data = ser.read(2000).decode(errors="ignore")
-
-    #print("\n======= RAW DATA =======")
-    #print(repr(data))
-    #print("========================\n")
-
-    m = re.search(r'\+QGPSLOC:\s*([^ \r\n]+)', data)
-    if not m:
+from gps_service import GPSService, PORT, BAUD, query_fix_socket
+
+FIX_TIMEOUT = 5.0  # Segundos máximos esperando la primera posición
+MAX_FIX_AGE = 10.0  # Antigüedad máxima de la posición de gps.py para darla como actual
+
+
+def obtener_gps(timeout=FIX_TIMEOUT, max_age=MAX_FIX_AGE):
+    """
+    Devuelve la posición actual como (lat, lon), o None si no se obtiene a tiempo.
+    Si gps.py está en marcha se lee de su socket (y si aún no tiene posición
+    reciente se devuelve None: el puerto del módem es suyo); si no, se abre el
+    módem y se espera a la primera posición
+    """
+    try:
+        fix = query_fix_socket(max_age=max_age)
+    except OSError:
+        return leer_modem(timeout)  # gps.py no está en marcha
+    return (fix.lat, fix.lon) if fix is not None else None
+
+
+def leer_modem(timeout=FIX_TIMEOUT):
+    """Abre el módem, espera a la primera posición y lo cierra. Solo si gps.py no lo tiene abierto"""
+    gps = GPSService(PORT, BAUD, query_interval=0.5)
+    gps.start()
+    try:
+        fix = gps.wait_for_fix(timeout)
+    finally:
+        gps.stop()
+
+    if fix is None:
         print("No se pudo leer QGPSLOC")
         return None
-
-    campos = m.group(1).split(',')
-    lat_raw = campos[1]
-    lon_raw = campos[2]
-
-    lat_dec = nmea_to_decimal(lat_raw)
-    lon_dec = nmea_to_decimal(lon_raw)
-
-    return lat_dec, lon_dec
+    return fix.lat, fix.lon
 
 
 if __name__ == "__main__":
@@ -0,0 +1,230 @@
+import asyncio
+import os
+import re
+import signal
+import time
+from collections import deque
+
+FPS_RE = re.compile(r'FPS:\s*([\d.]+)')
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def read_proc_stat(pid):
+    """
+    Lee el tiempo de CPU (segundos) y la memoria residente (bytes) de un proceso
+    desde /proc/<pid>/stat. Devuelve None si el proceso ya no existe
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            data = f.read()
+    except OSError:
+        return None
+    # El nombre del proceso va entre paréntesis y puede contener espacios
+    fields = data[data.rindex(")") + 2:].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / CLK_TCK  # utime + stime
+    rss_bytes = int(fields[21]) * PAGE_SIZE
+    return cpu_seconds, rss_bytes
+
+
+class Worker:
+
+    def __init__(self, name, cmd, restart=True, min_backoff=1.0, max_backoff=60.0,
+                 stable_after=30.0, log_lines=20):
+        """
+        Proceso vigilado por el supervisor
+
+        Argumentos:
+            name: Nombre del worker (p. ej. 'cam', 'gps')
+            cmd: Comando a ejecutar (lista de argumentos)
+            restart: Relanzar el proceso si termina sin haberlo parado
+            min_backoff: Espera inicial antes de relanzar (segundos)
+            max_backoff: Espera máxima antes de relanzar (segundos)
+            stable_after: Segundos en marcha tras los que se reinicia la espera
+            log_lines: Últimas líneas de salida que se guardan
+        """
+        self.name = name
+        self.cmd = cmd
+        self.restart = restart
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+
+        # Estado interno
+        self.process = None
+        self.task = None
+        self.stopping = False
+        self.started_at = None
+        self.last_output = deque(maxlen=log_lines)
+        self.last_cpu = None  # (tiempo de CPU, instante) de la última consulta
+
+        # Estadísticas
+        self.restarts = 0
+        self.last_exit_code = None
+        self.fps = None
+        self.fps_time = None
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.returncode is None
+
+
+class Supervisor:
+
+    def __init__(self, stop_timeout=5.0):
+        """
+        Supervisor asíncrono de los procesos lanzados desde el bot
+
+        Cada worker se lanza en su propio grupo de procesos, se relanza con
+        espera exponencial si termina inesperadamente y se para con SIGTERM
+        (y SIGKILL si no responde) a todo su grupo, sin dejar procesos huérfanos.
+        Su salida se lee continuamente para extraer los FPS que imprime.
+
+        Argumentos:
+            stop_timeout: Segundos de espera tras SIGTERM antes de enviar SIGKILL
+        """
+        self.stop_timeout = stop_timeout
+        self.workers = {}
+
+    def add(self, worker):
+        self.workers[worker.name] = worker
+        return worker
+
+    async def start(self, name):
+        """Arranca el worker. Devuelve False si ya estaba en marcha"""
+        worker = self.workers[name]
+        if worker.task and not worker.task.done():
+            return False
+        worker.stopping = False
+        worker.task = asyncio.create_task(self._run(worker))
+        return True
+
+    async def stop(self, name):
+        """Para el worker y todo su grupo de procesos. Devuelve False si no estaba en marcha"""
+        worker = self.workers[name]
+        if not worker.task or worker.task.done():
+            return False
+        worker.stopping = True
+        if worker.running:
+            await self._terminate(worker.process)
+        worker.task.cancel()
+        try:
+            await worker.task
+        except asyncio.CancelledError:
+            pass
+        return True
+
+    async def stop_all(self):
+        await asyncio.gather(*(self.stop(name) for name in self.workers))
+
+    async def run_command(self, cmd, timeout=30.0):
+        """Ejecuta un comando puntual sin bloquear el bucle. Devuelve (código, salida)"""
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+            start_new_session=True,
+        )
+        try:
+            output, _ = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            await self._terminate(process)
+            return None, "Tiempo de espera agotado"
+        return process.returncode, output.decode(errors="ignore").strip()
+
+    async def _terminate(self, process):
+        """SIGTERM al grupo de procesos y SIGKILL si no termina a tiempo"""
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(process.pid, sig)
+            except (ProcessLookupError, PermissionError):
+                return
+            try:
+                await asyncio.wait_for(process.wait(), self.stop_timeout)
+                return
+            except asyncio.TimeoutError:
+                continue
+
+    @staticmethod
+    def _kill_group(pgid):
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    async def _run(self, worker):
+        """Lanza el worker y lo relanza con espera exponencial mientras no se pare"""
+        backoff = worker.min_backoff
+        env = dict(os.environ, PYTHONUNBUFFERED="1")  # Salida línea a línea
+
+        try:
+            while not worker.stopping:
+                worker.process = await asyncio.create_subprocess_exec(
+                    *worker.cmd, stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT, start_new_session=True, env=env,
+                )
+                worker.started_at = time.monotonic()
+                worker.last_cpu = None
+                print(f"[{worker.name}] iniciado (pid {worker.process.pid})")
+
+                reader = asyncio.create_task(self._read_output(worker))
+                worker.last_exit_code = await worker.process.wait()
+                self._kill_group(worker.process.pid)  # Hijos que hayan quedado huérfanos
+                await reader
+                if worker.stopping or not worker.restart:
+                    break
+
+                # Si llevaba tiempo en marcha, el fallo no es de arranque: espera mínima
+                if time.monotonic() - worker.started_at > worker.stable_after:
+                    backoff = worker.min_backoff
+                print(f"[{worker.name}] terminó con código {worker.last_exit_code}. "
+                      f"Reinicio en {backoff:.1f} s")
+                await asyncio.sleep(backoff)
+                backoff = min(worker.max_backoff, backoff * 2)
+                worker.restarts += 1
+        finally:
+            if worker.running:
+                await self._terminate(worker.process)
+
+    async def _read_output(self, worker):
+        """Lee la salida del worker (evita que se llene la tubería) y extrae los FPS"""
+        while True:
+            line = await worker.process.stdout.readline()
+            if not line:
+                break
+            text = line.decode(errors="ignore").rstrip()
+            worker.last_output.append(text)
+            m = FPS_RE.search(text)
+            if m:
+                worker.fps = float(m.group(1))
+                worker.fps_time = time.monotonic()
+
+    def get_status(self, name):
+        """Estado, FPS, CPU y memoria del worker"""
+        worker = self.workers[name]
+        status = {
+            "name": name,
+            "running": worker.running,
+            "pid": worker.process.pid if worker.running else None,
+            "uptime": time.monotonic() - worker.started_at if worker.running else None,
+            "restarts": worker.restarts,
+            "last_exit_code": worker.last_exit_code,
+            "fps": worker.fps if worker.running else None,
+            "cpu_percent": None,
+            "rss_mb": None,
+        }
+        if not worker.running:
+            return status
+
+        usage = read_proc_stat(worker.process.pid)
+        if usage is not None:
+            cpu_seconds, rss_bytes = usage
+            now = time.monotonic()
+            # CPU desde la consulta anterior (o desde el arranque la primera vez)
+            last_cpu, last_time = worker.last_cpu or (0.0, worker.started_at)
+            if now > last_time:
+                status["cpu_percent"] = 100.0 * (cpu_seconds - last_cpu) / (now - last_time)
+            worker.last_cpu = (cpu_seconds, now)
+            status["rss_mb"] = rss_bytes / 1e6
+        return status
+
+    def get_all_status(self):
+        return [self.get_status(name) for name in self.workers]
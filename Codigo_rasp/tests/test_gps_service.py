@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fake_modem import FakeModem, _with_checksum  # noqa: E402
+from gps_service import GPSService, query_fix_socket, read_fix_from_socket  # noqa: E402
+
+LAT, LON = 43.5361, -5.6612
+
+
+@pytest.fixture
+def modem():
+    modem = FakeModem(LAT, LON).start()
+    yield modem
+    modem.stop()
+
+
+def start_service(modem, query_interval=0):
+    service = GPSService(modem.port, query_interval=query_interval, read_timeout=0.05)
+    service.start()
+    return service
+
+
+def wait_until(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_nmea_fix(modem):
+    modem.nmea_interval = 0.1
+    service = start_service(modem)
+    try:
+        fix = service.wait_for_fix(3.0)
+        assert fix is not None and fix.source == "nmea"
+        assert fix.lat == pytest.approx(LAT, abs=1e-4)
+        assert fix.lon == pytest.approx(LON, abs=1e-4)
+        assert service.get_fix(max_age=5) == service.fix
+    finally:
+        service.stop()
+
+
+def test_qgpsloc_fix(modem):
+    service = start_service(modem, query_interval=0.1)
+    try:
+        fix = service.wait_for_fix(3.0)
+        assert fix is not None and fix.source == "qgpsloc"
+        assert fix.lat == pytest.approx(LAT, abs=1e-4)
+        assert "AT+QGPS=1" in modem.commands
+    finally:
+        service.stop()
+
+
+def test_malformed_sentences_do_not_stop_reader(modem):
+    service = start_service(modem)
+    try:
+        # Checksum correcto pero campos que no son números
+        modem.emit(_with_checksum("GPRMC,120000.00,A,48x7.038,N,01131.000,E,0.0,0.0,010125,,,A"))
+        modem.emit(_with_checksum("GPGGA,120000.00,4807.038,N,0113y.000,E,1,08,0.9,545.4,M,46.9,M,,"))
+        modem.emit(_with_checksum("GPRMC,120000.00,A,4,N,0,E,0.0,0.0,010125,,,A"))
+        modem.emit("+QGPSLOC: 120000.0,4807.038N")  # Respuesta incompleta
+        assert wait_until(lambda: service.errors >= 3)
+        assert service.get_fix() is None
+        assert service.reader_thread.is_alive()
+
+        # Después de las líneas erróneas se sigue interpretando el puerto
+        for sentence in modem._nmea():
+            modem.emit(sentence)
+        fix = service.wait_for_fix(3.0)
+        assert fix is not None
+        assert fix.lat == pytest.approx(LAT, abs=1e-4)
+    finally:
+        service.stop()
+
+
+def test_handle_line_returns_fix_or_none():
+    service = GPSService()
+    assert service.handle_line("OK") is None
+    assert service.handle_line(_with_checksum("GPRMC,120000.00,A,48x7.038,N,01131.000,E,0.0,0.0,010125,,,A")) is None
+    assert service.errors == 1
+    fix = service.handle_line(_with_checksum("GPRMC,120000.00,A,4807.038,N,01131.000,E,0.0,0.0,010125,,,A"))
+    assert fix is not None and fix.lat == pytest.approx(48.1173, abs=1e-4)
+    assert service.get_fix() == fix
+
+
+def test_socket_distinguishes_no_service_from_no_fix(modem, tmp_path):
+    path = str(tmp_path / "gps.sock")
+    with pytest.raises(OSError):
+        query_fix_socket(path)
+    assert read_fix_from_socket(path) is None
+
+    service = start_service(modem)
+    service.serve_socket(path)
+    try:
+        assert query_fix_socket(path) is None  # En marcha pero sin posición
+        for sentence in modem._nmea():
+            modem.emit(sentence)
+        assert service.wait_for_fix(3.0) is not None
+        fix = query_fix_socket(path, max_age=5)
+        assert fix is not None and fix.lat == pytest.approx(LAT, abs=1e-4)
+        service.fix = service.fix._replace(timestamp=time.time() - 60)
+        assert query_fix_socket(path, max_age=5) is None  # Posición antigua
+    finally:
+        service.stop()
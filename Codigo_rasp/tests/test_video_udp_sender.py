@@ -0,0 +1,43 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from VideoUDPSender import VideoUDPSender  # noqa: E402
+
+
+@pytest.fixture
+def sender():
+    sender = VideoUDPSender("127.0.0.1", 5999, transport_mode="delta")
+    yield sender
+    sender.release()
+
+
+def scene(rng, noise=3):
+    """Frame 640x480 de fondo uniforme con ruido de sensor"""
+    base = np.full((480, 640, 3), 110, dtype=np.int16)
+    return np.clip(base + rng.normal(0, noise, base.shape), 0, 255).astype(np.uint8)
+
+
+def test_noise_only_is_repeat(sender):
+    rng = np.random.default_rng(0)
+    sender.last_key_thumb = sender._make_thumb(scene(rng))
+    assert sender._is_repeat(sender._make_thumb(scene(rng)))
+
+
+def test_small_object_is_not_repeat(sender):
+    rng = np.random.default_rng(1)
+    sender.last_key_thumb = sender._make_thumb(scene(rng))
+    frame = scene(rng)
+    frame[200:260, 300:330] = 20  # Objeto de 30x60 (~0.6% del frame), del tamaño de un peatón
+    assert not sender._is_repeat(sender._make_thumb(frame))
+
+
+def test_keyframe_interval_forces_keyframe(sender):
+    rng = np.random.default_rng(2)
+    sender.last_key_thumb = sender._make_thumb(scene(rng))
+    sender.repeats_since_key = sender.keyframe_interval
+    assert not sender._is_repeat(sender._make_thumb(scene(rng)))
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Benchmark extremo a extremo del pipeline de detección
+
+Envía vídeo sintético con VideoUDPSender a un VideoUDPReceiver por loopback,
+lo procesa con video_loop usando un modelo falso de coste fijo (StubModel) y
+lo sube a un servidor HTTP local que hace de backend. Al terminar guarda en JSON
+los FPS, las latencias por etapa (p50/p99), la CPU de cada hilo, la memoria
+y los frames perdidos, junto con el commit, para comparar entre versiones.
+
+Uso (desde Deteccion_YOLO):
+    python bench/pipeline_bench.py --duration 20 --output bench/results/actual.json
+"""
+import argparse
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "..", "Codigo_rasp"))
+
+from VideoUDPSender import VideoUDPSender  # noqa: E402
+from network_utils import VideoUDPReceiver, RECEIVER_COUNTERS  # noqa: E402
+from video_utils import video_loop, ANNOTATION_MODES, UPLINK_MODES  # noqa: E402
+from tracing import LatencyTracker  # noqa: E402
+from metrics import REGISTRY  # noqa: E402
+from log_utils import setup_logging  # noqa: E402
+from trackers import IoUTracker  # noqa: E402
+from stub_model import StubModel, NAMES  # noqa: E402
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+THREAD_NAME_RE = re.compile(r'^Thread-\d+ \((.+)\)$')  # Hilos sin nombre: 'Thread-N (función)'
+
+# Módulo en el que se reserva la memoria -> etapa del pipeline
+MEMORY_STAGES = {
+    "VideoUDPSender.py": "sender",
+    "network_utils.py": "receiver",
+    "video_utils.py": "processing",
+    "stub_model.py": "model",
+    "tracing.py": "tracing",
+    "metrics.py": "metrics",
+}
+
+
+class StubBackend:
+    """Servidor HTTP local que acepta los POST del detector y los cuenta"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.httpd = None
+
+    def start(self):
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                if backend.delay:
+                    time.sleep(backend.delay)
+                with backend.lock:
+                    backend.requests += 1
+                    backend.bytes += length
+                body = b'{"ok":true}'
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, name="stub-backend", daemon=True).start()
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/video"
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ThreadCPUSampler:
+    """Mide la CPU consumida por cada hilo leyendo /proc/self/task/<tid>/stat"""
+
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.baseline = {}  # {tid: segundos de CPU al empezar}
+        self.last = {}  # {tid: (nombre, segundos de CPU)}
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._worker, name="cpu-sampler", daemon=True)
+
+    @staticmethod
+    def _thread_cpu(tid):
+        try:
+            with open(f"/proc/self/task/{tid}/stat") as f:
+                data = f.read()
+        except OSError:
+            return None
+        fields = data[data.rindex(")") + 2:].split()
+        return (int(fields[11]) + int(fields[12])) / CLK_TCK
+
+    def sample(self):
+        for thread in threading.enumerate():
+            tid = thread.native_id
+            cpu = self._thread_cpu(tid) if tid else None
+            if cpu is not None:
+                m = THREAD_NAME_RE.match(thread.name)
+                self.last[tid] = (m.group(1) if m else thread.name, cpu)
+
+    def start(self):
+        for thread in threading.enumerate():
+            cpu = self._thread_cpu(thread.native_id) if thread.native_id else None
+            if cpu is not None:
+                self.baseline[thread.native_id] = cpu
+        self.start_time = time.monotonic()
+        self.thread.start()
+
+    def _worker(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self.sample()
+        self.stop_event.set()
+        self.thread.join()
+        elapsed = time.monotonic() - self.start_time
+        per_name = {}
+        for tid, (name, cpu) in self.last.items():
+            # Los hilos creados durante la medida empiezan en 0
+            per_name[name] = per_name.get(name, 0.0) + cpu - self.baseline.get(tid, 0.0)
+        return {
+            name: {"cpu_seconds": round(seconds, 3), "cpu_percent": round(100 * seconds / elapsed, 1)}
+            for name, seconds in sorted(per_name.items(), key=lambda item: -item[1])
+            if name != "cpu-sampler"
+        }
+
+
+def synthetic_frames(width, height, seed=0):
+    """Frames sintéticos: fondo con textura fija y rectángulos en movimiento"""
+    rng = np.random.default_rng(seed)
+    background = rng.integers(40, 200, (height // 8, width // 8, 3), dtype=np.uint8)
+    background = cv2.resize(background, (width, height), interpolation=cv2.INTER_LINEAR)
+    index = 0
+    while True:
+        frame = background.copy()
+        for k in range(4):
+            x = int((index * (3 + k) + 97 * k) % (width - 60))
+            y = int((index * (2 + k) + 53 * k) % (height - 60))
+            cv2.rectangle(frame, (x, y), (x + 60, y + 60), (50 * k, 255 - 40 * k, 120), -1)
+        yield frame
+        index += 1
+
+
+def git_info():
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=BENCH_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+        dirty = bool(subprocess.check_output(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=BENCH_DIR, stderr=subprocess.DEVNULL,
+        ).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def memory_by_stage(snapshot):
+    """Memoria reservada (y aún viva) agrupada por etapa según el módulo que la reservó"""
+    stages = {}
+    for stat in snapshot.statistics("filename"):
+        filename = os.path.basename(stat.traceback[0].filename)
+        stage = MEMORY_STAGES.get(filename, "other")
+        entry = stages.setdefault(stage, {"bytes": 0, "blocks": 0})
+        entry["bytes"] += stat.size
+        entry["blocks"] += stat.count
+    return stages
+
+
+def counter_snapshot(labels):
+    counters = {name: REGISTRY.get_counter(name, **labels) for name in RECEIVER_COUNTERS}
+    counters["frames_processed_total"] = REGISTRY.get_counter("frames_processed_total")
+    counters["uplink_errors_total"] = REGISTRY.get_counter("uplink_errors_total")
+    for name in ("frame_pool_allocations_total", "frame_pool_reuses_total"):
+        counters[name] = REGISTRY.get_counter(name, pool="video")
+    return counters
+
+
+def run_bench(args):
+    setup_logging(args.log_level)
+    if args.tracemalloc:
+        tracemalloc.start(1)
+
+    backend = StubBackend(delay=args.backend_delay)
+    url = backend.start()
+
+    receiver = VideoUDPReceiver(host="127.0.0.1", port=args.port, queue_size=args.queue_size,
+                                auto_start=True)
+    labels = receiver.metrics_labels
+    before = counter_snapshot(labels)
+
+    model = StubModel(objects=args.objects, cost=args.model_cost)
+    # 'stub': IDs del propio modelo falso; 'iou': IDs asignados por IoUTracker
+    object_tracker = IoUTracker() if args.tracker == "iou" else None
+    tracker = LatencyTracker()
+    shared_data = {
+        "total_count": 0,
+        "already_counted": set(),
+        "track_last_positions": {},
+        "zone_counts": {},
+        "zone_counted": set(),
+        "car_count": 0,
+        "person_count": 0,
+        "bici_count": 0,
+    }
+
+    sampler = ThreadCPUSampler()
+    sampler.start()
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.monotonic()
+
+    loop_thread = threading.Thread(
+        target=video_loop,
+        args=(receiver, model, list(NAMES), 0.35, 0.45, tuple(args.img_size), object_tracker,
+              args.line_orientation, False, url, args.processing_queue_size,
+              shared_data, tracker, args.annotation, args.uplink_mode),
+        name="video-loop",
+    )
+    loop_thread.start()
+
+    # Emisor en su propio hilo para separar su CPU de la del resto
+    sent = {"frames": 0, "skipped": 0}
+
+    def send():
+        sender = VideoUDPSender("127.0.0.1", args.port, jpeg_quality=args.jpeg_quality,
+                                transport_mode=args.transport)
+        sender.start_periodic_sync()
+        interval = 1.0 / args.fps
+        next_time = time.monotonic()
+        frames = synthetic_frames(*args.sender_size)
+        while time.monotonic() - start < args.duration:
+            sender.send_frame(next(frames), capture_time=time.time())
+            sent["frames"] += 1
+            next_time += interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        sent["skipped"] = sender.get_stats()["frames_skipped"]
+        sender.release()
+
+    sender_thread = threading.Thread(target=send, name="udp-sender")
+    sender_thread.start()
+    sender_thread.join()
+
+    # Esperar a que el pipeline termine con lo que tenga pendiente
+    last_processed = -1
+    while True:
+        time.sleep(args.drain)
+        processed = REGISTRY.get_counter("frames_processed_total")
+        if processed == last_processed:
+            break
+        last_processed = processed
+
+    snapshot = tracemalloc.take_snapshot() if args.tracemalloc else None
+    traced = tracemalloc.get_traced_memory() if args.tracemalloc else None
+    receiver.release()
+    loop_thread.join(timeout=10)
+    elapsed = time.monotonic() - start
+    cpu_threads = sampler.stop()
+    usage_end = resource.getrusage(resource.RUSAGE_SELF)
+    backend.stop()
+    if args.tracemalloc:
+        tracemalloc.stop()
+
+    after = counter_snapshot(labels)
+    counters = {name: after[name] - before[name] for name in after}
+    processed = counters["frames_processed_total"]
+    latency = tracker.to_dict()
+
+    result = {
+        "git": git_info(),
+        "timestamp": time.time(),
+        "config": vars(args),
+        "elapsed_seconds": round(elapsed, 3),
+        "fps": {
+            "sent": round(sent["frames"] / args.duration, 2),
+            "processed": round(processed / args.duration, 2),
+        },
+        "frames": {
+            "sent": sent["frames"],
+            "skipped_by_sender": sent["skipped"],
+            "delivered": counters["udp_frames_delivered_total"],
+            "processed": processed,
+            "uploaded": backend.requests,
+        },
+        "drops": {
+            "lost_in_pipeline": sent["frames"] - processed,
+            "receiver_queue": counters["udp_queue_drops_total"],
+            "reorder_skips": counters["udp_reorder_skips_total"],
+            "incomplete": counters["udp_frames_incomplete_total"],
+            "decode_failures": counters["udp_decode_failures_total"],
+            "late": counters["udp_late_frames_total"],
+            "uplink_errors": counters["uplink_errors_total"],
+        },
+        "latency_ms": {
+            stage: {
+                "p50": round(1000 * data["p50"], 3),
+                "p99": round(1000 * data["p99"], 3),
+                "max": round(1000 * data["max"], 3),
+                "count": data["count"],
+            }
+            for stage, data in latency["stages"].items() if data["count"]
+        },
+        "cpu": {
+            "process_seconds": round(
+                (usage_end.ru_utime - usage_start.ru_utime)
+                + (usage_end.ru_stime - usage_start.ru_stime), 3),
+            "threads": cpu_threads,
+        },
+        "memory": {
+            "max_rss_mb": round(usage_end.ru_maxrss / 1024, 1),
+            "frame_pool_allocations": counters["frame_pool_allocations_total"],
+            "frame_pool_reuses": counters["frame_pool_reuses_total"],
+        },
+        "counts": {
+            "total": shared_data["total_count"],
+            "car": shared_data["car_count"],
+            "person": shared_data["person_count"],
+            "bici": shared_data["bici_count"],
+        },
+    }
+    if object_tracker is not None:
+        result["tracker"] = object_tracker.get_stats()
+    if snapshot is not None:
+        result["memory"]["traced_current_mb"] = round(traced[0] / 1e6, 2)
+        result["memory"]["traced_peak_mb"] = round(traced[1] / 1e6, 2)
+        result["memory"]["stages"] = memory_by_stage(snapshot)
+    return result
+
+
+def print_summary(result):
+    print(f"FPS enviados {result['fps']['sent']} | procesados {result['fps']['processed']}")
+    print("Frames: " + " | ".join(f"{k} {v}" for k, v in result["frames"].items()))
+    print("Pérdidas: " + " | ".join(f"{k} {v}" for k, v in result["drops"].items() if v))
+    for stage, data in result["latency_ms"].items():
+        print(f"{stage:>10}: p50 {data['p50']:8.2f} ms | p99 {data['p99']:8.2f} ms")
+    for name, data in result["cpu"]["threads"].items():
+        print(f"{name:>16}: {data['cpu_percent']:5.1f}% CPU")
+    print(f"RSS máximo: {result['memory']['max_rss_mb']} MB")
+    if "tracker" in result:
+        print("Tracker: " + json.dumps(result["tracker"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extremo a extremo del pipeline")
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos enviando vídeo")
+    parser.add_argument("--fps", type=float, default=30.0, help="FPS del emisor sintético")
+    parser.add_argument("--sender-size", type=int, nargs=2, default=[640, 480], help="Ancho alto")
+    parser.add_argument("--img-size", type=int, nargs=2, default=[480, 384], help="Ancho alto del modelo")
+    parser.add_argument("--jpeg-quality", type=int, default=60)
+    parser.add_argument("--transport", choices=VideoUDPSender.TRANSPORT_MODES, default="jpeg")
+    parser.add_argument("--model-cost", type=float, default=0.02, help="Segundos por inferencia")
+    parser.add_argument("--objects", type=int, default=8, help="Objetos por frame")
+    parser.add_argument("--tracker", choices=["stub", "iou"], default="stub",
+                        help="IDs del modelo falso o del IoUTracker")
+    parser.add_argument("--line-orientation", choices=["horizontal", "vertical"], default="vertical")
+    parser.add_argument("--queue-size", type=int, default=10, help="Cola del receptor UDP")
+    parser.add_argument("--processing-queue-size", type=int, default=1)
+    parser.add_argument("--annotation", choices=ANNOTATION_MODES, default="auto")
+    parser.add_argument("--uplink-mode", choices=UPLINK_MODES, default="frame")
+    parser.add_argument("--backend-delay", type=float, default=0.0, help="Segundos por POST")
+    parser.add_argument("--port", type=int, default=5700, help="Puerto UDP de loopback")
+    parser.add_argument("--drain", type=float, default=1.0, help="Espera para vaciar el pipeline")
+    parser.add_argument("--tracemalloc", action="store_true", help="Medir memoria por etapa")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="Fichero JSON de resultados")
+    args = parser.parse_args()
+
+    result = run_bench(args)
+    print_summary(result)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
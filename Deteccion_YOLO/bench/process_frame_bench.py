@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark del conteo y la anotación de process_frame
+
+Mide por separado cada parte del post-procesado de un frame con cajas sintéticas
+(o grabadas en un .npz) sin ejecutar el modelo:
+    extract   conversión de los tensores de cajas a detecciones
+    count     cruce de líneas y contadores
+    annotate  copia del frame, líneas, cajas/etiquetas y contadores
+    full      process_frame completo con un modelo de coste cero
+    buffered  process_frame dibujando en un buffer reutilizado
+    headless  process_frame sin anotación (solo conteo)
+
+Cubre de 0 a 500 objetos, las dos orientaciones de línea y un historial de
+tracks largo. Cada medida se alterna con una carga fija de referencia (copiar
+un frame y recorrer una lista de tuplas en Python) y se guarda relativa a ella,
+así que las referencias no son fps de una máquina concreta. Con --check compara
+con las referencias guardadas y termina con código 1 si algún escenario es más
+lento que la tolerancia; la tolerancia por defecto (50%) deja pasar el ruido de
+una máquina compartida y detecta las regresiones de 2x o más.
+
+Uso (desde Deteccion_YOLO):
+    python bench/process_frame_bench.py --update-baselines   # guardar referencias
+    python bench/process_frame_bench.py --check              # comprobar regresiones
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+from video_utils import (  # noqa: E402
+    process_frame,
+    extract_detections,
+    count_crossings,
+    draw_detections,
+    draw_counters,
+)
+from zones import legacy_zones  # noqa: E402
+from stub_model import StubModel, StubBoxes, NAMES  # noqa: E402
+
+BASELINES_PATH = os.path.join(BENCH_DIR, "baselines", "process_frame.json")
+OBJECT_COUNTS = (0, 10, 50, 200, 500)
+ORIENTATIONS = ("horizontal", "vertical")
+LONG_HISTORY = 50000  # Tracks antiguos en el historial para el escenario 'long'
+FRAMES = 60  # Frames distintos que se recorren en cada medida
+IMG_SIZE = (480, 384)
+
+
+def new_shared_data(history=0):
+    """Estado de conteo; con history > 0 se llena con tracks antiguos ya contados"""
+    shared_data = {
+        "total_count": 0,
+        "already_counted": set(),
+        "track_last_positions": {},
+        "zone_counts": {},
+        "zone_counted": set(),
+        "car_count": 0,
+        "person_count": 0,
+        "bici_count": 0,
+    }
+    for track_id in range(100000, 100000 + history):
+        shared_data["track_last_positions"][track_id] = (track_id % IMG_SIZE[0], track_id % IMG_SIZE[1])
+        shared_data["already_counted"].add(track_id)
+    return shared_data
+
+
+class ReplayModel:
+    """Modelo de coste cero que devuelve una secuencia fija de cajas"""
+
+    def __init__(self, boxes):
+        self.names = NAMES
+        self.boxes = boxes
+        self.calls = 0
+
+    def track(self, frame, **kwargs):
+        boxes = self.boxes[self.calls % len(self.boxes)]
+        self.calls += 1
+        return [type("Result", (), {"boxes": boxes})()]
+
+
+def synthetic_boxes(objects, frames=FRAMES):
+    model = StubModel(objects=objects, cost=0.0, speed=6.0)
+    return [model.boxes_for(IMG_SIZE[0], IMG_SIZE[1], i) for i in range(frames)]
+
+
+def recorded_boxes(path):
+    """Carga cajas grabadas (.npz con xyxy, id, cls y conf de uno o varios frames)"""
+    data = np.load(path)
+    xyxy, ids, cls, conf = data["xyxy"], data["id"], data["cls"], data["conf"]
+    if xyxy.ndim == 2:  # Un solo frame
+        xyxy, ids, cls, conf = xyxy[None], ids[None], cls[None], conf[None]
+    return [StubBoxes(*frame) for frame in zip(xyxy, ids, cls, conf)]
+
+
+def measure_once(fn, frames, min_time):
+    """Frames por segundo de fn(i) durante al menos min_time segundos"""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for i in range(frames):
+            fn(i)
+        calls += frames
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return calls / elapsed
+
+
+def reference_workload():
+    """Carga fija de referencia: memoria (copia del frame) e intérprete (bucle en Python)"""
+    frame = np.full((IMG_SIZE[1], IMG_SIZE[0], 3), 90, dtype=np.uint8)
+    points = [(i % IMG_SIZE[0], i % IMG_SIZE[1]) for i in range(200)]
+
+    def reference(i):
+        frame.copy()
+        sum(x * y for x, y in points)
+
+    return reference
+
+
+def measure(fn, frames, reference, min_time, repeats):
+    """fps de fn(i) y de la referencia, alternando sus repeticiones para que las dos
+    vean la misma carga de la máquina. De cada una se toma la mejor repetición,
+    que es la medida menos afectada por el ruido de otros procesos"""
+    results, references = [], []
+    for _ in range(repeats):
+        references.append(measure_once(reference, FRAMES, min_time / 2))
+        results.append(measure_once(fn, frames, min_time))
+    return max(results), max(references)
+
+
+def run_scenario(boxes, orientation, history, min_time, repeats):
+    """(fps, fps de la referencia) de cada parte del escenario"""
+    frame = np.full((IMG_SIZE[1], IMG_SIZE[0], 3), 90, dtype=np.uint8)
+    geometry = legacy_zones(orientation).geometry(*IMG_SIZE)
+    classes = list(NAMES)
+    detections = [extract_detections(b, NAMES, classes) for b in boxes]
+    frames = len(boxes)
+
+    def extract(i):
+        extract_detections(boxes[i], NAMES, classes)
+
+    count_state = new_shared_data(history)
+
+    def count(i):
+        count_crossings(detections[i], geometry, count_state)
+
+    counters = new_shared_data()
+
+    def annotate(i):
+        annotated = frame.copy()
+        geometry.draw(annotated)
+        draw_detections(annotated, detections[i])
+        draw_counters(annotated, counters)
+
+    model = ReplayModel(boxes)
+    full_state = new_shared_data(history)
+
+    def full(i):
+        process_frame(frame, model, classes, 0.35, 0.45, IMG_SIZE, None, orientation, full_state)
+
+    buffer = np.empty_like(frame)
+
+    def buffered(i):
+        process_frame(frame, model, classes, 0.35, 0.45, IMG_SIZE, None, orientation, full_state,
+                      annotation_buffer=buffer)
+
+    def headless(i):
+        process_frame(frame, model, classes, 0.35, 0.45, IMG_SIZE, None, orientation, full_state,
+                      annotate=False)
+
+    parts = (
+        ("extract", extract), ("count", count), ("annotate", annotate),
+        ("full", full), ("buffered", buffered), ("headless", headless),
+    )
+    reference = reference_workload()
+    return {name: measure(fn, frames, reference, min_time, repeats) for name, fn in parts}
+
+
+def run(args):
+    scenarios = {}
+    if args.boxes:
+        sources = [("recorded", recorded_boxes(args.boxes))]
+    else:
+        sources = [(f"{n}obj", synthetic_boxes(n)) for n in args.objects]
+
+    for source, boxes in sources:
+        for orientation in ORIENTATIONS:
+            for history_name, history in (("short", 0), ("long", LONG_HISTORY)):
+                name = f"{source}/{orientation}/{history_name}"
+                results = run_scenario(boxes, orientation, history, args.min_time, args.repeats)
+                scenarios[name] = {part: round(fps / reference, 5) for part, (fps, reference) in results.items()}
+                fps = " | ".join(f"{k} {v[0]:10.1f}" for k, v in results.items())
+                print(f"{name:>28}: {fps} fps")
+    return scenarios
+
+
+def check(scenarios, baselines, tolerance):
+    """Devuelve los escenarios cuya velocidad relativa cae por debajo de la referencia - tolerancia"""
+    regressions = []
+    for name, results in scenarios.items():
+        for part, relative in results.items():
+            reference = baselines.get(name, {}).get(part)
+            if reference and relative < reference * (1 - tolerance):
+                regressions.append((name, part, relative, reference))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark del conteo y la anotación")
+    parser.add_argument("--objects", type=int, nargs="+", default=list(OBJECT_COUNTS))
+    parser.add_argument("--boxes", help="Fichero .npz con cajas grabadas (xyxy, id, cls, conf)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Segundos mínimos por medida")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--baselines", default=BASELINES_PATH)
+    parser.add_argument("--update-baselines", action="store_true", help="Guardar los resultados como referencia")
+    parser.add_argument("--check", action="store_true", help="Comparar con las referencias")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Pérdida de velocidad admitida (0-1)")
+    parser.add_argument("--output", help="Fichero JSON de resultados")
+    args = parser.parse_args()
+
+    scenarios = run(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(scenarios, f, indent=2)
+
+    if args.update_baselines:
+        baselines = {}
+        if os.path.exists(args.baselines):
+            with open(args.baselines) as f:
+                baselines = json.load(f)
+        baselines.update(scenarios)
+        os.makedirs(os.path.dirname(os.path.abspath(args.baselines)), exist_ok=True)
+        with open(args.baselines, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Referencias guardadas en {args.baselines}")
+
+    if args.check:
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+        regressions = check(scenarios, baselines, args.tolerance)
+        for name, part, relative, reference in regressions:
+            print(f"REGRESIÓN {name} {part}: {relative:.4g} x referencia (guardado {reference:.4g})")
+        if regressions:
+            sys.exit(1)
+        print("Sin regresiones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import time
+import numpy as np
+
+# Mismas clases que el modelo COCO para las que cuenta process_frame
+NAMES = {0: "person", 1: "bicycle", 2: "car"}
+
+
+class StubBoxes:
+    """Imita results[0].boxes de ultralytics (xyxy, id, cls, conf como arrays)"""
+
+    def __init__(self, xyxy, ids, cls, conf):
+        self.xyxy = xyxy
+        self.id = ids if len(ids) else None
+        self.cls = cls
+        self.conf = conf
+
+
+class StubResult:
+    def __init__(self, boxes, inference_ms):
+        self.boxes = boxes
+        self.speed = {"preprocess": 0.0, "inference": inference_ms, "postprocess": 0.0}
+
+
+class StubModel:
+
+    def __init__(self, objects=5, cost=0.02, speed=4.0, box_size=40, seed=0):
+        """
+        Detector falso con coste fijo y cajas deterministas, para medir el pipeline sin YOLO
+
+        Los objetos se mueven en diagonal a velocidad constante y reaparecen por el
+        otro lado del frame, de modo que cruzan las líneas de conteo y se cuentan.
+
+        Argumentos:
+            objects: Número de objetos por frame
+            cost: Segundos que tarda cada llamada a track() (simula la inferencia)
+            speed: Píxeles que avanza cada objeto por frame
+            box_size: Lado de las cajas (píxeles)
+            seed: Semilla para las posiciones y clases iniciales
+        """
+        self.names = NAMES
+        self.objects = objects
+        self.cost = cost
+        self.speed = speed
+        self.box_size = box_size
+        rng = np.random.default_rng(seed)
+        self.start = rng.uniform(0, 1, (objects, 2))  # Posición inicial (fracción del frame)
+        self.direction = rng.choice([-1.0, 1.0], (objects, 2))
+        self.cls = rng.integers(0, len(NAMES), objects).astype(np.float32)
+        self.conf = rng.uniform(0.4, 0.95, objects).astype(np.float32)
+        self.ids = np.arange(1, objects + 1, dtype=np.float32)
+        self.calls = 0
+
+    def fuse(self):
+        return self
+
+    def boxes_for(self, width, height, index):
+        """Cajas del frame número index para un frame de width x height"""
+        span = np.array([width - self.box_size, height - self.box_size], dtype=np.float64)
+        position = self.start * span + self.direction * self.speed * index
+        position = np.abs(np.mod(position, 2 * span) - span)  # Rebote en los bordes
+        x1y1 = position
+        xyxy = np.hstack([x1y1, x1y1 + self.box_size]).astype(np.float32)
+        return StubBoxes(xyxy, self.ids, self.cls, self.conf)
+
+    def track(self, frame, conf=None, classes=None, **kwargs):
+        start = time.perf_counter()
+        height, width = frame.shape[:2]
+        boxes = self.boxes_for(width, height, self.calls)
+        self.calls += 1
+        # Filtrar por clase y confianza como el NMS de ultralytics
+        keep = np.ones(len(boxes.cls), dtype=bool)
+        if classes is not None:
+            keep &= np.isin(boxes.cls, classes)
+        if conf is not None:
+            keep &= boxes.conf >= conf
+        if not keep.all():
+            boxes = StubBoxes(boxes.xyxy[keep], boxes.id[keep],
+                              boxes.cls[keep], boxes.conf[keep])
+        # Completar el coste fijo. La inferencia real libera el GIL, así que se simula
+        # con una espera y no con un bucle que bloquearía a los demás hilos
+        remaining = self.cost - (time.perf_counter() - start)
+        if remaining > 0:
+            time.sleep(remaining)
+        return [StubResult(boxes, 1000 * (time.perf_counter() - start))]
+
+    def predict(self, frame, **kwargs):
+        return self.track(frame, **kwargs)
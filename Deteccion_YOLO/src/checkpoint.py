@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+import time
+
+from metrics import REGISTRY
+from log_utils import get_logger
+
+logger = get_logger("checkpoint")
+
+CHECKPOINT_VERSION = 1
+COUNTER_KEYS = ("total_count", "car_count", "person_count", "bici_count")
+
+
+def snapshot(shared_data, stream, tracker=None):
+    """
+    Copia compacta del estado de conteo: contadores y, si el tracker puede
+    reanudarse, sus tracks activos con la última posición y lo ya contado de cada uno
+
+    Se llama desde el hilo de proceso entre dos frames, así que no hay que
+    bloquear nada; el coste depende de los tracks activos, no del historial.
+    """
+    state = {
+        "version": CHECKPOINT_VERSION,
+        "stream": stream,
+        "time": time.time(),
+        "counters": {key: shared_data.get(key, 0) for key in COUNTER_KEYS},
+        "zone_counts": dict(shared_data.get("zone_counts", {})),
+    }
+    tracker_state = tracker.get_state() if tracker is not None else None
+    if tracker_state is not None:
+        positions = shared_data["track_last_positions"]
+        counted = shared_data["already_counted"]
+        zone_counted = {}
+        for track_id, zone in shared_data.get("zone_counted", ()):
+            zone_counted.setdefault(track_id, []).append(zone)
+        state["tracker"] = tracker_state
+        state["tracks"] = [
+            [track_id, list(positions[track_id]), track_id in counted, zone_counted.get(track_id, [])]
+            for track_id in tracker_state["ids"]
+            if track_id in positions
+        ]
+    return state
+
+
+def restore(shared_data, state, tracker=None):
+    """
+    Vuelve a poner en shared_data (y en el tracker) un estado de snapshot()
+
+    Los tracks solo se restauran si el tracker acepta su estado: con un tracker
+    que empieza los IDs de cero, los IDs antiguos se confundirían con los nuevos.
+
+    Returns:
+        True si se han restaurado también los tracks
+    """
+    for key in COUNTER_KEYS:
+        shared_data[key] = state["counters"].get(key, 0)
+    shared_data["zone_counts"] = dict(state.get("zone_counts", {}))
+    shared_data["already_counted"] = set()
+    shared_data["track_last_positions"] = {}
+    shared_data["zone_counted"] = set()
+    if "tracker" not in state or tracker is None or not tracker.set_state(state["tracker"]):
+        return False
+    for track_id, position, counted, zones in state["tracks"]:
+        shared_data["track_last_positions"][track_id] = tuple(position)
+        if counted:
+            shared_data["already_counted"].add(track_id)
+        shared_data["zone_counted"].update((track_id, zone) for zone in zones)
+    return True
+
+
+def load(path):
+    """Lee un checkpoint; None si no existe o no es válido"""
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Checkpoint {path} no válido, se ignora: {e}")
+        return None
+    if state.get("version") != CHECKPOINT_VERSION:
+        logger.warning(f"Checkpoint {path} de otra versión, se ignora")
+        return None
+    return state
+
+
+class Checkpointer:
+
+    def __init__(self, path, interval=10.0):
+        """
+        Guarda periódicamente el estado de conteo para recuperarlo tras reiniciar
+
+        El hilo de proceso solo comprueba la hora en cada frame y, cada interval
+        segundos, hace un snapshot en memoria; la escritura la hace un hilo propio en
+        un fichero temporal que sustituye al anterior con os.replace, de modo que
+        el checkpoint en disco siempre está completo aunque el proceso caiga a medias.
+
+        Args:
+            path: Fichero JSON del checkpoint
+            interval: Segundos entre checkpoints
+        """
+        self.path = path
+        self.interval = interval
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.last_checkpoint = time.monotonic()
+
+        self._pending = None  # Último snapshot sin escribir (los anteriores se descartan)
+        self._wakeup = threading.Event()
+        self._stop = False
+
+        # Estadísticas
+        self.written = 0
+        self.errors = 0
+        self.restored = 0
+
+        self.thread = threading.Thread(target=self._run, name="checkpoint", daemon=True)
+        self.thread.start()
+
+    def maybe_checkpoint(self, shared_data, stream, tracker=None):
+        """Llamar en cada frame: hace un snapshot si ha pasado el intervalo"""
+        now = time.monotonic()
+        if now - self.last_checkpoint < self.interval:
+            return
+        self.last_checkpoint = now
+        self.checkpoint(shared_data, stream, tracker)
+
+    def checkpoint(self, shared_data, stream, tracker=None):
+        """Hace un snapshot y lo deja para escribir sin bloquear"""
+        self._pending = snapshot(shared_data, stream, tracker)
+        self._wakeup.set()
+
+    def restore(self, shared_data, stream, tracker=None):
+        """Restaura el checkpoint guardado si es del mismo stream; devuelve si se ha restaurado"""
+        state = load(self.path)
+        if state is None or state["stream"] != stream:
+            return False
+        with_tracks = restore(shared_data, state, tracker)
+        self.restored += 1
+        logger.info(
+            f"Checkpoint restaurado (stream {stream}): total {shared_data['total_count']}"
+            + (f", {len(state['tracks'])} tracks" if with_tracks else ", sin tracks")
+        )
+        return True
+
+    def close(self, timeout=10):
+        """Escribe el snapshot pendiente y termina el hilo"""
+        self._stop = True
+        self._wakeup.set()
+        self.thread.join(timeout=timeout)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            state, self._pending = self._pending, None
+            if state is not None:
+                self._write(state)
+            if self._stop:
+                break
+
+    def _write(self, state):
+        start = time.perf_counter()
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(state, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)  # Atómico: o el checkpoint anterior o el nuevo
+        except (OSError, TypeError, ValueError) as e:
+            self.errors += 1
+            REGISTRY.inc("checkpoint_errors_total", help="Errores al escribir el checkpoint")
+            logger.error(f"Error escribiendo el checkpoint {self.path}: {e}")
+            return
+        self.written += 1
+        REGISTRY.inc("checkpoints_total", help="Checkpoints del estado de conteo escritos")
+        REGISTRY.observe("checkpoint_write_seconds", time.perf_counter() - start,
+                         help="Duración de la escritura de cada checkpoint")
+
+    def get_stats(self):
+        return {"written": self.written, "errors": self.errors, "restored": self.restored}
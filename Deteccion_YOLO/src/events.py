@@ -0,0 +1,176 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter, namedtuple
+
+from metrics import REGISTRY
+from log_utils import get_logger
+
+logger = get_logger("events")
+
+# Cruce de una línea de conteo por un objeto con track
+CrossingEvent = namedtuple("CrossingEvent", "timestamp stream track_id class_name line direction")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crossings (
+    ts REAL NOT NULL,
+    stream TEXT NOT NULL,
+    track_id INTEGER NOT NULL,
+    class TEXT NOT NULL,
+    line TEXT NOT NULL,
+    direction TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS crossings_ts ON crossings (ts);
+CREATE TABLE IF NOT EXISTS crossings_per_minute (
+    minute INTEGER NOT NULL,
+    stream TEXT NOT NULL,
+    class TEXT NOT NULL,
+    line TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (minute, stream, class, line, direction)
+) WITHOUT ROWID;
+"""
+
+INSERT_EVENT = "INSERT INTO crossings (ts, stream, track_id, class, line, direction) VALUES (?, ?, ?, ?, ?, ?)"
+UPSERT_MINUTE = """
+INSERT INTO crossings_per_minute (minute, stream, class, line, direction, count)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (minute, stream, class, line, direction) DO UPDATE SET count = count + excluded.count
+"""
+
+
+def connect(path):
+    """Abre la base de datos de eventos en modo WAL (lecturas sin bloquear la escritura)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class EventStore:
+
+    def __init__(self, path, batch_size=500, flush_interval=2.0, queue_size=10000):
+        """
+        Guarda los eventos de cruce en SQLite por lotes desde un hilo propio
+
+        add() solo encola; el hilo escribe cada lote en una transacción con
+        executemany y actualiza a la vez la tabla de agregados por minuto, de modo
+        que las consultas de semanas de datos no tienen que recorrer cada evento.
+
+        Args:
+            path: Fichero SQLite
+            batch_size: Eventos por lote como máximo
+            flush_interval: Segundos máximos que un evento espera a ser escrito
+            queue_size: Eventos pendientes como máximo (los que no caben se descartan)
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.connection = connect(path)
+
+        # Estadísticas
+        self.events_written = 0
+        self.events_dropped = 0
+        self.batches = 0
+        self.closed = False
+
+        self.thread = threading.Thread(target=self._run, name="event-store", daemon=True)
+        self.thread.start()
+
+    def add(self, events):
+        """Encola eventos de cruce sin bloquear"""
+        for event in events:
+            try:
+                if self.closed:
+                    # Tras close() el hilo no pasa del fin de cola: contarlo como descartado
+                    raise queue.Full
+                self.queue.put_nowait(event)
+            except queue.Full:
+                self.events_dropped += 1
+                REGISTRY.inc("crossing_events_dropped_total",
+                             help="Eventos de cruce descartados (cola llena o error al escribir)")
+
+    def close(self, timeout=10):
+        """Escribe lo pendiente y cierra la base de datos"""
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join(timeout=timeout)
+
+    def _run(self):
+        batch = []
+        deadline = None
+        running = True
+        while running:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                event = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                event = False  # Plazo cumplido: escribir lo que haya
+            if event is None:
+                running = False
+            elif event is not False:
+                batch.append(event)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+            if batch:
+                self._write(batch)
+                batch = []
+            deadline = None
+        self.connection.close()
+
+    def _write(self, batch):
+        minutes = Counter(
+            (int(e.timestamp // 60) * 60, e.stream, e.class_name, e.line, e.direction) for e in batch
+        )
+        start = time.perf_counter()
+        try:
+            with self.connection:  # Una transacción por lote
+                self.connection.executemany(INSERT_EVENT, batch)
+                self.connection.executemany(UPSERT_MINUTE, [key + (count,) for key, count in minutes.items()])
+        except sqlite3.Error as e:
+            self.events_dropped += len(batch)
+            REGISTRY.inc("crossing_events_dropped_total", len(batch),
+                         help="Eventos de cruce descartados (cola llena o error al escribir)")
+            logger.error(f"Error guardando {len(batch)} eventos de cruce: {e}")
+            return
+        REGISTRY.observe("event_batch_seconds", time.perf_counter() - start,
+                         help="Duración de la escritura de cada lote de eventos")
+        REGISTRY.inc("crossing_events_total", len(batch), help="Eventos de cruce guardados")
+        self.events_written += len(batch)
+        self.batches += 1
+
+    def get_stats(self):
+        return {
+            "events_written": self.events_written,
+            "events_dropped": self.events_dropped,
+            "batches": self.batches,
+            "queue": self.queue.qsize(),
+        }
+
+
+def query_per_minute(path, start, end, stream=None):
+    """
+    Conteos por minuto, clase, línea y sentido entre dos instantes (time.time())
+
+    Returns:
+        Lista de tuplas (minuto, stream, clase, línea, sentido, conteo)
+    """
+    connection = connect(path)
+    try:
+        sql = "SELECT minute, stream, class, line, direction, count FROM crossings_per_minute WHERE minute >= ? AND minute < ?"
+        params = [int(start // 60) * 60, end]
+        if stream is not None:
+            sql += " AND stream = ?"
+            params.append(stream)
+        return connection.execute(sql + " ORDER BY minute", params).fetchall()
+    finally:
+        connection.close()
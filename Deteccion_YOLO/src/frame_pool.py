@@ -0,0 +1,63 @@
+import threading
+
+import numpy
+
+from metrics import REGISTRY
+
+
+class FramePool:
+
+    def __init__(self, max_buffers=8, name="frames"):
+        """
+        Pool de buffers de frames reutilizables, para no reservar un array nuevo
+        por frame (a 30 fps por stream la presión sobre el allocator se nota)
+
+        Solo se recuperan los buffers entregados por acquire(): release() ignora
+        cualquier otro array, así que se puede llamar con frames de otra procedencia
+        (p. ej. los del receptor UDP, que siguen referenciados como keyframes).
+
+        Args:
+            max_buffers: Buffers libres que se guardan por forma y tipo
+            name: Nombre del pool en las métricas
+        """
+        self.max_buffers = max_buffers
+        self.name = name
+        self._free = {}  # (forma, dtype) -> [buffers libres]
+        self._leased = {}  # id(buffer) -> buffer entregado y aún no devuelto
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(shape, dtype):
+        return tuple(shape), numpy.dtype(dtype).str
+
+    def acquire(self, shape, dtype=numpy.uint8):
+        """Devuelve un buffer de la forma y tipo pedidos (contenido sin inicializar)"""
+        key = self._key(shape, dtype)
+        with self._lock:
+            free = self._free.get(key)
+            reused = bool(free)
+            buffer = free.pop() if reused else numpy.empty(shape, dtype)
+            self._leased[id(buffer)] = buffer
+        if reused:
+            REGISTRY.inc("frame_pool_reuses_total", help="Buffers de frame reutilizados", pool=self.name)
+        else:
+            REGISTRY.inc("frame_pool_allocations_total", help="Buffers de frame reservados", pool=self.name)
+        return buffer
+
+    def release(self, buffer):
+        """Devuelve al pool un buffer de acquire(); otros arrays se ignoran"""
+        if buffer is None:
+            return
+        with self._lock:
+            if self._leased.pop(id(buffer), None) is None:
+                return
+            free = self._free.setdefault(self._key(buffer.shape, buffer.dtype), [])
+            if len(free) < self.max_buffers:
+                free.append(buffer)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "leased": len(self._leased),
+                "free": sum(len(free) for free in self._free.values()),
+            }
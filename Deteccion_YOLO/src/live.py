@@ -0,0 +1,130 @@
+import os
+import shutil
+import subprocess
+import time
+
+from recorder import BackgroundFrameWriter
+from metrics import REGISTRY
+from log_utils import get_logger
+
+logger = get_logger("live")
+
+PLAYLIST_NAME = "live.m3u8"  # Lista HLS que sirve el backend en /live
+
+
+class HLSStreamer(BackgroundFrameWriter):
+
+    def __init__(self, directory, fps=20, segment_seconds=1, list_size=6, bitrate="1500k",
+                 ffmpeg="ffmpeg", queue_size=30, annotated=True, restart_delay=5.0):
+        """
+        Emite el vídeo en directo como HLS con segmentos fMP4 cortos
+
+        Pasa los frames en crudo a un proceso ffmpeg que codifica en H.264 y escribe
+        en el directorio los segmentos y la lista live.m3u8. El backend solo tiene
+        que servir ese directorio como ficheros estáticos, así que el número de
+        espectadores no multiplica el tráfico por frame del detector ni de Node.
+
+        Args:
+            directory: Directorio de la lista y los segmentos
+            fps: FPS de la salida
+            segment_seconds: Duración de cada segmento (y del GOP); menos es menos latencia
+            list_size: Segmentos que se mantienen en la lista (los anteriores se borran)
+            bitrate: Bitrate objetivo del vídeo
+            ffmpeg: Ejecutable de ffmpeg
+            queue_size: Frames pendientes de codificar como máximo
+            annotated: Emitir los frames anotados (True) o los originales (False)
+            restart_delay: Segundos de espera antes de relanzar ffmpeg si falla
+        """
+        super().__init__(queue_size, annotated, name="video-live")
+        self.directory = directory
+        self.fps = fps
+        self.segment_seconds = segment_seconds
+        self.list_size = list_size
+        self.bitrate = bitrate
+        self.ffmpeg = ffmpeg
+        self.restart_delay = restart_delay
+        self.playlist_path = os.path.join(directory, PLAYLIST_NAME)
+        os.makedirs(directory, exist_ok=True)
+
+        self.process = None
+        self.frame_size = None  # (ancho, alto) con el que se lanzó ffmpeg
+        self.failed_at = None  # Último fallo de ffmpeg (para no relanzarlo en bucle)
+        self.frames_written = 0
+
+        self.thread.start()
+
+    def _command(self, width, height):
+        gop = max(1, int(round(self.fps * self.segment_seconds)))
+        return [
+            self.ffmpeg, "-loglevel", "error", "-y",
+            # Entrada: frames BGR en crudo por stdin, con la hora de llegada como marca
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}",
+            "-use_wallclock_as_timestamps", "1", "-i", "-",
+            # H.264 de baja latencia con un keyframe al inicio de cada segmento
+            "-c:v", "libx264", "-preset", "veryfast", "-tune", "zerolatency",
+            "-pix_fmt", "yuv420p", "-r", str(self.fps), "-b:v", self.bitrate,
+            "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+            # HLS con segmentos fMP4
+            "-f", "hls", "-hls_time", str(self.segment_seconds),
+            "-hls_list_size", str(self.list_size),
+            "-hls_flags", "delete_segments+independent_segments+temp_file",
+            "-hls_segment_type", "fmp4", "-hls_fmp4_init_filename", "init.mp4",
+            "-hls_segment_filename", os.path.join(self.directory, "live_%06d.m4s"),
+            self.playlist_path,
+        ]
+
+    def _start(self, width, height):
+        if self.failed_at is not None and time.monotonic() - self.failed_at < self.restart_delay:
+            return
+        if shutil.which(self.ffmpeg) is None:
+            logger.error(f"No se encuentra {self.ffmpeg}: no hay salida HLS en directo")
+            self.failed_at = time.monotonic()
+            return
+        self.process = subprocess.Popen(self._command(width, height), stdin=subprocess.PIPE)
+        self.frame_size = (width, height)
+        self.failed_at = None
+        logger.info(f"Salida HLS en {self.playlist_path} ({width}x{height})")
+
+    def _stop(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def _write_frame(self, frame, timestamp):
+        height, width = frame.shape[:2]
+        if self.process is not None and (width, height) != self.frame_size:
+            self._stop()  # Cambio de resolución: nueva lista con el tamaño nuevo
+        if self.process is None:
+            self._start(width, height)
+            if self.process is None:
+                return
+        try:
+            self.process.stdin.write(frame.data)
+        except (BrokenPipeError, OSError) as e:
+            logger.error(f"ffmpeg ha terminado ({e}); se relanzará en {self.restart_delay} s")
+            REGISTRY.inc("live_restarts_total", help="Relanzamientos del proceso ffmpeg de la salida HLS")
+            self._stop()
+            self.failed_at = time.monotonic()
+            return
+        self.frames_written += 1
+        REGISTRY.inc("live_frames_total", help="Frames enviados a la salida HLS")
+
+    def _finish(self):
+        self._stop()
+
+    def get_stats(self):
+        return {
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped,
+            "running": self.process is not None,
+            "queue": self.queue.qsize(),
+        }
@@ -0,0 +1,46 @@
+import logging
+import threading
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+
+def setup_logging(level="INFO"):
+    """Configura el logging del detector con el nivel indicado (p. ej. 'DEBUG', 'INFO')"""
+    logging.basicConfig(level=getattr(logging, str(level).upper(), logging.INFO), format=LOG_FORMAT)
+
+
+def get_logger(name):
+    """Devuelve el logger del módulo indicado dentro de la jerarquía 'hired5g'"""
+    return logging.getLogger(f"hired5g.{name}")
+
+
+def log_event(logger, level, message, **fields):
+    """
+    Registra un mensaje con campos clave=valor.
+    Si el nivel no está activo, no se formatea nada.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if fields:
+        message = message + " " + " ".join(f"{k}={v}" for k, v in fields.items())
+    logger.log(level, message)
+
+
+class SampledLog:
+    """Registra solo 1 de cada `every` mensajes de un evento repetitivo (p. ej. por paquete)"""
+
+    def __init__(self, logger, every=100, level=logging.DEBUG):
+        self.logger = logger
+        self.every = max(1, every)
+        self.level = level
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def log(self, key, message, **fields):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        with self.lock:
+            count = self.counts.get(key, 0)
+            self.counts[key] = count + 1
+        if count % self.every == 0:
+            log_event(self.logger, self.level, message, sampled=self.every, **fields)
@@ -1,118 +1,506 @@
-from ultralytics import YOLO
-import cv2
+import argparse
 import json
+import os
+import signal
+import subprocess
+import sys
 import threading
-from video_utils import video_loop
-from network_utils import VideoUDPReceiver
-
-# Se cargan las opciones del fichero model.json
-with open("./config/model.json") as config_file:
-    model_config = json.load(config_file)
-
-# Se cargan las opciones del fichero video.json
-with open("./config/video.json") as config_file:
-    video_config = json.load(config_file)
-
-# Se cargan las opciones del fichero network.json
-with open("./config/network.json") as config_file:
-    network_config = json.load(config_file)
-
-# Parámetros del modelo
-MODEL_PATH = model_config["MODEL_PATH"]  # Ruta al modelo YOLOv8 preentrenado
-CONFIDENCE = model_config[
-    "CONFIDENCE"
-]  # Confianza mínima para considerar una detección válida
-IOU = model_config["IOU"]  # Umbral de IoU
-IMG_SIZE = tuple(model_config["IMG_SIZE"])  # Tamaño de la imagen para el modelo
-FPS_CAP = model_config["FPS_CAP"]  # Limitar los FPS para mejorar rendimiento
-DETECTION_CLASSES = model_config[
-    "DETECTION_CLASSES"
-]  # Clases a detectar (1: bicicleta, 2: coche,3: moto, 5: bus, 7: camión)
-TRACKER = model_config["TRACKER"]  # Ruta al archivo de configuración del tracker
-LINE_ORIENTATION = model_config["LINE_ORIENTATION"]  # Orientación de la línea de conteo
-
-# Parámetros de la captura de video
-VIDEO_SOURCE = video_config["VIDEO_SOURCE"]  # Fuente de video
-OUTPUT_PATH = video_config["OUTPUT_PATH"]  # Ruta de salida para el video procesado
-SHOW_WINDOW = video_config["SHOW_WINDOW"]  # Mostrar o no ventana de video
-PROCESSING_QUEUE_SIZE = video_config[
-    "PROCESSING_QUEUE_SIZE"
-]  # Tamaño de la cola de procesamiento
-
-# Parámetros de la red
-SENDER_HOST = network_config.get("SENDER_HOST")  # Dirección IP a recibir por UDP
-SENDER_PORT = network_config.get("SENDER_PORT")  # Puerto UDP
-QUEUE_SIZE = network_config.get("QUEUE_SIZE")  # Tamaño de la cola del receptor UDP
-SERVER_URL = network_config.get("SERVER_URL")  # URL del servidor HTTP para enviar video
-
-
-# Usamos UDP para recibir video
-if VIDEO_SOURCE == "socket":
+import time
+
+# Solo se importa la biblioteca estándar al cargar el módulo: cada subcomando
+# importa lo que necesita, de modo que las herramientas y los health checks no
+# pagan los segundos que tarda en cargarse torch/ultralytics
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join(SRC_DIR, "..", "bench")
+BENCHES = {"process-frame": "process_frame_bench.py", "pipeline": "pipeline_bench.py"}
+EXPORT_FORMATS = ("onnx", "engine", "openvino", "ncnn", "torchscript", "tflite")
+
+
+def load_config(config_dir):
+    """Lee model.json, video.json y network.json del directorio de configuración"""
+    configs = []
+    for name in ("model", "video", "network"):
+        with open(os.path.join(config_dir, f"{name}.json")) as config_file:
+            configs.append(json.load(config_file))
+    return configs
+
+
+def load_model(model_path):
+    """Carga el modelo YOLO (también al recargar la configuración)"""
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+    model.fuse()  # Optimiza el modelo
+    return model
+
+
+def run(args):
+    """Detector completo: captura, detección, conteo y envío"""
+    import cv2
+    from video_utils import video_loop
+    from network_utils import VideoUDPReceiver, VideoHTTPSender
+    from recorder import SegmentRecorder
+    from live import HLSStreamer
+    from events import EventStore
+    from checkpoint import Checkpointer
+    from tracing import LatencyTracker
+    from trackers import create_tracker
+    from reload import DetectorState, HotReloader, class_confidence_from_config, zones_from_config
+    from metrics import REGISTRY, MetricsServer
+    from log_utils import setup_logging
+
+    model_config, video_config, network_config = load_config(args.config_dir)
+
+    # Parámetros del modelo
+    MODEL_PATH = model_config["MODEL_PATH"]  # Ruta al modelo YOLOv8 preentrenado
+    CONFIDENCE = model_config[
+        "CONFIDENCE"
+    ]  # Confianza mínima para considerar una detección válida
+    IOU = model_config["IOU"]  # Umbral de IoU
+    IMG_SIZE = tuple(model_config["IMG_SIZE"])  # Tamaño de la imagen para el modelo
+    FPS_CAP = model_config["FPS_CAP"]  # Limitar los FPS para mejorar rendimiento
+    DETECTION_CLASSES = model_config[
+        "DETECTION_CLASSES"
+    ]  # Clases a detectar (1: bicicleta, 2: coche,3: moto, 5: bus, 7: camión)
+    CLASS_CONFIDENCE = class_confidence_from_config(
+        model_config
+    )  # Confianza mínima por clase (las demás usan CONFIDENCE)
+    TRACKER = model_config["TRACKER"]  # Ruta al archivo de configuración del tracker
+    TRACKER_BACKEND = model_config.get(
+        "TRACKER_BACKEND", "ultralytics"
+    )  # "ultralytics" (tracker del YAML anterior) o "iou" (asociación IoU ligera)
+    IOU_TRACKER = model_config.get("IOU_TRACKER", {})  # Parámetros del tracker "iou"
+    ZONES = zones_from_config(model_config)  # Líneas y polígonos de ZONES (si hay) o LINE_ORIENTATION
+
+    # Parámetros de la captura de video
+    VIDEO_SOURCE = args.source or video_config["VIDEO_SOURCE"]  # Fuente de video
+    if isinstance(VIDEO_SOURCE, str) and VIDEO_SOURCE.isdigit():
+        VIDEO_SOURCE = int(VIDEO_SOURCE)  # Índice de cámara desde la línea de comandos
+    OUTPUT_PATH = video_config["OUTPUT_PATH"]  # Directorio de los segmentos grabados (vacío = no grabar)
+    RECORD_SEGMENT_SECONDS = video_config.get(
+        "RECORD_SEGMENT_SECONDS", 60
+    )  # Duración máxima de cada segmento grabado
+    RECORD_MAX_SEGMENTS = video_config.get(
+        "RECORD_MAX_SEGMENTS", 0
+    )  # Segmentos que se conservan en disco (0 = todos)
+    RECORD_ANNOTATED = video_config.get(
+        "RECORD_ANNOTATED", True
+    )  # Grabar los frames anotados (true) o los originales (false)
+    RECORD_CODEC = video_config.get("RECORD_CODEC", "avc1")  # FourCC del códec de grabación
+    LIVE_PATH = video_config.get("LIVE_PATH", "")  # Directorio de la salida HLS en directo (vacío = desactivada)
+    LIVE_SEGMENT_SECONDS = video_config.get("LIVE_SEGMENT_SECONDS", 1)  # Duración de los segmentos HLS
+    LIVE_LIST_SIZE = video_config.get("LIVE_LIST_SIZE", 6)  # Segmentos en la lista HLS
+    EVENTS_DB = video_config.get("EVENTS_DB", "")  # Base de datos SQLite de eventos de cruce (vacío = no guardar)
+    CHECKPOINT_PATH = video_config.get(
+        "CHECKPOINT_PATH", ""
+    )  # Checkpoint de contadores y tracks para seguir tras reiniciar (vacío = desactivado)
+    CHECKPOINT_INTERVAL = video_config.get("CHECKPOINT_INTERVAL", 10)  # Segundos entre checkpoints
+    SHOW_WINDOW = video_config["SHOW_WINDOW"]  # Mostrar o no ventana de video
+    PROCESSING_QUEUE_SIZE = video_config[
+        "PROCESSING_QUEUE_SIZE"
+    ]  # Tamaño de la cola de procesamiento
+    LATENCY_REPORT_PATH = video_config.get(
+        "LATENCY_REPORT_PATH"
+    )  # Fichero JSON donde exportar los histogramas de latencia al salir
+    ANNOTATION = video_config.get(
+        "ANNOTATION", "auto"
+    )  # Dibujar detecciones: "auto" (si se muestran o suben frames), "full" o "none"
+
+    # Parámetros de la red
+    SENDER_HOST = network_config.get("SENDER_HOST")  # Dirección IP a recibir por UDP
+    SENDER_PORT = network_config.get("SENDER_PORT")  # Puerto UDP
+    QUEUE_SIZE = network_config.get("QUEUE_SIZE")  # Tamaño de la cola del receptor UDP
+    SERVER_URL = network_config.get("SERVER_URL")  # URL del servidor HTTP para enviar video
+    UPLINK_MODE = network_config.get("UPLINK_MODE", "frame")  # "frame": frame anotado + contadores, "metadata": solo contadores
+    METRICS_HOST = network_config.get("METRICS_HOST", "127.0.0.1")  # Interfaz del endpoint de métricas
+    METRICS_PORT = network_config.get("METRICS_PORT")  # Puerto del endpoint /metrics (vacío = desactivado)
+    CONFIG_RELOAD_INTERVAL = video_config.get(
+        "CONFIG_RELOAD_INTERVAL", 2
+    )  # Segundos entre comprobaciones de model.json (0 = recargar solo con SIGHUP)
+    LOG_LEVEL = network_config.get("LOG_LEVEL", "INFO")  # Nivel de logging (DEBUG, INFO, WARNING...)
+
+    setup_logging(args.log_level or LOG_LEVEL)
+
+    # Usamos UDP para recibir video
+    if VIDEO_SOURCE == "socket":
+        receiver = VideoUDPReceiver(
+            host=SENDER_HOST,
+            port=SENDER_PORT,
+            queue_size=QUEUE_SIZE,
+            auto_start=True
+        )
+        # Los demás parámetros usarán valores por defecto
+        cap = receiver
+    else:
+        # Capturamos el vídeo desde la interfaz deseada
+        cap = cv2.VideoCapture(VIDEO_SOURCE)
+
+        # Configuramos el tamaño y los FPS de la captura
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, IMG_SIZE[0])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, IMG_SIZE[1])
+        cap.set(cv2.CAP_PROP_FPS, FPS_CAP)
+
+        if not cap.isOpened():
+            print("Error: no se puede abrir el vídeo:", VIDEO_SOURCE)
+            return 1
+
+    # Cargamos el modelo YOLOv8
+    model = load_model(MODEL_PATH)
+
+    # Tracker que asigna los IDs a las detecciones
+    tracker = create_tracker(TRACKER_BACKEND, IOU_TRACKER, TRACKER)
+
+    # Recarga de model.json en caliente: al cambiar el fichero o con SIGHUP
+    reloader = HotReloader(
+        DetectorState(model, tracker, DETECTION_CLASSES, CONFIDENCE, IOU, CLASS_CONFIDENCE, ZONES, 0),
+        model_config,
+        os.path.join(args.config_dir, "model.json"),
+        load_model,
+        create_tracker,
+        IMG_SIZE,
+        interval=CONFIG_RELOAD_INTERVAL,
+    )
+    reloader.start()
+    if hasattr(signal, "SIGHUP"):  # No existe en Windows
+        signal.signal(signal.SIGHUP, lambda signum, frame: reloader.request())
+
+    # Variables compartidas entre hilos
+    shared_data = {
+        "total_count": 0,  # Contador total de coches
+        "already_counted": set(),  # IDs de objetos ya contados
+        "track_last_positions": {},  # última posición del objeto a contar
+        "zone_counts": {},  # Cruces por zona
+        "zone_counted": set(),  # (ID, zona) ya contados
+        "car_count": 0,
+        "person_count": 0,
+        "bici_count": 0,
+    }
+
+    # Grabación en segmentos; cada segmento cerrado se sube al servidor en segundo plano
+    recorder = None
+    if OUTPUT_PATH:
+        on_segment = None
+        if SERVER_URL:
+            segment_sender = VideoHTTPSender(SERVER_URL)
+
+            def on_segment(segment):
+                threading.Thread(target=segment_sender.upload_segment, args=(segment,), daemon=True).start()
+
+        recorder = SegmentRecorder(
+            OUTPUT_PATH,
+            fps=FPS_CAP,
+            segment_seconds=RECORD_SEGMENT_SECONDS,
+            codec=RECORD_CODEC,
+            max_segments=RECORD_MAX_SEGMENTS,
+            annotated=RECORD_ANNOTATED,
+            on_segment=on_segment,
+        )
+
+    # Salida HLS en directo, servida por el backend en /live
+    live = None
+    if LIVE_PATH:
+        live = HLSStreamer(
+            LIVE_PATH,
+            fps=FPS_CAP,
+            segment_seconds=LIVE_SEGMENT_SECONDS,
+            list_size=LIVE_LIST_SIZE,
+        )
+
+    # Eventos de cruce de las líneas, guardados por lotes con agregados por minuto
+    event_store = EventStore(EVENTS_DB) if EVENTS_DB else None
+
+    # Checkpoint del conteo, restaurado cuando vuelve el mismo stream
+    checkpointer = Checkpointer(CHECKPOINT_PATH, CHECKPOINT_INTERVAL) if CHECKPOINT_PATH else None
+
+    # Histogramas de latencia por etapa del pipeline
+    latency_tracker = LatencyTracker()
+    REGISTRY.register_latency_tracker(latency_tracker)
+
+    # Endpoint HTTP local con las métricas en formato Prometheus
+    metrics_server = None
+    if METRICS_PORT:
+        metrics_server = MetricsServer(host=METRICS_HOST, port=METRICS_PORT)
+        metrics_server.start()
+
+
+    # Hilo creado para la captura y procesamiento de video
+    video_thread = threading.Thread(
+        target=video_loop,
+        args=(
+            cap,
+            model,
+            DETECTION_CLASSES,
+            CONFIDENCE,
+            IOU,
+            IMG_SIZE,
+            tracker,
+            ZONES,
+            SHOW_WINDOW,
+            SERVER_URL,
+            PROCESSING_QUEUE_SIZE,
+            shared_data,
+            latency_tracker,
+            ANNOTATION,
+            UPLINK_MODE,
+            CLASS_CONFIDENCE,
+            recorder,
+            live,
+            event_store,
+            reloader,
+            checkpointer,
+        ),
+    )
+
+    video_thread.start()  # Inicia el hilo
+    try:
+        while video_thread.is_alive():
+            video_thread.join(timeout=1)  # Espera con timeout para poder capturar Ctrl+C
+    except KeyboardInterrupt:
+        print("Interrupción detectada. Cerrando...")
+    finally:
+        if hasattr(cap, "release"):
+            cap.release()  # Liberar recursos de la captura
+        # Con la captura cerrada el hilo de vídeo vacía la cola y hace el último
+        # checkpoint: esperarle antes de cerrar las salidas que todavía usa
+        video_thread.join(timeout=10)
+        if video_thread.is_alive():
+            print("El hilo de vídeo no ha terminado; se cierran las salidas igualmente")
+        if SHOW_WINDOW:
+            cv2.destroyAllWindows()  # Cerrar todas las ventanas de OpenCV
+        if recorder:
+            recorder.close()  # Escribir lo pendiente y cerrar el último segmento
+            print("Grabación:", json.dumps(recorder.get_stats()))
+        if live:
+            live.close()
+            print("Directo:", json.dumps(live.get_stats()))
+        if event_store:
+            event_store.close()  # Escribir el último lote
+            print("Eventos:", json.dumps(event_store.get_stats()))
+        if checkpointer:
+            checkpointer.close()  # Escribir el último checkpoint
+            print("Checkpoints:", json.dumps(checkpointer.get_stats()))
+        print("Latencias por etapa:")
+        print(latency_tracker.summary())
+        reloader.stop()
+        print("Tracker:", json.dumps(reloader.state.tracker.get_stats()))
+        print("Recargas:", json.dumps(reloader.get_stats()))
+        if LATENCY_REPORT_PATH:
+            latency_tracker.export_json(LATENCY_REPORT_PATH)  # Exportar histogramas
+        if metrics_server:
+            metrics_server.stop()
+
+    return 0
+
+
+def receive_only(args):
+    """Solo el receptor UDP: comprueba que llega el stream sin cargar el modelo"""
+    from network_utils import VideoUDPReceiver, RECEIVER_COUNTERS
+    from metrics import REGISTRY
+    from log_utils import setup_logging
+
+    _, _, network_config = load_config(args.config_dir)
+    setup_logging(args.log_level or network_config.get("LOG_LEVEL", "INFO"))
     receiver = VideoUDPReceiver(
-        host=SENDER_HOST,
-        port=SENDER_PORT,
-        queue_size=QUEUE_SIZE,
-        auto_start=True
+        host=args.host or network_config.get("SENDER_HOST"),
+        port=args.port or network_config.get("SENDER_PORT"),
+        queue_size=network_config.get("QUEUE_SIZE"),
+        auto_start=True,
     )
-    # Los demás parámetros usarán valores por defecto
-    cap = receiver
-else:
-    # Capturamos el vídeo desde la interfaz deseada
-    cap = cv2.VideoCapture(VIDEO_SOURCE)
-
-    # Configuramos el tamaño y los FPS de la captura
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, IMG_SIZE[0])
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, IMG_SIZE[1])
-    cap.set(cv2.CAP_PROP_FPS, FPS_CAP)
-
-    if not cap.isOpened():
-        print("Error: no se puede abrir el vídeo:", VIDEO_SOURCE)
-        exit()
-
-
-# Cargamos el modelo YOLOv8
-model = YOLO(MODEL_PATH)
-model.fuse()  # Optimiza el modelo
-
-# Variables compartidas entre hilos
-shared_data = {
-    "total_count": 0,  # Contador total de coches
-    "already_counted": set(),  # IDs de objetos ya contados
-    "track_last_positions": {},  # última posición del objeto a contar
-    "car_count": 0,
-    "person_count": 0,
-    "bici_count": 0,
-}
-
-
-# Programa principal
-
-# Hilo creado para la captura y procesamiento de video
-video_thread = threading.Thread(
-    target=video_loop,
-    args=(
-        cap,
-        model,
-        DETECTION_CLASSES,
-        CONFIDENCE,
-        IOU,
-        IMG_SIZE,
-        TRACKER,
-        LINE_ORIENTATION,
-        SHOW_WINDOW,
-        SERVER_URL,
-        PROCESSING_QUEUE_SIZE,
-        shared_data,
-    ),
-)
-
-video_thread.start()  # Inicia el hilo
-try:
-    while video_thread.is_alive():
-        video_thread.join(timeout=1)  # Espera con timeout para poder capturar Ctrl+C
-except KeyboardInterrupt:
-    print("Interrupción detectada. Cerrando...")
-finally:
-    if hasattr(cap, "release"):
-        cap.release()  # Liberar recursos de la captura
-    cv2.destroyAllWindows()  # Cerrar todas las ventanas de OpenCV
+    if args.show:
+        import cv2
+
+    labels = receiver.metrics_labels
+    frames = 0
+    interval_frames = 0
+    start = last_report = time.monotonic()
+    try:
+        while args.duration is None or time.monotonic() - start < args.duration:
+            frame = receiver.get_frame(timeout=0.5)
+            if frame is not None:
+                frames += 1
+                interval_frames += 1
+                if args.show:
+                    cv2.imshow("Receptor UDP", frame)
+                    if cv2.waitKey(1) & 0xFF == ord("q"):
+                        break
+            now = time.monotonic()
+            if now - last_report >= args.interval:
+                print(json.dumps({
+                    "stream": receiver.get_stream_id(),
+                    "frames": frames,
+                    "fps": round(interval_frames / (now - last_report), 2),
+                    "queue": receiver.get_queue_size(),
+                    **{name: REGISTRY.get_counter(name, **labels) for name in RECEIVER_COUNTERS},
+                }), flush=True)
+                interval_frames = 0
+                last_report = now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        receiver.release()
+        if args.show:
+            cv2.destroyAllWindows()
+    print(json.dumps({"frames": frames, "playout": receiver.get_playout_stats()}, indent=2))
+    return 0
+
+
+def replay(args):
+    """Reproduce una captura de udp_capture.py hacia el detector o contra un receptor local"""
+    from udp_capture import UDPReplayer, replay_to_receiver
+
+    _, _, network_config = load_config(args.config_dir)
+    port = args.port or network_config.get("SENDER_PORT")
+    replayer = UDPReplayer(args.capture, args.host, port, speed=args.speed, loss=args.loss,
+                           reorder=args.reorder, reorder_depth=args.reorder_depth,
+                           duplicate=args.duplicate, seed=args.seed)
+    stats = replay_to_receiver(replayer, port) if args.receive else replayer.run()
+    print(json.dumps(stats, indent=2))
+    return 0
+
+
+def bench(args):
+    """Lanza uno de los benchmarks de bench/ con sus propios argumentos"""
+    import runpy
+
+    path = os.path.join(BENCH_DIR, BENCHES[args.name])
+    sys.argv = [path] + args.bench_args
+    sys.path.insert(0, BENCH_DIR)  # Como al lanzar el script directamente
+    runpy.run_path(path, run_name="__main__")
+    return 0
+
+
+def export_model(args):
+    """Exporta el modelo a un formato de inferencia (ONNX, TensorRT, OpenVINO...)"""
+    from ultralytics import YOLO
+
+    model_config, _, _ = load_config(args.config_dir)
+    model = YOLO(args.model or model_config["MODEL_PATH"])
+    path = model.export(
+        format=args.format,
+        imgsz=list(model_config["IMG_SIZE"]),  # El mismo tamaño con el que se llama al modelo
+        half=args.half,
+        int8=args.int8,
+        device=args.device,
+    )
+    print(path)
+    return 0
+
+
+def health(args):
+    """Comprobaciones rápidas (sin OpenCV ni torch): configuración, ficheros y endpoint de métricas"""
+    import urllib.request
+
+    checks = {}
+    try:
+        model_config, video_config, network_config = load_config(args.config_dir)
+        checks["config"] = "ok"
+    except (OSError, ValueError) as e:
+        print(json.dumps({"config": f"error: {e}"}, indent=2))
+        return 1
+    checks["model"] = "ok" if os.path.exists(model_config["MODEL_PATH"]) else "no existe " + model_config["MODEL_PATH"]
+    if model_config.get("TRACKER_BACKEND", "ultralytics") == "ultralytics":
+        checks["tracker"] = "ok" if os.path.exists(model_config["TRACKER"]) else "no existe " + model_config["TRACKER"]
+    if network_config.get("METRICS_PORT"):
+        url = f"http://{network_config.get('METRICS_HOST', '127.0.0.1')}:{network_config['METRICS_PORT']}/metrics"
+        try:
+            with urllib.request.urlopen(url, timeout=args.timeout) as response:
+                response.read()
+            checks["metrics"] = "ok"
+        except OSError as e:
+            checks["metrics"] = f"error: {e}"
+    checkpoint_path = video_config.get("CHECKPOINT_PATH")
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        checks["checkpoint_age_s"] = round(time.time() - os.path.getmtime(checkpoint_path), 1)
+    print(json.dumps(checks, indent=2))
+    failed = [name for name, result in checks.items() if isinstance(result, str) and result != "ok"]
+    return 1 if failed else 0
+
+
+def profile_imports(argv):
+    """Vuelve a lanzar el comando con -X importtime y muestra las importaciones más lentas"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", os.path.abspath(__file__)] + argv,
+                            stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            if not line.startswith("import time:"):
+                print(line, file=sys.stderr)  # Salida de error del propio comando
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if len(name) - len(name.lstrip()) == 1:  # Un espacio: importado por el propio comando
+            imports.append((int(cumulative), name.strip()))
+    imports.sort(reverse=True)
+    print(f"\nImportaciones de primer nivel más lentas (total del comando {elapsed:.2f} s):")
+    for cumulative, name in imports[:15]:
+        print(f"  {cumulative / 1000:9.1f} ms  {name}")
+    return result.returncode
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(description="Detector de vehículos HIRED-5G")
+    parser.add_argument("--config-dir", default="./config", help="Directorio de model.json, video.json y network.json")
+    parser.add_argument("--log-level", help="Nivel de logging (por defecto LOG_LEVEL de network.json)")
+    parser.add_argument("--profile-imports", action="store_true",
+                        help="Medir el tiempo de importación de cada módulo (python -X importtime)")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser("run", help="Detector completo (por defecto)")
+    run_parser.add_argument("--source", help="Fuente de vídeo en lugar de VIDEO_SOURCE ('socket', fichero o cámara)")
+
+    receive = subparsers.add_parser("receive-only", help="Recibir el stream UDP sin modelo y mostrar estadísticas")
+    receive.add_argument("--host", help="Dirección en la que escuchar (por defecto SENDER_HOST)")
+    receive.add_argument("--port", type=int, help="Puerto UDP (por defecto SENDER_PORT)")
+    receive.add_argument("--duration", type=float, help="Segundos a recibir (por defecto hasta Ctrl+C)")
+    receive.add_argument("--interval", type=float, default=1.0, help="Segundos entre informes")
+    receive.add_argument("--show", action="store_true", help="Mostrar los frames recibidos")
+
+    replay_parser = subparsers.add_parser("replay", help="Reproducir una captura UDP de udp_capture.py")
+    replay_parser.add_argument("capture", help="Fichero de captura")
+    replay_parser.add_argument("--host", default="127.0.0.1")
+    replay_parser.add_argument("--port", type=int, help="Puerto de destino (por defecto SENDER_PORT)")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="Factor de velocidad (0 = máxima)")
+    replay_parser.add_argument("--loss", type=float, default=0.0, help="Probabilidad de pérdida")
+    replay_parser.add_argument("--reorder", type=float, default=0.0, help="Probabilidad de desorden")
+    replay_parser.add_argument("--reorder-depth", type=int, default=3)
+    replay_parser.add_argument("--duplicate", type=float, default=0.0, help="Probabilidad de duplicado")
+    replay_parser.add_argument("--seed", type=int, help="Semilla de las alteraciones")
+    replay_parser.add_argument("--receive", action="store_true",
+                               help="Reproducir contra un VideoUDPReceiver local y medir lo entregado")
+
+    bench_parser = subparsers.add_parser("bench", help="Lanzar un benchmark de bench/")
+    bench_parser.add_argument("name", choices=sorted(BENCHES))
+    bench_parser.add_argument("bench_args", nargs=argparse.REMAINDER, help="Argumentos del benchmark")
+
+    export = subparsers.add_parser("export-model", help="Exportar el modelo para inferencia optimizada")
+    export.add_argument("--model", help="Modelo a exportar (por defecto MODEL_PATH)")
+    export.add_argument("--format", choices=EXPORT_FORMATS, default="onnx")
+    export.add_argument("--half", action="store_true", help="FP16")
+    export.add_argument("--int8", action="store_true", help="Cuantización INT8")
+    export.add_argument("--device", help="Dispositivo de la exportación (p. ej. 0 o cpu)")
+
+    health_parser = subparsers.add_parser("health", help="Comprobar configuración, modelo y endpoint de métricas")
+    health_parser.add_argument("--timeout", type=float, default=1.0, help="Segundos de espera del endpoint")
+
+    args = parser.parse_args(argv)
+    if args.profile_imports:
+        return profile_imports([arg for arg in argv if arg != "--profile-imports"])
+    commands = {
+        None: run,
+        "run": run,
+        "receive-only": receive_only,
+        "replay": replay,
+        "bench": bench,
+        "export-model": export_model,
+        "health": health,
+    }
+    if args.command is None:
+        args.source = None  # Sin subcomando: el detector, como antes
+    return commands[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tracing import LatencyHistogram
+
+
+def _format_labels(labels):
+    """Convierte una tupla ordenada de etiquetas en el formato {k="v",...}"""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class MetricsRegistry:
+    """Registro de métricas (contadores, gauges e histogramas) en formato Prometheus"""
+
+    def __init__(self, prefix="hired5g_"):
+        """
+        Args:
+            prefix: Prefijo añadido a todos los nombres de métrica
+        """
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counters = {}  # {nombre: {etiquetas: valor}}
+        self.gauges = {}  # {nombre: {etiquetas: valor o función}}
+        self.histograms = {}  # {nombre: {etiquetas: LatencyHistogram}}
+        self.latency_trackers = {}  # {nombre: LatencyTracker}
+        self.help = {}  # {nombre: texto de ayuda}
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, help=None, **labels):
+        """Incrementa un contador"""
+        key = self._key(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+            if help:
+                self.help[name] = help
+
+    def set_gauge(self, name, value, help=None, **labels):
+        """Fija el valor de un gauge"""
+        with self.lock:
+            self.gauges.setdefault(name, {})[self._key(labels)] = value
+            if help:
+                self.help[name] = help
+
+    def gauge_fn(self, name, fn, help=None, **labels):
+        """Registra un gauge cuyo valor se calcula al consultar (p. ej. queue.qsize)"""
+        self.set_gauge(name, fn, help, **labels)
+
+    def observe(self, name, value, help=None, **labels):
+        """Añade una observación (segundos) a un histograma"""
+        key = self._key(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = LatencyHistogram()
+            series[key].observe(value)
+            if help:
+                self.help[name] = help
+
+    def register_latency_tracker(self, tracker, name="stage_latency_seconds"):
+        """Expone los histogramas por etapa de un LatencyTracker"""
+        with self.lock:
+            self.latency_trackers[name] = tracker
+            self.help[name] = "Latencia por etapa del pipeline"
+
+    def get_counter(self, name, **labels):
+        with self.lock:
+            return self.counters.get(name, {}).get(self._key(labels), 0)
+
+    @staticmethod
+    def _render_histogram(lines, full_name, labels, histogram):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+            cumulative += count
+            bucket_labels = labels + (("le", str(bound)),)
+            lines.append(f"{full_name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+        lines.append(f"{full_name}_sum{_format_labels(labels)} {histogram.sum}")
+        lines.append(f"{full_name}_count{_format_labels(labels)} {histogram.count}")
+
+    def render(self):
+        """Devuelve todas las métricas en el formato de texto de Prometheus"""
+        lines = []
+        with self.lock:
+            for kind, metrics in (("counter", self.counters), ("gauge", self.gauges)):
+                for name, series in sorted(metrics.items()):
+                    full_name = self.prefix + name
+                    if name in self.help:
+                        lines.append(f"# HELP {full_name} {self.help[name]}")
+                    lines.append(f"# TYPE {full_name} {kind}")
+                    for labels, value in series.items():
+                        if callable(value):
+                            try:
+                                value = value()
+                            except Exception:
+                                continue
+                        lines.append(f"{full_name}{_format_labels(labels)} {value}")
+
+            for name, series in sorted(self.histograms.items()):
+                full_name = self.prefix + name
+                if name in self.help:
+                    lines.append(f"# HELP {full_name} {self.help[name]}")
+                lines.append(f"# TYPE {full_name} histogram")
+                for labels, histogram in series.items():
+                    self._render_histogram(lines, full_name, labels, histogram)
+
+            trackers = list(self.latency_trackers.items())
+
+        for name, tracker in trackers:
+            full_name = self.prefix + name
+            lines.append(f"# HELP {full_name} {self.help.get(name, '')}")
+            lines.append(f"# TYPE {full_name} histogram")
+            with tracker.lock:
+                for stage, histogram in tracker.histograms.items():
+                    self._render_histogram(lines, full_name, (("stage", stage),), histogram)
+
+        return "\n".join(lines) + "\n"
+
+
+# Registro global usado por el receptor y el bucle de vídeo
+REGISTRY = MetricsRegistry()
+
+
+class MetricsServer:
+    """Servidor HTTP local que expone el registro de métricas en /metrics"""
+
+    def __init__(self, host="127.0.0.1", port=9100, registry=REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self.httpd = None
+        self.thread = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Sin log por petición
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"Métricas disponibles en http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
@@ -1,3 +1,4 @@
+import asyncio
 import socket
 import requests
 import base64
@@ -7,7 +8,49 @@ import queue
 import numpy as np
 import pickle
 import time
-from collections import OrderedDict
+import logging
+from collections import OrderedDict, deque
+from tracing import FrameMeta
+from metrics import REGISTRY
+from log_utils import get_logger, log_event, SampledLog
+
+logger = get_logger("network")
+
+# Contadores del receptor UDP expuestos en /metrics
+RECEIVER_COUNTERS = {
+    "udp_packets_received_total": "Paquetes UDP recibidos",
+    "udp_frames_delivered_total": "Frames entregados en orden a la cola",
+    "udp_fragments_lost_total": "Fragmentos perdidos en frames fragmentados incompletos",
+    "udp_frames_incomplete_total": "Frames fragmentados descartados por incompletos",
+    "udp_reorder_skips_total": "Frames dados por perdidos al avanzar el buffer de reordenación",
+    "udp_duplicates_total": "Frames duplicados ignorados",
+    "udp_decode_failures_total": "Frames que no se pudieron decodificar",
+    "udp_deserialize_errors_total": "Paquetes que no se pudieron deserializar",
+    "udp_repeat_frames_total": "Frames reconstruidos a partir de paquetes 'repeat'",
+    "udp_queue_drops_total": "Frames descartados por cola llena",
+    "udp_late_frames_total": "Frames llegados después de saltar su hueco",
+}
+
+
+def _percentile(values, q):
+    """Percentil q (0-1) de una secuencia no vacía"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def decode_jpeg(jpeg_data, fallback=True):
+    """
+    Decodifica un JPEG a BGR; None si no se puede. Con fallback se prueban
+    también IMREAD_ANYCOLOR e IMREAD_UNCHANGED antes de darlo por perdido
+    """
+    np_data = np.frombuffer(jpeg_data, dtype=np.uint8)
+    frame = cv2.imdecode(np_data, cv2.IMREAD_COLOR)
+    if frame is None and fallback:
+        # Intentar métodos alternativos
+        frame = cv2.imdecode(np_data, cv2.IMREAD_ANYCOLOR)
+        if frame is None:
+            frame = cv2.imdecode(np_data, cv2.IMREAD_UNCHANGED)
+    return frame
 
 
 class VideoUDPReceiver:
@@ -15,6 +58,13 @@ class VideoUDPReceiver:
     MAX_SEQUENCE_NUMBER = 5000 # Máximo número de secuencia antes de reiniciar
     RESET_THRESHOLD = 1000        # Umbral para detectar reinicio de secuencia
     SYNC_TIMEOUT = 10.0  # Timeout para considerar mensaje de sync perdido
+    KEYFRAME_HISTORY = 4  # Keyframes recientes guardados para resolver paquetes 'repeat'
+    MAX_PENDING_REPEATS = 60  # Máximo de 'repeat' esperando a su keyframe
+    POLL_INTERVAL = 0.02  # Intervalo máximo entre comprobaciones del plazo de reproducción
+    PLAYOUT_SAMPLES = 200  # Esperas observadas usadas para estimar el plazo
+    MIN_PLAYOUT_SAMPLES = 10  # Esperas necesarias antes de confiar en su percentil
+    PLAYOUT_QUANTILE = 0.99  # Percentil de espera tras el cual un hueco se da por perdido
+    PLAYOUT_MARGIN = 1.2  # Margen multiplicativo sobre ese percentil
 
     def __init__(self, host='0.0.0.0', port=5000, buffer_size=4*1024*1024, queue_size=10, 
                  socket_timeout=10, log_frequency=30, auto_start=True,
@@ -30,8 +80,9 @@ class VideoUDPReceiver:
             socket_timeout: Timeout del socket en segundos
             log_frequency: Frecuencia para imprimir logs
             auto_start: ejecuta VideoUDPReceiver.start() automaticamente
-            max_reorder_buffer: Máximo frames en buffer para reordenar
-            frame_timeout: Timeout para frames incompletos (segundos)
+            max_reorder_buffer: Máximo frames en buffer para reordenar (techo)
+            frame_timeout: Timeout para frames incompletos (segundos). Es el techo
+                del plazo adaptativo con el que se espera a un frame que falta
         """
         # Parámetros de configuración
         self.host = host
@@ -46,40 +97,95 @@ class VideoUDPReceiver:
         # Estado interno
         self.frame_queue = queue.Queue(maxsize=queue_size)
         self.stop_event = threading.Event()
-        self.thread = threading.Thread(target=self._receiver, daemon=True)
+        self.thread = threading.Thread(target=self._receiver, name="udp-receiver", daemon=True)
         self.socket = None
+
+        # Métricas y logging (los eventos por paquete se muestrean)
+        self.metrics_labels = {"receiver": str(port)}
+        for name, help_text in RECEIVER_COUNTERS.items():
+            REGISTRY.inc(name, 0, help=help_text, **self.metrics_labels)
+        REGISTRY.gauge_fn("udp_frame_queue_depth", lambda: self.frame_queue.qsize(),
+                          help="Frames esperando en la cola del receptor", **self.metrics_labels)
+        REGISTRY.gauge_fn("udp_reorder_buffer_frames", lambda: len(self.reorder_buffer),
+                          help="Frames retenidos en el buffer de reordenación", **self.metrics_labels)
+        REGISTRY.gauge_fn("udp_playout_hold_seconds", lambda: self.playout_hold,
+                          help="Plazo adaptativo de espera por un frame que falta", **self.metrics_labels)
+        self.packet_log = SampledLog(logger, every=max(1, log_frequency) * 10)
         
         # Para reordenación
         self.next_expected_sequence = 0 # siguiente número de secuencia esperado
         self.reorder_buffer = OrderedDict()  #  buffer para reordenar frames
         self.sequence_counter = 0 # número de secuencia total de frames entregados
 
+        # Para frames fragmentados
+        self.expected_packets = 0 # número esperado de paquetes para el frame actual
+        self.fragment_data = {} # datos de fragmentos del frame actual
+        self.fragment_sequence = 0 # número de secuencia del frame actual
+        self.fragment_start_time = 0 # tiempo de inicio de recepción del frame fragmentado
+        self.fragment_info = {} # paquete inicial del frame fragmentado (metadatos)
+
+        # Para el plazo de reproducción adaptativo
+        self.gap_since = None  # instante en que se empezó a esperar al frame que falta
+        self.wait_samples = deque(maxlen=self.PLAYOUT_SAMPLES)  # esperas hasta que llega un frame que faltaba
+        self.reorder_distances = deque(maxlen=self.PLAYOUT_SAMPLES)  # distancia de los frames desordenados
+        self.skipped_gaps = OrderedDict()  # {secuencia saltada: inicio de su espera}
+        self.frame_interval = None  # intervalo medio entre frames (segundos)
+        self.last_arrival = None  # (secuencia, instante) del último frame más reciente
+        self.max_sequence_seen = None  # mayor secuencia recibida
+        self.playout_hold = frame_timeout  # plazo actual de espera por un frame que falta
+        self.playout_hold_time = 0  # instante del último cálculo del plazo
+
+        # Para el modo de transporte delta
+        self.key_frames = OrderedDict()  # últimos keyframes decodificados {secuencia: frame}
+        self.pending_repeats = {}  # 'repeat' recibidos antes que su keyframe {ref: [(seq, addr)]}
+        self.repeat_frames = 0  # número de frames reconstruidos a partir de 'repeat'
+
         # Para sincronización
         self.current_stream_id = None
         self.last_sync_time = 0
         self.sync_received = False
+        self.motion_stats = None  # Estadísticas de movimiento enviadas por el emisor
+
+        # Para la estimación de reloj y retardo (ping/pong con el emisor)
+        self.clock_stats = None  # RTT, desfase y jitter estimados por el emisor
+        self.transit_jitter = 0.0  # Jitter del tiempo de tránsito de los frames (RFC 3550)
+        self.one_way_delay = None  # Retardo emisor -> receptor suavizado (segundos)
+        self.last_transit = None  # Último tiempo de tránsito observado
+        for name, fn, help_text in (
+            ("clock_rtt_seconds", lambda: self._clock_value('rtt'), "RTT estimado con el emisor"),
+            ("clock_offset_seconds", lambda: self._clock_value('offset'),
+             "Desfase reloj receptor - reloj emisor"),
+            ("clock_jitter_seconds", lambda: self._clock_value('jitter'), "Variación del RTT"),
+            ("transit_jitter_seconds", lambda: self.transit_jitter,
+             "Jitter del tiempo de tránsito de los frames"),
+            ("one_way_delay_seconds", lambda: self.one_way_delay,
+             "Retardo emisor -> receptor estimado"),
+        ):
+            REGISTRY.gauge_fn(name, fn, help=help_text, **self.metrics_labels)
         
         if auto_start:
             self.start()
 
+    def _inc(self, name, value=1):
+        """Incrementa un contador del receptor"""
+        REGISTRY.inc(name, value, **self.metrics_labels)
+
     def setup_udp_socket(self):
         """Configura el socket UDP"""
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.buffer_size)
             self.socket.bind((self.host, self.port))
-            self.socket.settimeout(self.socket_timeout)
+            # Despertar con frecuencia para poder vencer el plazo de reproducción sin tráfico
+            self.socket.settimeout(min(self.socket_timeout, self.POLL_INTERVAL))
             
-            print("Socket UDP configurado:")
-            print(f"  - Host: {self.host}")
-            print(f"  - Puerto: {self.port}")
-            print(f"  - Tamaño del buffer: {self.buffer_size} bytes")
-            print(f"  - Tamaño de la cola: {self.queue_size}")
+            log_event(logger, logging.INFO, "Socket UDP configurado", host=self.host, puerto=self.port,
+                      buffer=self.buffer_size, cola=self.queue_size)
             
             return True
             
         except Exception as e:
-            print(f"Error configurando socket UDP: {e}")
+            logger.error(f"Error configurando socket UDP: {e}")
             return False
 
     def _receiver(self):
@@ -87,99 +193,190 @@ class VideoUDPReceiver:
         if not self.setup_udp_socket():
             return
             
-        print(f"Esperando frames UDP en {self.host}:{self.port}...")
-        
-        # Variables para frames fragmentados
-        expected_packets = 0 # número esperado de paquetes para el frame actual
-        frame_data = {} # datos de fragmentos del frame actual
-        current_sequence = 0 # número de secuencia del frame actual
-        fragment_start_time = 0 # tiempo de inicio de recepción del frame fragmentado
+        logger.info(f"Esperando frames UDP en {self.host}:{self.port}...")
         
         while not self.stop_event.is_set():
             try:
                 # Espera a recibir datos UDP
                 data, addr = self.socket.recvfrom(self.buffer_size)
-                
-                try:
-                    #Deserializar paquete UDP
-                    packet_info = pickle.loads(data)
-                except Exception as e:
-                    print(f"Error deserializando paquete UDP: {e}")
-                    continue
-                
-                # Procesar segun tipo de paquete
-                if 'type' in packet_info and packet_info['type'] == 'sync': # Paquete de sincronización
-                    self._process_sync_packet(packet_info)
-                    continue
-
-                elif 'total_packets' in packet_info: # Si es un fragmento inicial
-                    # Frame fragmentado - empezar reconstrucción
-                    expected_packets = packet_info['total_packets']
-                    frame_data = {}
-                    current_sequence = packet_info.get('sequence', 0)
-                    fragment_start_time = time.time()
-                    print(f"Frame {current_sequence} fragmentado - esperando {expected_packets} paquetes")
-                    
-                elif 'packet_index' in packet_info and 'jpeg_data' in packet_info: # Si es fragmento de frame
-                    packet_index = packet_info['packet_index']
-                    frame_data[packet_index] = packet_info['jpeg_data']
-                    print(f"Fragmento {packet_index}/{expected_packets} recibido para frame {current_sequence}")
-                    
-                    # Verificar si tenemos todos los fragmentos
-                    if len(frame_data) >= expected_packets and expected_packets > 0: # Todos los fragmentos recibidos
-                        self._reconstruct_fragmented_frame(frame_data, current_sequence, expected_packets)
-                        expected_packets = 0
-                        frame_data = {}
-                
-                elif 'jpeg_data' in packet_info:
-                    # Frame completo
-                    sequence = packet_info.get('sequence', 0)
-                    
-                    # Vreificar si es realmente frame completo
-                    jpeg_data = packet_info['jpeg_data']
-                    has_header = jpeg_data[:2] == b'\xff\xd8'
-                    has_footer = jpeg_data[-2:] == b'\xff\xd9' if len(jpeg_data) >= 2 else False
-                    
-                    if has_header and has_footer:
-                        # Es un frame completo válido
-                        self._process_complete_frame(packet_info, addr, sequence)
-                    else:
-                        # Probablemente es un fragmento que no fue detectado
-                        print(f"Frame {sequence} incompleto - header: {has_header}, footer: {has_footer}")
-                        # Podemos intentar procesarlo de todos modos o ignorarlo
-                        self._process_complete_frame(packet_info, addr, sequence)
-
-
-                if self.sync_received and time.time() - self.last_sync_time > self.SYNC_TIMEOUT:
-                    print(f"No se reciben syncs periodicos durante {self.SYNC_TIMEOUT} - stream inestable")
-                    self.sync_received = False        
-                
-                # Timeout para frames fragmentados incompletos
-                if expected_packets > 0 and time.time() - fragment_start_time > self.frame_timeout:
-                    print(f"Timeout - descartando frame fragmentado incompleto {current_sequence}")
-                    expected_packets = 0
-                    frame_data = {}
+                self._handle_packet(data, addr, time.time())
                     
             except socket.timeout:
                 # Verificar timeouts durante el timeout del socket
-                if expected_packets > 0 and time.time() - fragment_start_time > self.frame_timeout:
-                    print(f"Timeout - descartando frame fragmentado incompleto {current_sequence}")
-                    expected_packets = 0
-                    frame_data = {}
+                self._check_fragment_timeout()
+                self._check_playout_deadline()
                 continue
             except Exception as e:
                 if not self.stop_event.is_set():
-                    print(f"Error recibiendo datos UDP: {e}")
+                    logger.error(f"Error recibiendo datos UDP: {e}")
+
+    def _handle_packet(self, data, addr, receive_time):
+        """Procesa un datagrama recibido (común al receptor con hilo y al de asyncio)"""
+        self._inc("udp_packets_received_total")
+        
+        try:
+            #Deserializar paquete UDP
+            packet_info = pickle.loads(data)
+        except Exception as e:
+            self._inc("udp_deserialize_errors_total")
+            logger.warning(f"Error deserializando paquete UDP: {e}")
+            return
+        
+        # Procesar segun tipo de paquete
+        if 'type' in packet_info and packet_info['type'] == 'sync': # Paquete de sincronización
+            self._process_sync_packet(packet_info, addr, receive_time)
+            return
+
+        elif packet_info.get('type') == 'repeat': # Frame repetido (modo delta)
+            self._process_repeat_packet(packet_info, addr)
+
+        elif 'total_packets' in packet_info: # Si es un fragmento inicial
+            # Frame fragmentado - empezar reconstrucción
+            if self.expected_packets > 0:
+                # El frame fragmentado anterior no llegó a completarse
+                self._discard_incomplete_fragments(self.fragment_sequence, self.expected_packets,
+                                                   self.fragment_data)
+            self.expected_packets = packet_info['total_packets']
+            self.fragment_data = {}
+            self.fragment_sequence = packet_info.get('sequence', 0)
+            self.fragment_start_time = time.time()
+            self.fragment_info = packet_info
+            self.packet_log.log("fragment_start", "Frame fragmentado", frame=self.fragment_sequence,
+                                paquetes=self.expected_packets)
+            
+        elif 'packet_index' in packet_info and 'jpeg_data' in packet_info: # Si es fragmento de frame
+            packet_index = packet_info['packet_index']
+            self.fragment_data[packet_index] = packet_info['jpeg_data']
+            self.packet_log.log("fragment", "Fragmento recibido", frame=self.fragment_sequence,
+                                indice=f"{packet_index}/{self.expected_packets}")
+            
+            # Verificar si tenemos todos los fragmentos
+            if len(self.fragment_data) >= self.expected_packets and self.expected_packets > 0: # Todos los fragmentos recibidos
+                self._reconstruct_fragmented_frame(self.fragment_data, self.fragment_sequence,
+                                                   self.expected_packets, self._make_meta(self.fragment_info))
+                self.expected_packets = 0
+                self.fragment_data = {}
+        
+        elif 'jpeg_data' in packet_info:
+            # Frame completo
+            sequence = packet_info.get('sequence', 0)
+            
+            # Vreificar si es realmente frame completo
+            jpeg_data = packet_info['jpeg_data']
+            has_header = jpeg_data[:2] == b'\xff\xd8'
+            has_footer = jpeg_data[-2:] == b'\xff\xd9' if len(jpeg_data) >= 2 else False
+            
+            if has_header and has_footer:
+                # Es un frame completo válido
+                self._process_complete_frame(packet_info, addr, sequence)
+            else:
+                # Probablemente es un fragmento que no fue detectado
+                log_event(logger, logging.WARNING, "Frame incompleto", frame=sequence,
+                          header=has_header, footer=has_footer)
+                # Podemos intentar procesarlo de todos modos o ignorarlo
+                self._process_complete_frame(packet_info, addr, sequence)
+
+
+        if self.sync_received and time.time() - self.last_sync_time > self.SYNC_TIMEOUT:
+            logger.warning(f"No se reciben syncs periodicos durante {self.SYNC_TIMEOUT} - stream inestable")
+            self.sync_received = False        
+        
+        # Timeout para frames fragmentados incompletos
+        self._check_fragment_timeout()
+
+    def _check_fragment_timeout(self):
+        """Descarta el frame fragmentado en curso si ha superado su plazo"""
+        if self.expected_packets > 0 and time.time() - self.fragment_start_time > self._fragment_timeout():
+            self._discard_incomplete_fragments(self.fragment_sequence, self.expected_packets, self.fragment_data)
+            self.expected_packets = 0
+            self.fragment_data = {}
+
+    def _discard_incomplete_fragments(self, sequence, expected_packets, frame_data):
+        """Descarta un frame fragmentado incompleto y contabiliza los fragmentos perdidos"""
+        lost = max(0, expected_packets - len(frame_data))
+        self._inc("udp_frames_incomplete_total")
+        self._inc("udp_fragments_lost_total", lost)
+        log_event(logger, logging.WARNING, "Descartando frame fragmentado incompleto", frame=sequence,
+                  recibidos=f"{len(frame_data)}/{expected_packets}")
+
+    def _send_pong(self, sync_packet, addr, receive_time):
+        """Responde a un sync con un pong para que el emisor estime RTT y desfase"""
+        if addr is None or 'timestamp' not in sync_packet:
+            return
+        pong = {
+            'type': 'pong',
+            'stream_id': sync_packet.get('stream_id'),
+            'sync_sequence': sync_packet.get('sync_sequence', 0),
+            't0': sync_packet['timestamp'],  # Envío del sync (reloj emisor)
+            't1': receive_time,  # Recepción del sync (reloj receptor)
+            't2': time.time(),  # Envío del pong (reloj receptor)
+        }
+        try:
+            self._send(pickle.dumps(pong), addr)
+        except Exception as e:
+            logger.warning(f"Error enviando pong: {e}")
 
+    def _send(self, data, addr):
+        self.socket.sendto(data, addr)
 
-    def _process_sync_packet(self, sync_packet):
+    def _update_transit(self, send_time, receive_time):
+        """Actualiza el jitter de tránsito y el retardo en un sentido con un frame recibido"""
+        if send_time is None:
+            return
+        transit = receive_time - send_time
+        if self.last_transit is not None:
+            # Estimador de jitter entre llegadas de RFC 3550
+            self.transit_jitter += (abs(transit - self.last_transit) - self.transit_jitter) / 16.0
+        self.last_transit = transit
+
+        if self.clock_stats is not None:
+            delay = max(0.0, transit - self.clock_stats.get('offset', 0.0))
+            if self.one_way_delay is None:
+                self.one_way_delay = delay
+            else:
+                self.one_way_delay += (delay - self.one_way_delay) / 8.0
+
+    def _clock_value(self, key):
+        return self.clock_stats.get(key) if self.clock_stats else None
+
+    def get_clock_stats(self):
+        """
+        Devuelve las estimaciones de reloj y red:
+        rtt, offset (reloj receptor - reloj emisor), jitter del RTT,
+        transit_jitter y one_way_delay (segundos). None si no hay estimación
+        """
+        if self.clock_stats is None:
+            return None
+        stats = dict(self.clock_stats)
+        stats['transit_jitter'] = self.transit_jitter
+        stats['one_way_delay'] = self.one_way_delay
+        return stats
+
+    def _process_sync_packet(self, sync_packet, addr=None, receive_time=None):
         """Procesa mensaje de sincronización con stream_id"""
+        if receive_time is None:
+            receive_time = time.time()
+        self._send_pong(sync_packet, addr, receive_time)
+        if sync_packet.get('clock') is not None:
+            self.clock_stats = sync_packet['clock']
+
         stream_id = sync_packet.get('stream_id')
         new_sequence = sync_packet.get('current_sequence', 0)
         is_new_stream = sync_packet.get('is_new_stream', False)
         sync_sequence = sync_packet.get('sync_sequence', 0)
+        heartbeat = sync_packet.get('heartbeat', False)
+
+        if 'motion' in sync_packet:
+            self.motion_stats = sync_packet['motion']
+
+        # Los latidos llegan con frecuencia mientras no hay movimiento: no se registran
+        if heartbeat and self.current_stream_id == stream_id:
+            self.last_sync_time = time.time()
+            self.sync_received = True
+            return
         
-        print(f"Sync recibido numero {sync_sequence} - Stream: {stream_id}, Secuencia: {new_sequence}, Nuevo: {is_new_stream}")
+        log_event(logger, logging.DEBUG, "Sync recibido", numero=sync_sequence, stream=stream_id,
+                  secuencia=new_sequence, nuevo=is_new_stream)
         
         # Sincronización y manejo de cambios de stream
         if self.current_stream_id is None: # Primer sync recibido
@@ -187,117 +384,195 @@ class VideoUDPReceiver:
             self.current_stream_id = stream_id
             self.next_expected_sequence = new_sequence
             self.reorder_buffer.clear()
-            print(f"Sync inicial - Stream ID: {stream_id}, empezando en secuencia: {new_sequence}")
+            logger.info(f"Sync inicial - Stream ID: {stream_id}, empezando en secuencia: {new_sequence}")
             
         elif self.current_stream_id != stream_id: # Cambio de stream detectado
-            print(f"Nuevo stream detectado: {self.current_stream_id} -> {stream_id}")
+            logger.info(f"Nuevo stream detectado: {self.current_stream_id} -> {stream_id}")
             self.current_stream_id = stream_id
             self.next_expected_sequence = new_sequence
             self.reorder_buffer.clear()
+            self._clear_keyframes()
+            self._reset_playout()
             
         elif is_new_stream: # Reinicio del mismo stream
-            print(f"Reinicio de stream - Nueva secuencia: {new_sequence}")
+            logger.info(f"Reinicio de stream - Nueva secuencia: {new_sequence}")
             self.next_expected_sequence = new_sequence
             self.reorder_buffer.clear()
+            self._clear_keyframes()
+            self._reset_playout()
             
         else:
             # Sync periódico normal - solo log y corrección  de drift
             packet_drift = new_sequence - self.next_expected_sequence
             if abs(packet_drift) > 100:  # Umbral para corrección
-                print(f"Corrigiendo drift: {packet_drift} paquetes")
+                logger.warning(f"Corrigiendo drift: {packet_drift} paquetes")
                 self.next_expected_sequence = new_sequence
         
         self.last_sync_time = time.time()
         self.sync_received = True
 
 
+    def _make_meta(self, message):
+        """Crea los metadatos de un frame a partir del mensaje del emisor"""
+        meta = FrameMeta(
+            stream_id=message.get('stream_id', self.current_stream_id),
+            sequence=message.get('sequence'),
+            capture_time=message.get('capture_time', message.get('timestamp')),
+            receive_time=time.time(),
+        )
+        # Pasar la marca de captura al reloj del receptor
+        if self.clock_stats is not None:
+            meta.clock_offset = self.clock_stats.get('offset', 0.0)
+        self._update_transit(message.get('timestamp'), meta.receive_time)
+        return meta
+
+    def _is_duplicate(self, sequence):
+        """Si el frame ya está en el buffer de reordenación"""
+        return sequence in self.reorder_buffer
+
     def _process_complete_frame(self, message, addr, sequence):
         """Procesa un frame completo y lo reordena"""
+        meta = self._make_meta(message)
         try:
             # Verificar si es un frame duplicado
-            if sequence in self.reorder_buffer:
-                print(f"Frame duplicado {sequence} - ignorando")
+            if self._is_duplicate(sequence):
+                self._inc("udp_duplicates_total")
+                self.packet_log.log("duplicate", "Frame duplicado ignorado", frame=sequence)
                 return
 
-            jpeg_data = message['jpeg_data']
-             
-            # Intentar decodificar con diferentes métodos
-            np_data = np.frombuffer(jpeg_data, dtype=np.uint8)
-            frame = cv2.imdecode(np_data, cv2.IMREAD_COLOR)
-            
-            if frame is None:
-                # Intentar métodos alternativos
-                frame = cv2.imdecode(np_data, cv2.IMREAD_ANYCOLOR)
-                
-            if frame is None:
-                frame = cv2.imdecode(np_data, cv2.IMREAD_UNCHANGED)
-            
-            if frame is not None:
-                self._add_to_reorder_buffer(sequence, frame, addr)
-            else:
-                print(f"Todos los métodos de decodificación fallaron para frame {sequence}")
-
+            self._decode_frame(sequence, message['jpeg_data'], addr, meta)
                         
         except Exception as e:
-            print(f"Error procesando frame {sequence}: {e}")
+            logger.error(f"Error procesando frame {sequence}: {e}")
 
-    def _reconstruct_fragmented_frame(self, frame_data, sequence, total_packets):
+    def _reconstruct_fragmented_frame(self, frame_data, sequence, total_packets, meta=None):
         """Reconstruye y reordena un frame fragmentado"""
         try:
 
             # Verificar si es un frame duplicado ANTES de procesar
-            if sequence in self.reorder_buffer:
-                print(f"Frame fragmentado duplicado {sequence} - ignorando")
+            if self._is_duplicate(sequence):
+                self._inc("udp_duplicates_total")
+                self.packet_log.log("duplicate", "Frame fragmentado duplicado ignorado", frame=sequence)
                 return
 
             # Verificar que tenemos todos los paquetes
             if len(frame_data) < total_packets: # Si la cantidad de fragmentos es menor que la esperada
-                print(f"Faltan paquetes para frame {sequence}: {len(frame_data)}/{total_packets}")
+                self._discard_incomplete_fragments(sequence, total_packets, frame_data)
                 return
             
             # Reordenar fragmentos por índice
             sorted_indices = sorted(frame_data.keys())  # Indices ordenados
             if sorted_indices != list(range(total_packets)): # Si faltan índices
-                print(f"Paquetes faltantes en frame {sequence}: {sorted_indices}")
+                self._discard_incomplete_fragments(sequence, total_packets,
+                                                   [i for i in sorted_indices if i < total_packets])
                 return
             
             # Reensamblar frame
             jpeg_combined = b''.join([frame_data[i] for i in sorted_indices]) # Combinar fragmentos concatenando bytes
-            np_data = np.frombuffer(jpeg_combined, dtype=np.uint8)
-            frame = cv2.imdecode(np_data, cv2.IMREAD_COLOR)
-            
-            # Añadir frame al buffer de reordenación
-            if frame is not None:
-                self._add_to_reorder_buffer(sequence, frame, None)
-            else:
-                print(f"Error decodificando frame fragmentado {sequence}")
+            self._decode_frame(sequence, jpeg_combined, None, meta, fallback=False)
                     
         except Exception as e:
-            print(f"Error reconstruyendo frame {sequence}: {e}")
+            logger.error(f"Error reconstruyendo frame {sequence}: {e}")
 
+    def _decode_frame(self, sequence, jpeg_data, addr, meta, fallback=True):
+        """Decodifica el frame y lo pasa al buffer de reordenación (aquí, en el mismo hilo)"""
+        self._frame_decoded(sequence, decode_jpeg(jpeg_data, fallback), addr, meta)
 
-    def _add_to_reorder_buffer(self, sequence, frame, addr):
+    def _frame_decoded(self, sequence, frame, addr, meta):
+        """Añade un frame ya decodificado al buffer de reordenación y a los keyframes"""
+        if frame is not None:
+            if meta is not None:
+                meta.mark('decode_done')
+            self._add_to_reorder_buffer(sequence, frame, addr, meta)
+            self._register_keyframe(sequence, frame)
+        else:
+            self._inc("udp_decode_failures_total")
+            logger.warning(f"No se pudo decodificar el frame {sequence}")
+
+
+    def _process_repeat_packet(self, message, addr):
+        """Procesa un paquete 'repeat': el frame es idéntico a un keyframe anterior"""
+        sequence = message.get('sequence', 0)
+        ref_sequence = message.get('ref_sequence')
+        meta = self._make_meta(message)
+        meta.decode_done = meta.receive_time  # No hay nada que decodificar
+
+        if self._is_duplicate(sequence):
+            self._inc("udp_duplicates_total")
+            self.packet_log.log("duplicate", "Frame repetido duplicado ignorado", frame=sequence)
+            return
+
+        if ref_sequence in self.key_frames:
+            self.repeat_frames += 1
+            self._inc("udp_repeat_frames_total")
+            self._add_to_reorder_buffer(sequence, self.key_frames[ref_sequence], addr, meta)
+            return
+
+        # El keyframe de referencia aún no ha llegado (o se perdió): esperar a que llegue
+        pending_count = sum(len(p) for p in self.pending_repeats.values())
+        if pending_count >= self.MAX_PENDING_REPEATS:
+            logger.warning(f"Demasiados frames repetidos pendientes - descartando frame {sequence}")
+            return
+        self.pending_repeats.setdefault(ref_sequence, []).append((sequence, addr, meta))
+
+    def _clear_keyframes(self):
+        """Olvida los keyframes guardados (la numeración de secuencias se reinicia)"""
+        self.key_frames.clear()
+        self.pending_repeats.clear()
+
+    def _register_keyframe(self, sequence, frame):
+        """Guarda un keyframe decodificado y resuelve los 'repeat' que lo esperaban"""
+        self.key_frames[sequence] = frame
+        while len(self.key_frames) > self.KEYFRAME_HISTORY:
+            self.key_frames.popitem(last=False)
+
+        for repeat_sequence, addr, meta in self.pending_repeats.pop(sequence, []):
+            self.repeat_frames += 1
+            self._inc("udp_repeat_frames_total")
+            self._add_to_reorder_buffer(repeat_sequence, frame, addr, meta)
+
+        # Descartar 'repeat' cuyo keyframe ya no puede llegar
+        stale_refs = [ref for ref in self.pending_repeats
+                      if ref is None or ref < min(self.key_frames)]
+        for ref in stale_refs:
+            del self.pending_repeats[ref]
+
+    def _add_to_reorder_buffer(self, sequence, frame, addr, meta=None):
         """Añade frame al buffer de reordenación con lógica de auto-reparación"""
         
         if sequence < self.next_expected_sequence and \
        (self.next_expected_sequence - sequence) > self.MAX_SEQUENCE_NUMBER - self.RESET_THRESHOLD:
         
-            print(f"Frame {sequence}: Detectado posible reinicio de secuencia. Forzando SYNC.")
+            logger.info(f"Frame {sequence}: Detectado posible reinicio de secuencia. Forzando SYNC.")
             self.next_expected_sequence = sequence # Establece a 0
             self.reorder_buffer.clear() # Limpia todo
+            self._reset_playout()
 
 
         # Si acabamos de arrancar (esperamos 0) y recibimos un numero alto (ej. 6000),
         # y el buffer está vacío, saltamos directamente a ese número.
         if not self.sync_received and self.next_expected_sequence == 0 and sequence > 10 and len(self.reorder_buffer) == 0:
-            print(f"Saltando a secuencia {sequence} (sin mensaje de sync previo)")
+            logger.info(f"Saltando a secuencia {sequence} (sin mensaje de sync previo)")
             self.next_expected_sequence = sequence
 
+        now = time.time()
+        if sequence < self.next_expected_sequence:
+            # Su hueco ya se saltó: entregarlo rompería el orden. Si el salto fue
+            # prematuro, la espera observada alarga el plazo de los próximos huecos
+            self._inc("udp_late_frames_total")
+            gap_start = self.skipped_gaps.pop(sequence, None)
+            if gap_start is not None:
+                self.wait_samples.append(now - gap_start)
+            return
+
+        self._observe_arrival(sequence, now)
+
         # Guardar frame en buffer de reordenación
         self.reorder_buffer[sequence] = {
             'frame': frame,
             'timestamp': time.time(),
-            'addr': addr
+            'addr': addr,
+            'meta': meta
         }
 
         # Si el buffer está lleno, significa que hay un hueco que no se ha llenado.
@@ -310,7 +585,8 @@ class VideoUDPReceiver:
             # significa que el frame esperado se perdió para siempre y debemos saltar.
             if self.next_expected_sequence < min_seq_in_buffer:
                 lost_count = min_seq_in_buffer - self.next_expected_sequence
-                print(f"Buffer lleno. Saltando {lost_count} frames perdidos ({self.next_expected_sequence} -> {min_seq_in_buffer})")
+                self._inc("udp_reorder_skips_total", lost_count)
+                logger.warning(f"Buffer lleno. Saltando {lost_count} frames perdidos ({self.next_expected_sequence} -> {min_seq_in_buffer})")
                 self.next_expected_sequence = min_seq_in_buffer
             
             # Si aún así sigue lleno , eliminar el más viejo 
@@ -320,9 +596,108 @@ class VideoUDPReceiver:
                 # Si eliminamos justo el que esperabamos, avanzamos el contador
                 if oldest_seq == self.next_expected_sequence:
                      self.next_expected_sequence += 1
+                else:
+                     self._inc("udp_reorder_skips_total")
         
         # Entregar frames en orden
         self._deliver_ordered_frames()
+        self._check_playout_deadline()
+
+    def _observe_arrival(self, sequence, now):
+        """Actualiza intervalo entre frames, distancia de reordenación y esperas"""
+        if self.max_sequence_seen is None or sequence > self.max_sequence_seen:
+            if self.last_arrival is not None and sequence > self.last_arrival[0]:
+                last_sequence, last_time = self.last_arrival
+                interval = min(0.5, max(1 / 120.0, (now - last_time) / (sequence - last_sequence)))
+                if self.frame_interval is None:
+                    self.frame_interval = interval
+                else:
+                    self.frame_interval += (interval - self.frame_interval) / 16.0
+            self.last_arrival = (sequence, now)
+            self.max_sequence_seen = sequence
+        else:
+            # Frame desordenado: llega después de otro con mayor secuencia
+            self.reorder_distances.append(self.max_sequence_seen - sequence)
+
+        # El frame que bloqueaba la entrega ha llegado: registrar cuánto se esperó
+        if sequence == self.next_expected_sequence and self.gap_since is not None:
+            self.wait_samples.append(now - self.gap_since)
+            self.playout_hold_time = 0  # Recalcular el plazo
+
+    def _reset_playout(self):
+        """Olvida el estado del hueco actual (cambio o reinicio de stream)"""
+        self.gap_since = None
+        self.skipped_gaps.clear()
+        self.last_arrival = None
+        self.max_sequence_seen = None
+
+    def _compute_playout_hold(self):
+        """
+        Calcula el plazo de espera por un frame que falta a partir del jitter de llegada,
+        la distancia de reordenación y las esperas observadas, limitado por frame_timeout
+        """
+        interval = self.frame_interval or 1 / 30.0
+        jitter = self.transit_jitter
+        if self.clock_stats is not None:
+            jitter = max(jitter, self.clock_stats.get('jitter', 0.0) / 2.0)
+
+        hold = interval + 4 * jitter
+        if self.reorder_distances:
+            hold = max(hold, (_percentile(self.reorder_distances, 0.95) + 1) * interval)
+        if len(self.wait_samples) >= self.MIN_PLAYOUT_SAMPLES:
+            # Pasado este percentil es estadísticamente improbable que el frame llegue
+            hold = max(hold, self.PLAYOUT_MARGIN * _percentile(self.wait_samples, self.PLAYOUT_QUANTILE))
+        return min(hold, self.frame_timeout)
+
+    def _get_playout_hold(self):
+        """Plazo actual (se recalcula como mucho cada 0.5 s o al llegar nuevas esperas)"""
+        now = time.time()
+        if now - self.playout_hold_time > 0.5:
+            self.playout_hold = self._compute_playout_hold()
+            self.playout_hold_time = now
+        return self.playout_hold
+
+    def _fragment_timeout(self):
+        """Tiempo máximo para completar un frame fragmentado"""
+        return min(self.frame_timeout, self._get_playout_hold() + (self.frame_interval or 1 / 30.0))
+
+    def _check_playout_deadline(self):
+        """Salta el hueco actual si se ha superado el plazo de espera por el frame que falta"""
+        if not self.reorder_buffer or self.next_expected_sequence in self.reorder_buffer:
+            self.gap_since = None
+            return
+
+        now = time.time()
+        if self.gap_since is None:
+            self.gap_since = now
+            return
+        if now - self.gap_since <= self._get_playout_hold():
+            return
+
+        min_seq_in_buffer = min(self.reorder_buffer.keys())
+        lost_count = min_seq_in_buffer - self.next_expected_sequence
+        if lost_count > 0:
+            self._inc("udp_reorder_skips_total", lost_count)
+            log_event(logger, logging.INFO, "Plazo vencido, saltando frames", desde=self.next_expected_sequence,
+                      hasta=min_seq_in_buffer, espera_ms=round(1000 * (now - self.gap_since), 1))
+            # Recordar los saltados para detectar si llegan tarde
+            for seq in range(self.next_expected_sequence, min_seq_in_buffer):
+                self.skipped_gaps[seq] = self.gap_since
+            while len(self.skipped_gaps) > self.PLAYOUT_SAMPLES:
+                self.skipped_gaps.popitem(last=False)
+        self.next_expected_sequence = min_seq_in_buffer
+        self.gap_since = None
+        self._deliver_ordered_frames()
+
+    def get_playout_stats(self):
+        """Estado del plazo de reproducción adaptativo"""
+        return {
+            'hold': self._get_playout_hold(),
+            'frame_interval': self.frame_interval,
+            'transit_jitter': self.transit_jitter,
+            'wait_p99': _percentile(self.wait_samples, 0.99) if self.wait_samples else None,
+            'reorder_p95': _percentile(self.reorder_distances, 0.95) if self.reorder_distances else None,
+        }
 
     def _deliver_ordered_frames(self):
         """Entrega frames en orden secuencial a la cola principal"""
@@ -333,15 +708,20 @@ class VideoUDPReceiver:
             # Extraer frame y dirección del remitente
             frame = frame_data['frame']
             addr = frame_data['addr']
+            meta = frame_data['meta']
+            if meta is not None:
+                meta.mark('delivered')
             
             # Añadir a cola principal
-            self._add_to_queue(frame)
+            self._add_to_queue(frame, meta)
             
             # Logear entrega
             self.sequence_counter += 1
+            self._inc("udp_frames_delivered_total")
             if self.sequence_counter % self.log_frequency == 0:
-                addr_str = f"de {addr[0]}:{addr[1]}" if addr else "fragmentado"
-                print(f"Frame {self.sequence_counter} entregado ({self.next_expected_sequence}) {addr_str}")
+                addr_str = f"{addr[0]}:{addr[1]}" if addr else "fragmentado"
+                log_event(logger, logging.DEBUG, "Frame entregado", total=self.sequence_counter,
+                          secuencia=self.next_expected_sequence, origen=addr_str)
             
             # Limpiar buffer y avanzar
             del self.reorder_buffer[self.next_expected_sequence]
@@ -358,39 +738,57 @@ class VideoUDPReceiver:
         # Eliminar frames expirados
         for seq in expired_sequences:
             del self.reorder_buffer[seq]
-            print(f"Timeout - descartando frame {seq} del buffer de reordenación")
+            self._inc("udp_reorder_skips_total")
+            logger.warning(f"Timeout - descartando frame {seq} del buffer de reordenación")
 
-    def _add_to_queue(self, frame):
-        """Añade frame a la cola interna"""
+    def _add_to_queue(self, frame, meta=None):
+        """Añade frame (con sus metadatos) a la cola interna"""
+        item = (frame, meta)
         try:
-            self.frame_queue.put_nowait(frame)
+            self.frame_queue.put_nowait(item)
         except queue.Full:
+            self._inc("udp_queue_drops_total")
             try:
                 self.frame_queue.get_nowait()
             except queue.Empty:
                 pass
-            self.frame_queue.put_nowait(frame)
+            self.frame_queue.put_nowait(item)
 
-    def get_frame(self, timeout=None):
+    def get_frame(self, timeout=None, with_meta=False):
+        """
+        Devuelve el siguiente frame en orden, o None si no hay
+
+        Args:
+            timeout: Tiempo máximo de espera (None = esperar indefinidamente)
+            with_meta: Si es True devuelve la tupla (frame, FrameMeta)
+        """
         if self.stop_event.is_set():
             return None
         try:
-            return self.frame_queue.get(timeout=timeout)
+            frame, meta = self.frame_queue.get(timeout=timeout)
         except queue.Empty:
             return None
+        if frame is None:
+            return None  # Receptor cerrado mientras se esperaba
+        return (frame, meta) if with_meta else frame
 
     def start(self):
         if not self.thread.is_alive():
             self.thread.start()
-            print("Receptor UDP iniciado")
+            logger.info("Receptor UDP iniciado")
 
     def release(self):
         self.stop_event.set()
+        # Despertar a quien esté bloqueado en get_frame(timeout=None)
+        try:
+            self.frame_queue.put_nowait((None, None))
+        except queue.Full:
+            pass  # Con la cola llena nadie está bloqueado esperando
         if self.socket:
             self.socket.close()
         if self.thread.is_alive():
             self.thread.join(timeout=5)
-        print("Receptor UDP cerrado")
+        logger.info("Receptor UDP cerrado")
 
     def get_queue_size(self):
         return self.frame_queue.qsize()
@@ -403,6 +801,214 @@ class VideoUDPReceiver:
     def get_stream_id(self):
         return self.current_stream_id
 
+    # Consulta las últimas estadísticas de movimiento enviadas por el emisor
+    def get_motion_stats(self):
+        return self.motion_stats
+
+
+
+class AsyncVideoUDPReceiver(VideoUDPReceiver, asyncio.DatagramProtocol):
+
+    def __init__(self, host='0.0.0.0', port=5000, buffer_size=4*1024*1024, queue_size=10,
+                 log_frequency=30, max_reorder_buffer=50, frame_timeout=5.0,
+                 executor=None, max_pending_decodes=8):
+        """
+        Receptor de video via UDP para asyncio, con la misma reconstrucción de
+        fragmentos, reordenación y plazo de reproducción que VideoUDPReceiver
+
+        En lugar de un hilo por receptor, los datagramas llegan al bucle de eventos
+        (DatagramProtocol) y solo la decodificación JPEG va al executor, así que un
+        bucle puede atender muchas cámaras junto al resto de E/S asíncrona:
+
+            async with AsyncVideoUDPReceiver(port=5000) as receiver:
+                async for frame in receiver:
+                    ...
+
+        Contrapresión: con max_pending_decodes frames decodificándose se deja de leer
+        el socket hasta que termine alguno (los datagramas esperan en el buffer del
+        kernel). La cola de frames, como en VideoUDPReceiver, descarta el más antiguo
+        si el consumidor no la vacía a tiempo.
+
+        Args:
+            host: Direccion IP para escuchar
+            port: Puerto UDP para escuchar
+            buffer_size: Tamaño del buffer de recepción UDP
+            queue_size: Tamaño máximo de la cola de frames
+            log_frequency: Frecuencia para imprimir logs
+            max_reorder_buffer: Máximo frames en buffer para reordenar (techo)
+            frame_timeout: Timeout para frames incompletos (segundos)
+            executor: Executor para decodificar (None = el del bucle). Varios
+                receptores pueden compartir uno
+            max_pending_decodes: Frames decodificándose a la vez antes de dejar de leer
+        """
+        super().__init__(host=host, port=port, buffer_size=buffer_size, queue_size=queue_size,
+                         log_frequency=log_frequency, auto_start=False,
+                         max_reorder_buffer=max_reorder_buffer, frame_timeout=frame_timeout)
+        self.frame_queue = asyncio.Queue(maxsize=queue_size)
+        self.thread = None  # Todo ocurre en el bucle de eventos
+        self.executor = executor
+        self.max_pending_decodes = max_pending_decodes
+
+        self.loop = None
+        self.transport = None
+        self.timer = None  # Comprobación periódica de plazos sin tráfico
+        self.reading_paused = False
+        self.generation = 0  # Cambia con el stream: descarta decodificaciones del anterior
+        self.decoding = set()  # (generación, secuencia) de los frames en el executor
+
+        REGISTRY.inc("udp_read_pauses_total", 0, help="Pausas de lectura del socket por contrapresión",
+                     **self.metrics_labels)
+        REGISTRY.gauge_fn("udp_pending_decodes", lambda: len(self.decoding),
+                          help="Frames decodificándose en el executor", **self.metrics_labels)
+
+    async def start(self):
+        """Abre el socket en el bucle de eventos en curso"""
+        if self.transport is not None:
+            return
+        self.loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.buffer_size)
+            sock.bind((self.host, self.port))
+            self.transport, _ = await self.loop.create_datagram_endpoint(lambda: self, sock=sock)
+        except Exception as e:
+            sock.close()
+            logger.error(f"Error configurando socket UDP: {e}")
+            raise
+        self.socket = sock
+        self.timer = self.loop.call_later(self.POLL_INTERVAL, self._tick)
+        log_event(logger, logging.INFO, "Socket UDP configurado", host=self.host, puerto=self.port,
+                  buffer=self.buffer_size, cola=self.queue_size, modo="asyncio")
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+    def __aiter__(self):
+        return self.frames()
+
+    async def frames(self, with_meta=False):
+        """Frames en orden (o tuplas (frame, FrameMeta)) hasta que se cierra el receptor"""
+        while True:
+            item = await self.get_frame(with_meta=with_meta)
+            if item is None:
+                return
+            yield item
+
+    # DatagramProtocol
+    def datagram_received(self, data, addr):
+        try:
+            self._handle_packet(data, addr, time.time())
+        except Exception as e:
+            logger.error(f"Error recibiendo datos UDP: {e}")
+
+    def error_received(self, exc):
+        # Errores ICMP de los pong (p. ej. el emisor ya no escucha): no afectan a la recepción
+        self.packet_log.log("socket_error", "Error en el socket UDP", error=exc)
+
+    def _tick(self):
+        """Plazos de fragmentos y de reproducción aunque no lleguen paquetes"""
+        try:
+            self._check_fragment_timeout()
+            self._check_playout_deadline()
+        except Exception as e:
+            logger.error(f"Error comprobando plazos del receptor: {e}")
+        if not self.stop_event.is_set():
+            self.timer = self.loop.call_later(self.POLL_INTERVAL, self._tick)
+
+    def _send(self, data, addr):
+        self.transport.sendto(data, addr)
+
+    def _is_duplicate(self, sequence):
+        return sequence in self.reorder_buffer or (self.generation, sequence) in self.decoding
+
+    def _decode_frame(self, sequence, jpeg_data, addr, meta, fallback=True):
+        """Decodifica en el executor; el frame vuelve al bucle de eventos para reordenarlo"""
+        key = (self.generation, sequence)
+        self.decoding.add(key)
+        future = self.loop.run_in_executor(self.executor, decode_jpeg, jpeg_data, fallback)
+        future.add_done_callback(lambda f: self._decode_done(f, key, addr, meta))
+        self._update_reading()
+
+    def _decode_done(self, future, key, addr, meta):
+        self.decoding.discard(key)
+        self._update_reading()
+        generation, sequence = key
+        if self.stop_event.is_set() or future.cancelled() or generation != self.generation:
+            return
+        try:
+            self._frame_decoded(sequence, future.result(), addr, meta)
+        except Exception as e:
+            logger.error(f"Error procesando frame {sequence}: {e}")
+
+    def _clear_keyframes(self):
+        # Cambio o reinicio de stream: lo que aún se esté decodificando es del anterior
+        super()._clear_keyframes()
+        self.generation += 1
+
+    def _update_reading(self):
+        """Pausa o reanuda la lectura del socket según los frames en el executor"""
+        if self.transport is None or self.transport.is_closing():
+            return
+        busy = len(self.decoding) >= self.max_pending_decodes
+        if busy and not self.reading_paused:
+            self.transport.pause_reading()
+            self.reading_paused = True
+            self._inc("udp_read_pauses_total")
+        elif not busy and self.reading_paused:
+            self.transport.resume_reading()
+            self.reading_paused = False
+
+    def _add_to_queue(self, frame, meta=None):
+        """Añade frame (con sus metadatos) a la cola, descartando el más antiguo si está llena"""
+        item = (frame, meta)
+        try:
+            self.frame_queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self._inc("udp_queue_drops_total")
+            try:
+                self.frame_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            self.frame_queue.put_nowait(item)
+
+    async def get_frame(self, timeout=None, with_meta=False):
+        """
+        Devuelve el siguiente frame en orden, o None si no hay
+
+        Args:
+            timeout: Tiempo máximo de espera (None = esperar indefinidamente)
+            with_meta: Si es True devuelve la tupla (frame, FrameMeta)
+        """
+        if self.stop_event.is_set():
+            return None
+        try:
+            frame, meta = await asyncio.wait_for(self.frame_queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if frame is None:
+            return None  # Receptor cerrado mientras se esperaba
+        return (frame, meta) if with_meta else frame
+
+    def release(self):
+        self.stop_event.set()
+        if self.timer is not None:
+            self.timer.cancel()
+        if self.transport is not None:
+            self.transport.close()
+        # Despertar a quien esté esperando en get_frame()
+        try:
+            self.frame_queue.put_nowait((None, None))
+        except asyncio.QueueFull:
+            pass
+        logger.info("Receptor UDP cerrado")
+
+    def is_alive(self):
+        return self.transport is not None and not self.stop_event.is_set()
+
 
 
 # Clase para enviar frames a un servidor HTTP
@@ -411,25 +1017,52 @@ class VideoHTTPSender:
         self.upload_url = upload_url
 
     # Envía un frame (imagen) a un servidor HTTP en formato base64
-    def send_frame(self, sessionId, frame, car_count, person_count, bici_count):
-        # Codificar el frame como JPEG
-        _, buf = cv2.imencode(".jpg", frame)
+    # Con frame=None solo se envían los contadores
+    def send_frame(self, sessionId, frame, car_count, person_count, bici_count, meta=None):
+        payload = {
+            "sessionId": sessionId,
+            "metric_car_count": car_count,
+            "metric_person_count": person_count,
+            "metric_bici_count": bici_count,
+        }
+        if frame is not None:
+            # Codificar el frame como JPEG
+            _, buf = cv2.imencode(".jpg", frame)
 
-        # Codificar a base64
-        jpg_as_text = base64.b64encode(buf).decode()
+            # Codificar a base64
+            jpg_as_text = base64.b64encode(buf).decode()
+            payload["frame"] = f"data:image/jpeg;base64,{jpg_as_text}"
+        # Metadatos de latencia del frame (el backend puede medir su propio retardo)
+        if meta is not None:
+            payload["frame_meta"] = meta.to_dict()
 
         # Enviar el frame al servidor HTTP
+        start = time.perf_counter()
         try:
-            requests.post(
-                self.upload_url,
-                json={
-                    "sessionId": sessionId,
-                    "frame": f"data:image/jpeg;base64,{jpg_as_text}",
-                    "metric_car_count": car_count,
-                    "metric_person_count": person_count,
-                    "metric_bici_count": bici_count,
-                },
-                timeout=1,
-            )
+            response = requests.post(self.upload_url, json=payload, timeout=1)
+            if response.status_code >= 400:
+                REGISTRY.inc("uplink_errors_total", help="Errores al enviar frames al servidor HTTP")
         except requests.exceptions.RequestException:
+            REGISTRY.inc("uplink_errors_total", help="Errores al enviar frames al servidor HTTP")
             time.sleep(0.1)
+        finally:
+            REGISTRY.observe("uplink_seconds", time.perf_counter() - start,
+                             help="Duración del envío HTTP de cada frame")
+            if meta is not None:
+                meta.mark("uplink_done")
+
+    # Sube un segmento de vídeo grabado (SegmentRecorder) al servidor HTTP
+    def upload_segment(self, segment, timeout=60):
+        try:
+            with open(segment["path"], "rb") as f:
+                response = requests.post(
+                    self.upload_url.rstrip("/") + "/segments",
+                    files={"video": (segment["file"], f, "video/mp4")},
+                    data={k: segment[k] for k in ("start", "end", "frames", "fps", "codec")},
+                    timeout=timeout,
+                )
+            if response.status_code >= 400:
+                raise requests.exceptions.RequestException(f"HTTP {response.status_code}")
+        except (OSError, requests.exceptions.RequestException) as e:
+            REGISTRY.inc("segment_upload_errors_total", help="Errores al subir segmentos grabados")
+            logger.warning(f"No se pudo subir el segmento {segment['file']}: {e}")
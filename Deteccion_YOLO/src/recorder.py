@@ -0,0 +1,261 @@
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import cv2
+import numpy
+
+from frame_pool import FramePool
+from metrics import REGISTRY
+from log_utils import get_logger
+
+logger = get_logger("recorder")
+
+INDEX_NAME = "index.jsonl"  # Índice de segmentos (una línea JSON por segmento cerrado)
+
+
+class BackgroundFrameWriter:
+
+    def __init__(self, queue_size=60, annotated=True, name="video-writer"):
+        """
+        Base de las salidas de vídeo que escriben desde un hilo propio
+
+        write() solo copia el frame a un buffer del pool y lo encola sin bloquear:
+        si la escritura no da abasto se descartan frames, nunca se frena la inferencia.
+        Las subclases implementan _write_frame() y _finish().
+
+        Args:
+            queue_size: Frames pendientes de escribir como máximo
+            annotated: Escribir los frames anotados (True) o los originales (False)
+            name: Nombre del hilo (y del pool en las métricas)
+        """
+        self.annotated = annotated
+        self.name = name
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.pool = FramePool(max_buffers=queue_size + 1, name=name)
+        self.frames_dropped = 0
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def write(self, frame, timestamp=None):
+        """Encola una copia del frame; devuelve False si se ha descartado"""
+        if frame is None:
+            return False
+        if self.queue.full():
+            self._drop()
+            return False
+        buffer = self.pool.acquire(frame.shape, frame.dtype)
+        numpy.copyto(buffer, frame)
+        try:
+            self.queue.put_nowait((buffer, timestamp if timestamp is not None else time.time()))
+        except queue.Full:
+            self.pool.release(buffer)
+            self._drop()
+            return False
+        return True
+
+    def _drop(self):
+        self.frames_dropped += 1
+        REGISTRY.inc("video_writer_drops_total", help="Frames no escritos por tener la cola llena",
+                     writer=self.name)
+
+    def close(self, timeout=10):
+        """Termina de escribir lo encolado y cierra la salida"""
+        self.queue.put(None)
+        self.thread.join(timeout=timeout)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            frame, timestamp = item
+            try:
+                self._write_frame(frame, timestamp)
+            except Exception as e:
+                logger.error(f"Error escribiendo frame en {self.name}: {e}")
+            finally:
+                self.pool.release(frame)
+        self._finish()
+
+    def _write_frame(self, frame, timestamp):
+        raise NotImplementedError
+
+    def _finish(self):
+        pass
+
+
+class SegmentRecorder(BackgroundFrameWriter):
+
+    def __init__(self, directory, fps=20, segment_seconds=60, codec="avc1", fallback_codec="mp4v",
+                 extension=".mp4", queue_size=60, max_segments=0, annotated=True, on_segment=None):
+        """
+        Graba los frames en segmentos de vídeo de duración limitada desde un hilo propio
+
+        Al cerrar cada segmento se añade una línea a index.jsonl con su fichero,
+        inicio, fin y número de frames.
+
+        Como en la salida HLS, el ritmo lo marca la hora de los frames: llegan al
+        ritmo de la inferencia pero el contenedor tiene fps fijos, así que cada frame
+        se repite o se omite para que el segmento dure lo mismo que el tiempo grabado.
+
+        Args:
+            directory: Directorio de los segmentos y del índice
+            fps: FPS del contenedor de los segmentos
+            segment_seconds: Duración máxima de cada segmento (según la hora de los frames)
+            codec: FourCC del códec (avc1 = H.264, reproducible en el navegador)
+            fallback_codec: FourCC si el códec no está disponible en esta build de OpenCV
+            extension: Extensión (contenedor) de los segmentos
+            queue_size: Frames pendientes de escribir como máximo
+            max_segments: Segmentos que se conservan (0 = todos); los más antiguos se borran
+            annotated: Grabar los frames anotados (True) o los originales (False)
+            on_segment: Función llamada con la entrada del índice al cerrar cada segmento
+        """
+        super().__init__(queue_size, annotated, name="video-recorder")
+        self.directory = directory
+        self.fps = fps
+        self.segment_seconds = segment_seconds
+        self.codecs = [codec] + ([fallback_codec] if fallback_codec and fallback_codec != codec else [])
+        self.extension = extension
+        self.max_segments = max_segments
+        self.on_segment = on_segment
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        os.makedirs(directory, exist_ok=True)
+
+        self.writer = None
+        self.segment = None  # Entrada del índice del segmento abierto
+
+        # Estadísticas
+        self.frames_written = 0
+        self.frames_repeated = 0  # Copias añadidas para cubrir huecos entre frames
+        self.frames_skipped = 0  # Frames omitidos por llegar más rápido que fps
+        self.segments_closed = 0
+
+        self.thread.start()
+
+    def _finish(self):
+        self._close_segment()
+
+    def _write_frame(self, frame, timestamp):
+        height, width = frame.shape[:2]
+        if self.segment is not None and (
+            timestamp - self.segment["start"] >= self.segment_seconds
+            or (width, height) != (self.segment["width"], self.segment["height"])
+        ):
+            self._close_segment()
+        if self.segment is None:
+            self._open_segment(width, height, timestamp)
+        if self.writer is None:
+            return  # No hay códec disponible: se descartan los frames
+        # Frames que debería tener el segmento hasta este instante
+        due = int((timestamp - self.segment["start"]) * self.fps) + 1
+        copies = due - self.segment["frames"]
+        if copies <= 0:
+            self.frames_skipped += 1
+            REGISTRY.inc("recorder_frames_skipped_total", help="Frames omitidos por llegar más rápido que los fps")
+            return
+        for _ in range(copies):
+            self.writer.write(frame)
+        self.segment["frames"] += copies
+        self.segment["end"] = timestamp
+        self.frames_written += 1
+        self.frames_repeated += copies - 1
+        REGISTRY.inc("recorder_frames_total", help="Frames grabados en segmentos")
+        if copies > 1:
+            REGISTRY.inc("recorder_frames_repeated_total", copies - 1,
+                         help="Copias de frames añadidas para mantener los fps del segmento")
+
+    def _open_segment(self, width, height, timestamp):
+        name = "segment_" + datetime.fromtimestamp(timestamp).strftime("%Y%m%d_%H%M%S_%f")[:-3] + self.extension
+        path = os.path.join(self.directory, name)
+        for codec in self.codecs:
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), self.fps, (width, height))
+            if writer.isOpened():
+                self.codecs = self.codecs[self.codecs.index(codec):]  # No volver a probar los que fallan
+                break
+            writer.release()
+            logger.warning(f"Códec {codec} no disponible para grabar")
+        else:
+            writer = None
+            codec = None
+            logger.error(f"No se puede grabar {path}: ningún códec disponible")
+        self.writer = writer
+        self.segment = {
+            "file": name,
+            "start": timestamp,
+            "end": timestamp,
+            "frames": 0,
+            "width": width,
+            "height": height,
+            "fps": self.fps,
+            "codec": codec,
+        }
+        logger.info(f"Grabando segmento {name}")
+
+    def _close_segment(self):
+        if self.segment is None:
+            return
+        if self.writer is not None:
+            self.writer.release()
+        segment = self.segment
+        self.writer = None
+        self.segment = None
+        if segment["codec"] is None:
+            return
+        if segment["frames"] == 0:
+            os.remove(os.path.join(self.directory, segment["file"]))
+            return
+
+        with open(self.index_path, "a") as f:
+            f.write(json.dumps(segment) + "\n")
+        self.segments_closed += 1
+        REGISTRY.inc("recorder_segments_total", help="Segmentos de vídeo cerrados")
+        if self.max_segments:
+            self._prune()
+        if self.on_segment is not None:
+            try:
+                self.on_segment(dict(segment, path=os.path.join(self.directory, segment["file"])))
+            except Exception as e:
+                logger.warning(f"Error al notificar el segmento {segment['file']}: {e}")
+
+    def _prune(self):
+        """Borra los segmentos más antiguos y reescribe el índice (de forma atómica)"""
+        segments = read_index(self.index_path)
+        if len(segments) <= self.max_segments:
+            return
+        for segment in segments[:-self.max_segments]:
+            try:
+                os.remove(os.path.join(self.directory, segment["file"]))
+            except FileNotFoundError:
+                pass
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w") as f:
+            for segment in segments[-self.max_segments:]:
+                f.write(json.dumps(segment) + "\n")
+        os.replace(temp_path, self.index_path)
+
+    def get_stats(self):
+        return {
+            "frames_written": self.frames_written,
+            "frames_repeated": self.frames_repeated,
+            "frames_skipped": self.frames_skipped,
+            "frames_dropped": self.frames_dropped,
+            "segments": self.segments_closed,
+            "queue": self.queue.qsize(),
+        }
+
+
+def read_index(path):
+    """Lee las entradas de un index.jsonl (ignora una última línea incompleta)"""
+    segments = []
+    if not os.path.exists(path):
+        return segments
+    with open(path) as f:
+        for line in f:
+            try:
+                segments.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return segments
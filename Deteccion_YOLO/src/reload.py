@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy
+
+from zones import ZoneSet
+from metrics import REGISTRY
+from log_utils import get_logger
+
+logger = get_logger("reload")
+
+# Lo que usa el detector en cada frame. Es inmutable: una recarga crea otro y lo
+# asigna de una vez, así que el hilo de proceso nunca ve una mezcla de los dos.
+# epoch cambia cuando cambian el modelo o el tracker (los IDs de los tracks empiezan de nuevo)
+DetectorState = namedtuple(
+    "DetectorState", "model tracker detection_classes confidence iou class_confidence zones epoch"
+)
+
+MODEL_KEYS = ("MODEL_PATH",)  # Cargar y calentar un modelo nuevo
+TRACKER_KEYS = ("TRACKER", "TRACKER_BACKEND", "IOU_TRACKER")  # Crear un tracker nuevo
+RESTART_KEYS = ("IMG_SIZE", "FPS_CAP")  # Fijan la captura y los buffers: requieren reiniciar
+
+
+def class_confidence_from_config(model_config):
+    """CLASS_CONFIDENCE de model.json con las clases como enteros"""
+    return {int(k): v for k, v in model_config.get("CLASS_CONFIDENCE", {}).items()}
+
+
+def zones_from_config(model_config):
+    """ZoneSet de ZONES o, si no hay zonas, la orientación LINE_ORIENTATION"""
+    zones = model_config.get("ZONES", [])
+    return ZoneSet.from_config(zones) if zones else model_config["LINE_ORIENTATION"]
+
+
+class HotReloader:
+
+    def __init__(self, state, model_config, config_path, load_model, create_tracker,
+                 img_size, interval=2.0):
+        """
+        Recarga model.json sin parar el stream
+
+        Un hilo comprueba cada interval segundos si el fichero ha cambiado (o si se
+        ha pedido con request(), p. ej. desde SIGHUP). Los cambios de parámetros
+        (CONFIDENCE, IOU, clases, umbrales por clase, zonas) se aplican en el frame
+        siguiente. Un modelo o tracker nuevo se carga y se calienta en este hilo y
+        después se cambia entre dos frames; los contadores se conservan.
+
+        Args:
+            state: DetectorState inicial
+            model_config: Contenido de model.json con el que se creó state
+            config_path: Ruta de model.json
+            load_model: Función que carga el modelo a partir de MODEL_PATH
+            create_tracker: Función (backend, config, tracker_path) que crea el tracker
+            img_size: Tamaño de la imagen del modelo (para calentarlo)
+            interval: Segundos entre comprobaciones del fichero (0 = solo con request())
+        """
+        self.state = state
+        self.model_config = model_config
+        self.config_path = config_path
+        self.load_model = load_model
+        self.create_tracker = create_tracker
+        self.img_size = tuple(img_size)
+        self.interval = interval
+        self.reloads = 0
+        self.errors = 0
+
+        self._mtime = self._get_mtime()
+        self._requested = threading.Event()
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="config-reload", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._requested.set()
+        self.thread.join(timeout=5)
+
+    def request(self):
+        """Pide una recarga aunque el fichero no haya cambiado (seguro desde un manejador de señal)"""
+        self._requested.set()
+
+    def _get_mtime(self):
+        try:
+            return os.stat(self.config_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _run(self):
+        while not self._stop.is_set():
+            forced = self._requested.wait(timeout=self.interval or None)  # 0: solo con request()
+            self._requested.clear()
+            if self._stop.is_set():
+                break
+            mtime = self._get_mtime()
+            if not forced and mtime == self._mtime:
+                continue
+            self._mtime = mtime
+            self.reload()
+
+    def reload(self):
+        """Lee model.json y aplica los cambios; si algo falla se mantiene la configuración actual"""
+        start = time.perf_counter()
+        try:
+            with open(self.config_path) as config_file:
+                model_config = json.load(config_file)
+            changed = self._apply(model_config)
+        except Exception as e:
+            self.errors += 1
+            REGISTRY.inc("config_reloads_total", help="Recargas de model.json", result="error")
+            logger.error(f"No se ha podido recargar {self.config_path}: {e}")
+            return False
+        if changed:
+            self.reloads += 1
+            REGISTRY.inc("config_reloads_total", help="Recargas de model.json", result="ok")
+            REGISTRY.observe("config_reload_seconds", time.perf_counter() - start,
+                             help="Duración de las recargas (incluida la carga del modelo)")
+            logger.info(f"Configuración recargada: {', '.join(sorted(changed))}")
+        return True
+
+    def _apply(self, model_config):
+        """Construye el DetectorState nuevo y lo publica; devuelve las claves cambiadas"""
+        old_config = self.model_config
+        changed = {key for key in set(old_config) | set(model_config) if old_config.get(key) != model_config.get(key)}
+        if not changed:
+            return changed
+        for key in changed.intersection(RESTART_KEYS):
+            logger.warning(f"El cambio de {key} no se aplica hasta reiniciar")
+
+        # Primero todo lo que puede fallar, sin tocar el estado actual
+        state = self.state
+        updates = {
+            "detection_classes": model_config["DETECTION_CLASSES"],
+            "confidence": model_config["CONFIDENCE"],
+            "iou": model_config["IOU"],
+            "class_confidence": class_confidence_from_config(model_config),
+        }
+        if changed.intersection(("ZONES", "LINE_ORIENTATION")):
+            updates["zones"] = zones_from_config(model_config)
+
+        backend = model_config.get("TRACKER_BACKEND", "ultralytics")
+        new_tracker = bool(changed.intersection(TRACKER_KEYS))
+        # El tracker de ultralytics vive dentro del modelo: cambiarlo requiere un modelo nuevo
+        new_model = bool(changed.intersection(MODEL_KEYS)) or (new_tracker and backend == "ultralytics")
+        if new_model:
+            load_start = time.perf_counter()
+            model = self.load_model(model_config["MODEL_PATH"])
+            self._warm_up(model, updates)
+            logger.info(f"Modelo {model_config['MODEL_PATH']} cargado en {time.perf_counter() - load_start:.1f} s")
+            updates["model"] = model
+        if new_model or new_tracker:
+            updates["tracker"] = self.create_tracker(backend, model_config.get("IOU_TRACKER", {}),
+                                                     model_config["TRACKER"])
+            updates["epoch"] = state.epoch + 1
+
+        # Cambio atómico: el hilo de proceso lee self.state una vez por frame
+        self.state = state._replace(**updates)
+        self.model_config = model_config
+        return changed
+
+    def _warm_up(self, model, updates):
+        """Primera inferencia con un frame vacío, para que el cambio no se note en el stream"""
+        if not hasattr(model, "predict"):
+            return
+        width, height = self.img_size
+        frame = numpy.zeros((height, width, 3), dtype=numpy.uint8)
+        model.predict(frame, conf=updates["confidence"], iou=updates["iou"], imgsz=self.img_size,
+                      classes=updates["detection_classes"], verbose=False)
+
+    def get_stats(self):
+        return {"reloads": self.reloads, "errors": self.errors, "epoch": self.state.epoch}
@@ -0,0 +1,185 @@
+import json
+import threading
+import time
+
+
+# Etapas del pipeline, en orden, con el par de marcas de tiempo que las delimitan
+STAGES = (
+    ("network", "capture_time", "receive_time"),  # Pi -> receptor UDP
+    ("decode", "receive_time", "decode_done"),  # Decodificación JPEG
+    ("reorder", "decode_done", "delivered"),  # Espera en el buffer de reordenación
+    ("queue", "delivered", "process_start"),  # Espera en las colas hasta el hilo de proceso
+    ("inference", "process_start", "inference_done"),  # YOLO + tracking
+    ("uplink", "inference_done", "uplink_done"),  # Anotación + envío HTTP
+    ("total", "capture_time", "uplink_done"),  # Extremo a extremo
+)
+
+# Límites superiores de los buckets de los histogramas (segundos)
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1,
+    0.15, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class FrameMeta:
+    """Metadatos de un frame que viajan con él desde el receptor hasta el envío HTTP"""
+
+    __slots__ = (
+        "stream_id",
+        "sequence",
+        "capture_time",
+        "receive_time",
+        "decode_done",
+        "delivered",
+        "process_start",
+        "inference_done",
+        "uplink_done",
+        "clock_offset",
+    )
+
+    def __init__(self, stream_id=None, sequence=None, capture_time=None, receive_time=None):
+        """
+        Args:
+            stream_id: id del stream del emisor
+            sequence: número de secuencia del frame
+            capture_time: instante de captura en el reloj del emisor
+            receive_time: instante en que se recibió el frame completo
+        """
+        self.stream_id = stream_id
+        self.sequence = sequence
+        self.capture_time = capture_time
+        self.receive_time = receive_time
+        self.decode_done = None
+        self.delivered = None
+        self.process_start = None
+        self.inference_done = None
+        self.uplink_done = None
+        # Diferencia reloj receptor - reloj emisor (segundos), 0 si se asumen sincronizados
+        self.clock_offset = 0.0
+
+    def mark(self, field):
+        """Marca el instante actual en el campo indicado"""
+        setattr(self, field, time.time())
+
+    def _local_time(self, field):
+        """Devuelve la marca de tiempo en el reloj del receptor"""
+        value = getattr(self, field)
+        if value is not None and field == "capture_time":
+            value += self.clock_offset
+        return value
+
+    def local_capture_time(self):
+        """Instante de captura en el reloj del receptor (None si el emisor no lo envía)"""
+        return self._local_time("capture_time")
+
+    def stage_latencies(self):
+        """Devuelve un diccionario {etapa: segundos} con las etapas que tienen ambas marcas"""
+        latencies = {}
+        for stage, start_field, end_field in STAGES:
+            start = self._local_time(start_field)
+            end = self._local_time(end_field)
+            if start is not None and end is not None:
+                latencies[stage] = end - start
+        return latencies
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class LatencyHistogram:
+    """Histograma acumulativo de latencias con buckets fijos (estilo Prometheus)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # El último bucket es +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        value = max(0.0, value)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estima el cuantil q (0-1) interpolando linealmente dentro del bucket"""
+        if self.count == 0:
+            return None
+        target = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for i, count in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.max
+            if count and cumulative + count >= target:
+                fraction = (target - cumulative) / count
+                return lower + (upper - lower) * fraction
+            cumulative += count
+            lower = upper
+        return self.max
+
+    def to_dict(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class LatencyTracker:
+    """Acumula las latencias por etapa de los frames que completan el pipeline"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.lock = threading.Lock()
+        self.histograms = {stage: LatencyHistogram(buckets) for stage, _, _ in STAGES}
+        self.frames = 0
+
+    def record(self, meta):
+        """Registra las latencias de un frame (FrameMeta) que ha terminado el pipeline"""
+        if meta is None:
+            return
+        latencies = meta.stage_latencies()
+        with self.lock:
+            self.frames += 1
+            for stage, value in latencies.items():
+                self.histograms[stage].observe(value)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "frames": self.frames,
+                "stages": {stage: h.to_dict() for stage, h in self.histograms.items()},
+            }
+
+    def export_json(self, path):
+        """Escribe los histogramas en un fichero JSON"""
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def summary(self):
+        """Texto resumen con p50/p99 por etapa en milisegundos"""
+        lines = []
+        with self.lock:
+            for stage, histogram in self.histograms.items():
+                if histogram.count == 0:
+                    continue
+                lines.append(
+                    f"{stage:>10}: p50 {1000 * histogram.quantile(0.5):7.1f} ms | "
+                    f"p99 {1000 * histogram.quantile(0.99):7.1f} ms | n={histogram.count}"
+                )
+        return "\n".join(lines)
@@ -0,0 +1,360 @@
+import time
+
+import numpy
+
+from metrics import REGISTRY
+from tracing import LatencyHistogram
+
+TRACKER_BACKENDS = ("ultralytics", "iou")  # Valores admitidos de TRACKER_BACKEND
+
+# Buckets más finos que los de latencia: la asociación cuesta décimas de ms
+TRACKER_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU de todas las parejas entre dos conjuntos de cajas xyxy (N x 4 y M x 4 -> N x M)"""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return numpy.zeros((len(boxes_a), len(boxes_b)), dtype=numpy.float32)
+    a = boxes_a[:, None, :]
+    b = boxes_b[None, :, :]
+    width = numpy.clip(numpy.minimum(a[..., 2], b[..., 2]) - numpy.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = numpy.clip(numpy.minimum(a[..., 3], b[..., 3]) - numpy.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = width * height
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return intersection / numpy.maximum(union, 1e-9)
+
+
+def greedy_match(iou, min_iou):
+    """
+    Empareja filas y columnas por IoU descendente (cada una como mucho una vez)
+
+    Returns:
+        Lista de parejas (fila, columna) con IoU >= min_iou
+    """
+    rows, cols = numpy.nonzero(iou >= min_iou)
+    if len(rows) == 0:
+        return []
+    order = numpy.argsort(-iou[rows, cols], kind="stable")
+    used_rows, used_cols = set(), set()
+    matches = []
+    for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        matches.append((row, col))
+    return matches
+
+
+def inference_confidence(confidence, class_confidence=None):
+    """Confianza a pedir al detector: la menor de la general y las de cada clase,
+    para que NMS conserve los candidatos de las clases con umbral más bajo"""
+    return min([confidence, *(class_confidence or {}).values()])
+
+
+def class_confidence_mask(cls, conf, confidence, class_confidence):
+    """Máscara de las detecciones que superan el umbral de su clase
+    (confidence para las clases sin umbral propio)"""
+    thresholds = numpy.array([class_confidence.get(c, confidence) for c in cls.astype(int).tolist()],
+                             dtype=numpy.float32)
+    return conf >= thresholds
+
+
+def _to_numpy(values):
+    if values is None:
+        return None
+    if hasattr(values, "cpu"):
+        values = values.cpu().numpy()
+    return numpy.asarray(values)
+
+
+class TrackedBoxes:
+    """Cajas con ID en el mismo formato que results[0].boxes de ultralytics"""
+
+    def __init__(self, xyxy, ids, cls, conf):
+        self.xyxy = xyxy
+        self.id = ids if len(ids) else None
+        self.cls = cls
+        self.conf = conf
+
+
+class BaseTracker:
+    """Capa común de los trackers: mide por separado detección y tracking"""
+
+    name = "base"
+
+    def __init__(self):
+        self.detector_histogram = LatencyHistogram(TRACKER_BUCKETS)
+        self.tracker_histogram = LatencyHistogram(TRACKER_BUCKETS)
+
+    def track(self, model, frame, conf, iou, imgsz, classes=None, class_confidence=None):
+        """
+        Detecta y asigna IDs; devuelve un objeto con xyxy, id, cls y conf
+
+        Args:
+            classes: Clases a detectar (se filtran en el NMS, antes del tracking)
+            class_confidence: Umbral de confianza por clase {clase: umbral}, aplicado
+                antes del tracking; conf es el umbral de las demás clases
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        """Olvida los tracks (p. ej. al cambiar de stream)"""
+
+    def get_state(self):
+        """Estado serializable (JSON) de los tracks, o None si el tracker no puede reanudarse"""
+        return None
+
+    def set_state(self, state):
+        """Restaura un estado de get_state(); devuelve False si no es posible"""
+        return False
+
+    def _observe(self, detector_seconds, tracker_seconds):
+        self.detector_histogram.observe(detector_seconds)
+        self.tracker_histogram.observe(tracker_seconds)
+        REGISTRY.observe("detector_seconds", detector_seconds,
+                         help="Duración de la detección (preproceso, inferencia y NMS)", tracker=self.name)
+        REGISTRY.observe("tracker_seconds", tracker_seconds,
+                         help="Duración de la asociación de tracks", tracker=self.name)
+
+    def get_stats(self):
+        """Tiempos por frame (ms) de detección y tracking"""
+        stats = {"backend": self.name, "frames": self.tracker_histogram.count}
+        for part, histogram in (("detector", self.detector_histogram), ("tracker", self.tracker_histogram)):
+            if histogram.count:
+                stats[part] = {
+                    "mean_ms": round(1000 * histogram.sum / histogram.count, 3),
+                    "p50_ms": round(1000 * histogram.quantile(0.5), 3),
+                    "p99_ms": round(1000 * histogram.quantile(0.99), 3),
+                }
+        return stats
+
+
+class UltralyticsTracker(BaseTracker):
+    """Tracker integrado de ultralytics (BoT-SORT o ByteTrack según el YAML)"""
+
+    name = "ultralytics"
+
+    def __init__(self, config_path):
+        """
+        Args:
+            config_path: Ruta al YAML del tracker (p. ej. ./models/botsort.yaml)
+        """
+        super().__init__()
+        self.config_path = config_path
+        self.callback_model = None  # Modelo en el que está registrado el filtro por clase
+        self.confidence = None
+        self.class_confidence = None
+
+    def _filter_results(self, predictor):
+        """Callback de ultralytics: descarta las detecciones por debajo del umbral de
+        su clase. Se registra antes que el tracker, así que este no las llega a ver"""
+        if not self.class_confidence:
+            return
+        for i, result in enumerate(predictor.results):
+            boxes = result.boxes
+            if boxes is None or len(boxes.cls) == 0:
+                continue
+            keep = class_confidence_mask(_to_numpy(boxes.cls), _to_numpy(boxes.conf),
+                                         self.confidence, self.class_confidence)
+            if not keep.all():
+                predictor.results[i] = result[numpy.nonzero(keep)[0].tolist()]
+
+    def track(self, model, frame, conf, iou, imgsz, classes=None, class_confidence=None):
+        if self.callback_model is not model:
+            # Registrar el filtro antes de la primera llamada a model.track, que es
+            # cuando ultralytics registra el tracker. Se registra aunque no haya
+            # umbrales por clase: una recarga puede añadirlos después y el filtro
+            # ya no quedaría por delante del tracker
+            model.add_callback("on_predict_postprocess_end", self._filter_results)
+            self.callback_model = model
+        self.confidence = conf
+        self.class_confidence = class_confidence
+        start = time.perf_counter()
+        results = model.track(
+            frame,
+            conf=inference_confidence(conf, class_confidence),
+            iou=iou,
+            imgsz=imgsz,
+            classes=classes,
+            persist=True,
+            tracker=self.config_path,
+            verbose=False,
+        )
+        elapsed = time.perf_counter() - start
+        # El tracking de ultralytics no tiene tiempo propio: es lo que sobra de
+        # model.track tras preproceso, inferencia y postproceso
+        speed = getattr(results[0], "speed", None) or {}
+        detector = sum(v for v in speed.values() if v) / 1000
+        self._observe(min(detector, elapsed), max(0.0, elapsed - detector))
+        return results[0].boxes
+
+
+class IoUTracker(BaseTracker):
+    """
+    Tracker ligero estilo ByteTrack sobre las salidas del detector
+
+    Asocia por IoU (vectorizado con NumPy) sin ReID ni compensación de movimiento,
+    pensado para cámaras fijas. Primero empareja las detecciones de confianza alta
+    con todos los tracks, después las de confianza baja con los tracks activos que
+    quedan libres. Las cajas de los tracks se predicen con velocidad constante.
+
+    El detector se ejecuta con track_low_thresh para que la segunda asociación
+    reciba detecciones de confianza baja; la confianza general y los umbrales por
+    clase se aplican a las cajas devueltas, así que una detección débil mantiene
+    vivo su track sin llegar al conteo.
+    """
+
+    name = "iou"
+
+    def __init__(self, track_high_thresh=0.25, track_low_thresh=0.1, new_track_thresh=0.25,
+                 min_iou=0.2, track_buffer=30, velocity_smoothing=0.5):
+        """
+        Args:
+            track_high_thresh: Confianza mínima para la primera asociación
+            track_low_thresh: Confianza mínima para la segunda asociación
+            new_track_thresh: Confianza mínima para crear un track nuevo
+            min_iou: IoU mínimo entre caja predicha y detección para emparejarlas
+            track_buffer: Frames que se mantiene un track sin detección
+            velocity_smoothing: Peso de la velocidad anterior (0-1) al actualizarla
+        """
+        super().__init__()
+        self.track_high_thresh = track_high_thresh
+        self.track_low_thresh = track_low_thresh
+        self.new_track_thresh = new_track_thresh
+        self.min_iou = min_iou
+        self.track_buffer = track_buffer
+        self.velocity_smoothing = velocity_smoothing
+        self.reset()
+
+    def reset(self):
+        self.boxes = numpy.zeros((0, 4), dtype=numpy.float32)  # Última caja de cada track
+        self.velocity = numpy.zeros((0, 4), dtype=numpy.float32)  # Desplazamiento por frame
+        self.ids = numpy.zeros(0, dtype=numpy.int64)
+        self.lost = numpy.zeros(0, dtype=numpy.int64)  # Frames seguidos sin detección
+        self.next_id = 1
+
+    def get_state(self):
+        return {
+            "ids": self.ids.tolist(),
+            "boxes": self.boxes.tolist(),
+            "velocity": self.velocity.tolist(),
+            "lost": self.lost.tolist(),
+            "next_id": self.next_id,
+        }
+
+    def set_state(self, state):
+        self.boxes = numpy.asarray(state["boxes"], dtype=numpy.float32).reshape(-1, 4)
+        self.velocity = numpy.asarray(state["velocity"], dtype=numpy.float32).reshape(-1, 4)
+        self.ids = numpy.asarray(state["ids"], dtype=numpy.int64)
+        self.lost = numpy.asarray(state["lost"], dtype=numpy.int64)
+        self.next_id = int(state["next_id"])
+        return True
+
+    def track(self, model, frame, conf, iou, imgsz, classes=None, class_confidence=None):
+        start = time.perf_counter()
+        detector_conf = min(self.track_low_thresh, inference_confidence(conf, class_confidence))
+        results = model.predict(frame, conf=detector_conf, iou=iou, imgsz=imgsz, classes=classes,
+                                verbose=False)
+        detected = time.perf_counter()
+        boxes = results[0].boxes
+        tracked = self.update(_to_numpy(boxes.xyxy), _to_numpy(boxes.cls), _to_numpy(boxes.conf))
+        # Solo se devuelven las cajas que superan conf (o el umbral de su clase)
+        if len(tracked.cls):
+            keep = class_confidence_mask(tracked.cls, tracked.conf, conf, class_confidence or {})
+            if not keep.all():
+                ids = tracked.id[keep] if tracked.id is not None else numpy.zeros(0, dtype=numpy.float32)
+                tracked = TrackedBoxes(tracked.xyxy[keep], ids, tracked.cls[keep], tracked.conf[keep])
+        self._observe(detected - start, time.perf_counter() - detected)
+        return tracked
+
+    def update(self, xyxy, cls, conf):
+        """
+        Asocia las detecciones de un frame con los tracks
+
+        Args:
+            xyxy: Cajas detectadas (N x 4)
+            cls: Clase de cada detección
+            conf: Confianza de cada detección
+
+        Returns:
+            TrackedBoxes con las detecciones que tienen track en este frame
+        """
+        xyxy = numpy.asarray(xyxy, dtype=numpy.float32).reshape(-1, 4)
+        cls = numpy.asarray(cls, dtype=numpy.float32).reshape(-1)
+        conf = numpy.asarray(conf, dtype=numpy.float32).reshape(-1)
+
+        # Un track perdido lleva lost frames sin caja: predecir los lost + 1 desplazamientos
+        predicted = self.boxes + self.velocity * (self.lost + 1)[:, None]
+        det_track = numpy.full(len(xyxy), -1, dtype=numpy.int64)  # Track asignado a cada detección
+        free_tracks = numpy.ones(len(self.ids), dtype=bool)
+
+        # Primera asociación: detecciones de confianza alta con todos los tracks
+        high = numpy.nonzero(conf >= self.track_high_thresh)[0]
+        for t, d in greedy_match(iou_matrix(predicted, xyxy[high]), self.min_iou):
+            det_track[high[d]] = t
+            free_tracks[t] = False
+
+        # Segunda asociación: confianza baja con los tracks activos que quedan libres
+        low = numpy.nonzero((conf >= self.track_low_thresh) & (conf < self.track_high_thresh))[0]
+        candidates = numpy.nonzero(free_tracks & (self.lost == 0))[0]
+        for t, d in greedy_match(iou_matrix(predicted[candidates], xyxy[low]), self.min_iou):
+            det_track[low[d]] = candidates[t]
+            free_tracks[candidates[t]] = False
+
+        # Actualizar los tracks emparejados (caja, velocidad) y envejecer el resto
+        matched = det_track >= 0
+        tracks = det_track[matched]
+        if len(tracks):
+            gap = (self.lost[tracks] + 1)[:, None]
+            displacement = (xyxy[matched] - self.boxes[tracks]) / gap
+            self.velocity[tracks] = (self.velocity_smoothing * self.velocity[tracks]
+                                     + (1 - self.velocity_smoothing) * displacement)
+            self.boxes[tracks] = xyxy[matched]
+            self.lost[tracks] = 0
+        self.lost[free_tracks] += 1
+
+        # Crear tracks con las detecciones de confianza alta sin emparejar
+        new = numpy.nonzero(~matched & (conf >= self.new_track_thresh))[0]
+        if len(new):
+            new_ids = numpy.arange(self.next_id, self.next_id + len(new), dtype=numpy.int64)
+            self.next_id += len(new)
+            det_track[new] = numpy.arange(len(self.ids), len(self.ids) + len(new))
+            self.boxes = numpy.vstack([self.boxes, xyxy[new]])
+            self.velocity = numpy.vstack([self.velocity, numpy.zeros((len(new), 4), dtype=numpy.float32)])
+            self.ids = numpy.concatenate([self.ids, new_ids])
+            self.lost = numpy.concatenate([self.lost, numpy.zeros(len(new), dtype=numpy.int64)])
+
+        output = numpy.nonzero(det_track >= 0)[0]
+        ids = self.ids[det_track[output]]
+
+        # Eliminar los tracks perdidos demasiado tiempo
+        keep = self.lost <= self.track_buffer
+        if not keep.all():
+            self.boxes = self.boxes[keep]
+            self.velocity = self.velocity[keep]
+            self.ids = self.ids[keep]
+            self.lost = self.lost[keep]
+
+        return TrackedBoxes(xyxy[output], ids.astype(numpy.float32), cls[output], conf[output])
+
+
+def create_tracker(backend, config=None, tracker_path=None):
+    """
+    Crea el tracker configurado en model.json
+
+    Args:
+        backend: 'ultralytics' (tracker del YAML) o 'iou' (IoUTracker)
+        config: Parámetros del IoUTracker (IOU_TRACKER en model.json)
+        tracker_path: YAML del tracker de ultralytics (TRACKER en model.json)
+    """
+    if backend == "ultralytics":
+        return UltralyticsTracker(tracker_path)
+    if backend == "iou":
+        return IoUTracker(**(config or {}))
+    raise ValueError(f"TRACKER_BACKEND debe ser uno de {TRACKER_BACKENDS}")
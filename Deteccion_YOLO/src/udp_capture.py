@@ -0,0 +1,300 @@
+import argparse
+import json
+import random
+import socket
+import struct
+import threading
+import time
+
+# Formato del fichero de captura:
+#   cabecera: MAGIC + inicio de la captura (time.time(), double)
+#   registros: instante de llegada relativo al inicio (double) + longitud (uint32) + datagrama
+MAGIC = b"H5GUDP1\0"
+HEADER = struct.Struct("<d")
+RECORD = struct.Struct("<dI")
+
+
+def read_capture(path):
+    """Itera sobre los datagramas de una captura como tuplas (instante relativo, datos)"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} no es una captura UDP válida")
+        f.read(HEADER.size)
+        while True:
+            raw = f.read(RECORD.size)
+            if len(raw) < RECORD.size:
+                return
+            offset, length = RECORD.unpack(raw)
+            data = f.read(length)
+            if len(data) < length:
+                return  # Captura cortada a mitad de registro
+            yield offset, data
+
+
+class UDPRecorder:
+
+    def __init__(self, path, host="0.0.0.0", port=5000, forward=None,
+                 buffer_size=4*1024*1024):
+        """
+        Graba los datagramas UDP recibidos con su instante de llegada
+
+        Argumentos:
+            path: Fichero de captura a crear
+            host: Dirección IP en la que escuchar
+            port: Puerto UDP en el que escuchar
+            forward: (host, puerto) al que reenviar cada datagrama, para grabar
+                sin cortar el stream al detector (None para no reenviar). Lo que
+                el destino responde (los pong del reloj) se devuelve al emisor
+                sin grabarlo
+            buffer_size: Tamaño del buffer de recepción UDP
+        """
+        self.path = path
+        # Dirección resuelta, para reconocer los datagramas que vienen del destino
+        self.forward = (socket.gethostbyname(forward[0]), forward[1]) if forward else None
+        self.source = None  # Emisor del último datagrama reenviado
+        self.buffer_size = buffer_size
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_size)
+        self.socket.bind((host, port))
+        self.socket.settimeout(0.2)
+        self.stop_event = threading.Event()
+
+        # Estadísticas
+        self.packets = 0
+        self.bytes = 0
+        self.relayed = 0  # Respuestas del destino devueltas al emisor
+
+    def run(self, duration=None, max_packets=None):
+        """Graba hasta stop(), o hasta alcanzar la duración o el número de paquetes"""
+        start_wall = time.time()
+        start = time.monotonic()
+        with open(self.path, "wb") as f:
+            f.write(MAGIC + HEADER.pack(start_wall))
+            while not self.stop_event.is_set():
+                if duration is not None and time.monotonic() - start >= duration:
+                    break
+                if max_packets is not None and self.packets >= max_packets:
+                    break
+                try:
+                    data, addr = self.socket.recvfrom(self.buffer_size)
+                except socket.timeout:
+                    continue
+                if self.forward and addr == self.forward:
+                    # Respuesta del detector al emisor: no es parte del stream
+                    if self.source is not None:
+                        self.socket.sendto(data, self.source)
+                        self.relayed += 1
+                    continue
+                f.write(RECORD.pack(time.monotonic() - start, len(data)))
+                f.write(data)
+                self.packets += 1
+                self.bytes += len(data)
+                if self.forward:
+                    self.source = addr
+                    self.socket.sendto(data, self.forward)
+        self.socket.close()
+        return self.get_stats()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def get_stats(self):
+        return {"packets": self.packets, "bytes": self.bytes, "relayed": self.relayed}
+
+
+class UDPReplayer:
+
+    def __init__(self, path, host="127.0.0.1", port=5000, speed=1.0, loss=0.0,
+                 reorder=0.0, reorder_depth=3, duplicate=0.0, seed=None):
+        """
+        Reproduce una captura enviando sus datagramas a un socket UDP local
+
+        Argumentos:
+            path: Fichero de captura
+            host, port: Destino de los datagramas (p. ej. un VideoUDPReceiver)
+            speed: Factor de velocidad respecto a la captura (0 = lo más rápido posible)
+            loss: Probabilidad de descartar cada datagrama
+            reorder: Probabilidad de retrasar un datagrama
+            reorder_depth: Datagramas que se adelantan a uno retrasado
+            duplicate: Probabilidad de enviar un datagrama dos veces
+            seed: Semilla para que las alteraciones sean reproducibles
+        """
+        self.path = path
+        self.target = (host, port)
+        self.speed = speed
+        self.loss = loss
+        self.reorder = reorder
+        self.reorder_depth = reorder_depth
+        self.duplicate = duplicate
+        self.random = random.Random(seed)
+
+        # Estadísticas
+        self.read = 0
+        self.sent = 0
+        self.lost = 0
+        self.reordered = 0
+        self.duplicated = 0
+        self.elapsed = 0.0
+
+    def _impaired(self):
+        """Aplica pérdidas, desorden y duplicados a los datagramas de la captura"""
+        held = []  # [[datagramas que faltan por adelantarlo, datos]]
+        for offset, data in read_capture(self.path):
+            self.read += 1
+            if self.random.random() < self.loss:
+                self.lost += 1
+                continue
+            if self.random.random() < self.reorder:
+                self.reordered += 1
+                held.append([self.reorder_depth, data])
+                continue
+
+            yield offset, data
+            if self.random.random() < self.duplicate:
+                self.duplicated += 1
+                yield offset, data
+
+            # Liberar los datagramas retrasados a los que ya se ha adelantado suficiente
+            for item in held:
+                item[0] -= 1
+            while held and held[0][0] <= 0:
+                yield offset, held.pop(0)[1]
+
+        for _, data in held:
+            yield None, data
+
+    def run(self):
+        """Envía toda la captura respetando (o escalando) los instantes originales"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        start = time.monotonic()
+        try:
+            for offset, data in self._impaired():
+                if self.speed > 0 and offset is not None:
+                    delay = start + offset / self.speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                sock.sendto(data, self.target)
+                self.sent += 1
+        finally:
+            sock.close()
+        self.elapsed = time.monotonic() - start
+        return self.get_stats()
+
+    def get_stats(self):
+        return {
+            "read": self.read,
+            "sent": self.sent,
+            "lost": self.lost,
+            "reordered": self.reordered,
+            "duplicated": self.duplicated,
+            "elapsed": self.elapsed,
+        }
+
+
+def replay_to_receiver(replayer, port, idle_timeout=1.0):
+    """
+    Reproduce la captura contra un VideoUDPReceiver local y mide lo que entrega
+    (reensamblado, reordenación y decodificación), sin modelo ni red real
+    """
+    from metrics import REGISTRY
+    from network_utils import VideoUDPReceiver, RECEIVER_COUNTERS
+
+    receiver = VideoUDPReceiver(host="127.0.0.1", port=port, queue_size=100,
+                                socket_timeout=idle_timeout, auto_start=True)
+    time.sleep(0.1)  # Dar tiempo a que el socket esté escuchando
+    labels = receiver.metrics_labels
+    # El registro es global: se informa de lo contado durante esta reproducción
+    before = {name: REGISTRY.get_counter(name, **labels) for name in RECEIVER_COUNTERS}
+
+    frames = 0
+    first_frame = last_frame = None
+    done = threading.Event()
+
+    def consume():
+        nonlocal frames, first_frame, last_frame
+        while not done.is_set():
+            if receiver.get_frame(timeout=0.05) is None:
+                continue
+            last_frame = time.monotonic()
+            if first_frame is None:
+                first_frame = last_frame
+            frames += 1
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+    replay_stats = replayer.run()
+    replay_end = time.monotonic()
+
+    # Esperar a que el receptor termine de entregar lo que tenga pendiente
+    while time.monotonic() - max(replay_end, last_frame or 0) < idle_timeout:
+        time.sleep(0.05)
+    done.set()
+    consumer.join()
+    receiver.release()
+
+    delivered_time = (last_frame - first_frame) if frames > 1 else 0.0
+    return {
+        "replay": replay_stats,
+        "frames": frames,
+        "frames_per_second": frames / delivered_time if delivered_time > 0 else None,
+        "receiver": {name: REGISTRY.get_counter(name, **labels) - before[name]
+                     for name in RECEIVER_COUNTERS},
+        "playout": receiver.get_playout_stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grabación y reproducción de streams UDP de vídeo")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record = subparsers.add_parser("record", help="Grabar los datagramas recibidos en un puerto")
+    record.add_argument("output", help="Fichero de captura")
+    record.add_argument("--host", default="0.0.0.0")
+    record.add_argument("--port", type=int, default=5000)
+    record.add_argument("--duration", type=float, help="Segundos a grabar (por defecto hasta Ctrl+C)")
+    record.add_argument("--forward", help="host:puerto al que reenviar los datagramas")
+
+    replay = subparsers.add_parser("replay", help="Reproducir una captura")
+    replay.add_argument("capture", help="Fichero de captura")
+    replay.add_argument("--host", default="127.0.0.1")
+    replay.add_argument("--port", type=int, default=5000)
+    replay.add_argument("--speed", type=float, default=1.0, help="Factor de velocidad (0 = máxima)")
+    replay.add_argument("--loss", type=float, default=0.0, help="Probabilidad de pérdida")
+    replay.add_argument("--reorder", type=float, default=0.0, help="Probabilidad de desorden")
+    replay.add_argument("--reorder-depth", type=int, default=3)
+    replay.add_argument("--duplicate", type=float, default=0.0, help="Probabilidad de duplicado")
+    replay.add_argument("--seed", type=int, help="Semilla de las alteraciones")
+    replay.add_argument("--receive", action="store_true",
+                        help="Reproducir contra un VideoUDPReceiver local y medir lo entregado")
+
+    args = parser.parse_args()
+
+    if args.command == "record":
+        forward = None
+        if args.forward:
+            host, port = args.forward.rsplit(":", 1)
+            forward = (host, int(port))
+        recorder = UDPRecorder(args.output, args.host, args.port, forward)
+        print(f"Grabando {args.host}:{args.port} en {args.output} (Ctrl+C para parar)")
+        try:
+            stats = recorder.run(duration=args.duration)
+        except KeyboardInterrupt:
+            stats = recorder.get_stats()
+        print(json.dumps(stats))
+        return
+
+    replayer = UDPReplayer(
+        args.capture, args.host, args.port, speed=args.speed, loss=args.loss,
+        reorder=args.reorder, reorder_depth=args.reorder_depth,
+        duplicate=args.duplicate, seed=args.seed,
+    )
+    if args.receive:
+        stats = replay_to_receiver(replayer, args.port)
+    else:
+        stats = replayer.run()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,21 @@ import cv2
 import numpy
 import uuid
 from network_utils import VideoHTTPSender
+from frame_pool import FramePool
+from events import CrossingEvent
+from zones import ZoneSet, legacy_zones, points_array
+from reload import DetectorState
+from tracing import FrameMeta
+from metrics import REGISTRY
+from log_utils import get_logger
 import threading
 import queue
+import time
+
+logger = get_logger("video")
+
+ANNOTATION_MODES = ("auto", "full", "none")  # Política de anotación de los frames
+UPLINK_MODES = ("frame", "metadata")  # Qué se sube al servidor HTTP
 
 
 # Función principal para capturar y procesar el video
@@ -20,104 +33,225 @@ def video_loop(
     SERVER_URL,
     PROCESSING_QUEUE_SIZE,
     shared_data,
+    latency_tracker=None,
+    annotation="auto",
+    uplink_mode="frame",
+    class_confidence=None,
+    recorder=None,
+    live=None,
+    event_store=None,
+    reloader=None,
+    checkpointer=None,
 ):
-    """Función principal para capturar y procesar el video."""
+    """Función principal para capturar y procesar el video.
+
+    Si se pasa un LatencyTracker, registra las latencias por etapa de cada frame.
+
+    annotation decide si se dibujan las detecciones sobre el frame: 'full' siempre,
+    'none' nunca (solo conteo) y 'auto' solo si alguien necesita los píxeles
+    (ventana o subida del frame). uplink_mode 'frame' sube el frame anotado con
+    los contadores y 'metadata' solo los contadores.
+
+    class_confidence ({clase: umbral}) fija umbrales de confianza por clase.
+    Si se pasa un SegmentRecorder o un HLSStreamer (live), cada frame (anotado u
+    original) se escribe en ellos sin bloquear. Si se pasa un EventStore, se
+    guardan en él los eventos de cruce de las líneas.
+
+    Si se pasa un HotReloader, el modelo, el tracker y los parámetros de detección
+    se toman de su DetectorState al empezar cada frame (los argumentos son solo
+    el estado inicial sin recarga). Si se pasa un Checkpointer, el estado de conteo
+    se guarda periódicamente y se restaura al empezar un stream que coincide con
+    el del checkpoint."""
+    if annotation not in ANNOTATION_MODES:
+        raise ValueError(f"annotation debe ser uno de {ANNOTATION_MODES}")
+    if uplink_mode not in UPLINK_MODES:
+        raise ValueError(f"uplink_mode debe ser uno de {UPLINK_MODES}")
 
     frame_queue = queue.Queue(maxsize=PROCESSING_QUEUE_SIZE)  # Puedes ajustar el tamaño
+    REGISTRY.gauge_fn("processing_queue_depth", frame_queue.qsize,
+                      help="Frames esperando en la cola de procesamiento")
 
     # Inicializar el sender HTTP si se especifica la URL del servidor
+    sender = None
     if SERVER_URL:
         sender = VideoHTTPSender(SERVER_URL)
 
+    # Anotar solo si se van a usar los píxeles anotados
+    upload_frames = sender is not None and uplink_mode == "frame"
+    outputs = [output for output in (recorder, live) if output is not None]  # Grabación y directo
+    annotate = annotation == "full" or (
+        annotation == "auto" and (SHOW_WINDOW or upload_frames or any(o.annotated for o in outputs))
+    )
+    logger.info(f"Anotación de frames: {'sí' if annotate else 'no'} | subida: {uplink_mode}")
+
+    # Modelo, tracker y parámetros de detección; con recarga cambian entre frames
+    fixed_state = DetectorState(model, TRACKER, DETECTION_CLASSES, CONFIDENCE, IOU,
+                                class_confidence, LINE_ORIENTATION, 0)
+
+    # Buffers de captura y redimensionado reutilizables: los que están en la cola,
+    # el que se está leyendo y los dos del frame en proceso
+    frame_pool = FramePool(max_buffers=PROCESSING_QUEUE_SIZE + 3, name="video")
+
     def capture_frames():
         no_frame_count = 0 # Contador de frames sin recibir
         max_no_frames = 50  # Máximo 5 segundos sin frames
-        last_stream_id = None # Ultimo id del stream (identifica la conexion con el emisor)
+        frame_shape = None  # Forma de los frames de la fuente local (para leer en buffers del pool)
         
         while True:
 
-            if hasattr(cap, "get_stream_id"):
-                current_stream_id = cap.get_stream_id()
-                if current_stream_id != last_stream_id:
-                    # Resetear métricas
-                    shared_data["total_count"] = 0
-                    shared_data["already_counted"] = set()
-                    shared_data["track_last_positions"] = {}
-                    shared_data["car_count"] = 0
-                    shared_data["person_count"] = 0
-                    shared_data["bici_count"] = 0
-                    last_stream_id = current_stream_id
-
-
             if hasattr(cap, "get_frame"):
-                frame = cap.get_frame(timeout=None)
+                item = cap.get_frame(timeout=None, with_meta=True)
+                frame, meta = item if item is not None else (None, None)
                
                 if frame is None:
                     # No hay frame disponible: continuar
                     no_frame_count += 1
                     if no_frame_count >= max_no_frames:
-                        print("Timeout - no se reciben frames. Saliendo...")
+                        logger.warning("Timeout - no se reciben frames. Saliendo...")
                         break
                     continue
                 elif not isinstance(frame, numpy.ndarray):
-                    print("Frame recibido no válido. Saliendo...")
+                    logger.error("Frame recibido no válido. Saliendo...")
                     break
                 else:
                     no_frame_count = 0  # Resetear contador
             else:
-                ret, frame = cap.read()
+                # Leer en un buffer del pool (cap.read lo rellena si coincide la forma)
+                buffer = frame_pool.acquire(frame_shape) if frame_shape else None
+                ret, frame = cap.read(buffer) if buffer is not None else cap.read()
+                if frame is not buffer:
+                    frame_pool.release(buffer)  # La fuente ha reservado otro array
                 if not ret or frame is None:
-                    print("No se reciben frames desde la fuente de vídeo. Saliendo...")
+                    logger.warning("No se reciben frames desde la fuente de vídeo. Saliendo...")
                     break
-            frame_queue.put(frame)
+                frame_shape = frame.shape
+                # Fuente local: captura, recepción y decodificación coinciden
+                now = time.time()
+                meta = FrameMeta(capture_time=now, receive_time=now)
+                meta.decode_done = meta.delivered = now
+            frame_queue.put((frame, meta))
         frame_queue.put(None)  # Señal para terminar
 
     def process_frames():
+        annotation_buffer = None  # Buffer reutilizado para dibujar las anotaciones
+        fps = None  # FPS de inferencia (media exponencial, empieza con la primera medida)
+        last_frame_time = None
+        epoch = fixed_state.epoch
+        stream = None  # Stream del último frame ("local" si la fuente no tiene stream_id)
+        state = fixed_state
         while True:
-            frame = frame_queue.get()
-            if frame is None:
+            item = frame_queue.get()
+            if item is None:
                 break
-            # Cambiar frame a resolución consistente
+            frame, meta = item
+            state = reloader.state if reloader is not None else fixed_state
+            if state.epoch != epoch:
+                # Modelo o tracker nuevos: los IDs empiezan de nuevo, los contadores se mantienen
+                reset_tracks(shared_data)
+                epoch = state.epoch
+            frame_stream = str(meta.stream_id) if meta is not None and meta.stream_id is not None else "local"
+            if frame_stream != stream:
+                # Empieza un stream (conexión nueva con el emisor): el conteo empieza de cero
+                # o, si es el del checkpoint, sigue desde ahí. Reset y restauración van en
+                # este hilo y en este orden, así que el reset nunca pisa lo restaurado
+                reset_counts(shared_data)
+                if checkpointer is not None:
+                    checkpointer.restore(shared_data, frame_stream, state.tracker)
+                stream = frame_stream
+            if meta is not None:
+                meta.mark("process_start")
+            # Cambiar frame a resolución consistente, en un buffer del pool. El frame
+            # original ya no se usa y vuelve al pool (si salió de él)
             if frame.shape[1] != IMG_SIZE[0] or frame.shape[0] != IMG_SIZE[1]:
-                frame = cv2.resize(frame, IMG_SIZE)
+                original = frame
+                resized = frame_pool.acquire((IMG_SIZE[1], IMG_SIZE[0]) + frame.shape[2:], frame.dtype)
+                frame = cv2.resize(original, IMG_SIZE, dst=resized)
+                frame_pool.release(original)
+            if annotate and (annotation_buffer is None or annotation_buffer.shape != frame.shape):
+                annotation_buffer = numpy.empty_like(frame)
+            crossings = [] if event_store is not None else None
+            inference_start = time.perf_counter()
             annotated_frame, car_count, person_count, bici_count = process_frame(
                 frame,
-                model,
-                DETECTION_CLASSES,
-                CONFIDENCE,
-                IOU,
+                state.model,
+                state.detection_classes,
+                state.confidence,
+                state.iou,
                 IMG_SIZE,
-                TRACKER,
-                LINE_ORIENTATION,
+                state.tracker,
+                state.zones,
                 shared_data,
+                meta,
+                annotate=annotate,
+                annotation_buffer=annotation_buffer,
+                class_confidence=state.class_confidence,
+                crossings=crossings,
             )
-            # Cambiar frame a resolución consistente
-            annotated_frame_resized = cv2.resize(annotated_frame, IMG_SIZE)
+            now = time.perf_counter()
+            REGISTRY.observe("inference_seconds", now - inference_start,
+                             help="Duración de process_frame (detección, tracking y anotación)")
+            REGISTRY.inc("frames_processed_total", help="Frames procesados por el detector")
+            if last_frame_time is not None and now > last_frame_time:
+                sample = 1.0 / (now - last_frame_time)
+                fps = sample if fps is None else 0.9 * fps + 0.1 * sample
+                REGISTRY.set_gauge("inference_fps", round(fps, 2), help="FPS de procesamiento")
+            last_frame_time = now
 
-            # Enviar el frame al servidor HTTP si se especifica
+            # Enviar el frame (o solo los contadores) al servidor HTTP si se especifica
             if sender:
                     try:
                         sender.send_frame(
                             sessionId=uuid.uuid4().hex,
-                            frame=annotated_frame_resized,
+                            frame=(annotated_frame if annotated_frame is not None else frame)
+                            if upload_frames else None,
                             car_count=car_count,
                             person_count=person_count,
                             bici_count=bici_count,
+                            meta=meta,
                         )
                     except Exception as e:
-                        print(f"Servidor no disponible. Reintentando en siguiente frame... ({e})")
+                        REGISTRY.inc("uplink_errors_total", help="Errores al enviar frames al servidor HTTP")
+                        logger.warning(f"Servidor no disponible. Reintentando en siguiente frame... ({e})")
+
+            # Guardar los cruces del frame (el EventStore escribe por lotes en su hilo)
+            # con el instante de captura, no el de proceso: la cola y la inferencia
+            # no desplazan los eventos en el tiempo
+            if crossings:
+                timestamp = meta.local_capture_time() if meta is not None else None
+                if timestamp is None:
+                    timestamp = time.time()
+                event_store.add([CrossingEvent(timestamp, stream, *crossing) for crossing in crossings])
+
+            # Checkpoint del conteo cada cierto tiempo (la escritura es de otro hilo)
+            if checkpointer is not None:
+                checkpointer.maybe_checkpoint(shared_data, stream, state.tracker)
+
+            # Grabar y emitir en directo el frame (cada salida copia y encola sin bloquear)
+            for output in outputs:
+                output.write(annotated_frame if output.annotated and annotated_frame is not None else frame)
+
+            # Registrar latencias por etapa del frame
+            if latency_tracker is not None:
+                latency_tracker.record(meta)
 
             # Mostrar el frame si se pide
             if SHOW_WINDOW:
-                cv2.imshow("Deteccion de coches", annotated_frame_resized)
-                if cv2.waitKey(1) & 0xFF == ord("q"):
-                    break
+                cv2.imshow("Deteccion de coches", annotated_frame if annotated_frame is not None else frame)
 
-        cv2.destroyAllWindows()
+            # El frame ya se ha subido y mostrado: su buffer se puede reutilizar
+            frame_pool.release(frame)
+
+            if SHOW_WINDOW and cv2.waitKey(1) & 0xFF == ord("q"):
+                break
+
+        if SHOW_WINDOW:
+            cv2.destroyAllWindows()
+        if checkpointer is not None and stream is not None:
+            checkpointer.checkpoint(shared_data, stream, state.tracker)  # Estado final
 
     # Lanzar los hilos
-    thread_capture = threading.Thread(target=capture_frames)
-    thread_process = threading.Thread(target=process_frames)
+    thread_capture = threading.Thread(target=capture_frames, name="video-capture")
+    thread_process = threading.Thread(target=process_frames, name="video-process")
     thread_capture.start()
     thread_process.start()
     thread_capture.join()
@@ -135,185 +269,205 @@ def process_frame(
     TRACKER,
     line_orientation,
     shared_data,
+    meta=None,
+    annotate=True,
+    annotation_buffer=None,
+    class_confidence=None,
+    crossings=None,
 ):
     """Función para procesar cada frame,
-    detectar coches y dibujar las cajas"""
-    # Acceder a las variables compartidas
-    total_count = shared_data["total_count"]
-    car_count = shared_data.get("car_count", 0)
-    person_count = shared_data.get("person_count", 0)
-    bici_count = shared_data.get("bici_count", 0)
+    detectar coches y dibujar las cajas.
+    Si se pasan metadatos (FrameMeta), marca el fin de la inferencia.
+    Con annotate=False solo se cuenta y el frame anotado devuelto es None.
+    Si se pasa annotation_buffer (mismo tamaño que el frame) se dibuja en él
+    en lugar de en una copia nueva.
+    La selección de clases (DETECTION_CLASSES) se hace en el NMS del detector y los
+    umbrales por clase (class_confidence, solo con trackers de trackers.py) antes
+    del tracking, para no asociar objetos que luego se descartan.
+    Si se pasa una lista crossings, se añaden a ella los cruces del frame.
+    line_orientation es un ZoneSet (ZONES en model.json) o, como antes,
+    'horizontal' o 'vertical'"""
+    # Resultados de la detección y el tracking: TRACKER es un tracker de trackers.py
+    # o la ruta al YAML del tracker de ultralytics
+    if hasattr(TRACKER, "track"):
+        boxes = TRACKER.track(model, frame, CONFIDENCE, IOU, IMG_SIZE,
+                              classes=DETECTION_CLASSES, class_confidence=class_confidence)
+    else:
+        results = model.track(
+            frame,
+            conf=CONFIDENCE,
+            iou=IOU,
+            imgsz=IMG_SIZE,
+            classes=DETECTION_CLASSES,
+            persist=True,
+            tracker=TRACKER,
+            verbose=False,
+        )
+        boxes = results[0].boxes
+    if meta is not None:
+        meta.mark("inference_done")
+
+    # Geometría de las zonas de conteo para el tamaño del frame (precalculada)
+    height, width = frame.shape[:2]
+    zones = line_orientation if isinstance(line_orientation, ZoneSet) else legacy_zones(line_orientation)
+    zone_geometry = zones.geometry(width, height)
+
+    # Detecciones con ID de las clases a detectar
+    names = model.names if hasattr(model, "names") else None
+    detections = extract_detections(boxes, names, DETECTION_CLASSES)
+
+    # Contar los objetos que cruzan las zonas
+    count_crossings(detections, zone_geometry, shared_data, crossings)
+
+    annotated_frame = None
+    if annotate:
+        # Copiar el frame al buffer de anotaciones (o a una copia nueva)
+        if annotation_buffer is not None and annotation_buffer.shape == frame.shape:
+            numpy.copyto(annotation_buffer, frame)
+            annotated_frame = annotation_buffer
+        else:
+            annotated_frame = frame.copy()
+        zone_geometry.draw(annotated_frame)
+        draw_detections(annotated_frame, detections)
+        draw_counters(annotated_frame, shared_data)
+
+    return (
+        annotated_frame,
+        shared_data["car_count"],
+        shared_data["person_count"],
+        shared_data["bici_count"],
+    )
+
+
+def _to_numpy(values):
+    """Convierte un tensor (torch, en CPU o GPU) o una secuencia en un array de NumPy"""
+    if hasattr(values, "cpu"):
+        values = values.cpu().numpy()
+    return numpy.asarray(values)
+
+
+def extract_detections(boxes, names, detection_classes):
+    """Devuelve las detecciones con ID válido de las clases a detectar como tuplas
+    (x1, y1, x2, y2, track_id, class_name, confidence).
+    Los tensores se convierten a listas de una vez en lugar de elemento a elemento"""
+    if boxes.id is None:
+        return []
+    xyxy = _to_numpy(boxes.xyxy).astype(int).tolist()
+    track_ids = _to_numpy(boxes.id).astype(int).tolist()
+    class_ids = _to_numpy(boxes.cls).astype(int).tolist()
+    confidences = _to_numpy(boxes.conf).tolist()
+
+    detections = []
+    for (x1, y1, x2, y2), track_id, cls_id, confidence in zip(
+        xyxy, track_ids, class_ids, confidences
+    ):
+        # Filtrar por clase
+        if cls_id not in detection_classes:
+            continue
+        # Obtener el nombre de la clase desde el modelo
+        class_name = names[cls_id] if names is not None else str(cls_id)
+        detections.append((x1, y1, x2, y2, track_id, class_name, confidence))
+    return detections
+
+
+def reset_counts(shared_data):
+    """Pone a cero los contadores y olvida los tracks (empieza un stream)"""
+    for key in ("total_count", "car_count", "person_count", "bici_count"):
+        shared_data[key] = 0
+    shared_data["zone_counts"] = {}
+    reset_tracks(shared_data)
+
+
+def reset_tracks(shared_data):
+    """Olvida las posiciones y los IDs ya contados, sin tocar los contadores"""
+    shared_data["already_counted"] = set()
+    shared_data["track_last_positions"] = {}
+    shared_data["zone_counted"] = set()
+
+
+def _add_count(shared_data, class_name):
+    """Incrementa el contador total y el específico de la clase"""
+    shared_data["total_count"] += 1
+    class_name = class_name.lower()
+    if class_name == "car":  # Si es coche
+        shared_data["car_count"] += 1
+    elif class_name == "person":  # Si es persona
+        shared_data["person_count"] += 1
+    elif class_name == "bicycle":  # Si es bicicleta
+        shared_data["bici_count"] += 1
+
+
+def count_crossings(detections, zone_geometry, shared_data, crossings=None):
+    """Cuenta los objetos que cruzan las zonas desde el frame anterior
+    y actualiza los contadores y las posiciones de shared_data.
+    Los cruces se calculan a la vez para todas las detecciones y zonas; cada track
+    suma una vez a los contadores totales y una vez a cada zona que cruza.
+    Si se pasa una lista crossings, se añade a ella cada cruce contado como
+    (track_id, clase, zona, sentido)"""
+    if not detections:
+        return
     already_counted = shared_data["already_counted"]
     track_last_positions = shared_data["track_last_positions"]
+    zone_counts = shared_data.setdefault("zone_counts", {})
+    zone_counted = shared_data.setdefault("zone_counted", set())
 
-    # Resultados de la detección y el tracking
-    results = model.track(
-        frame,
-        conf=CONFIDENCE,
-        iou=IOU,
-        imgsz=IMG_SIZE,
-        persist=True,
-        tracker=TRACKER,
-        verbose=False,
-    )
+    # Centro de cada caja; solo pueden cruzar los tracks con posición anterior
+    track_ids = [d[4] for d in detections]
+    centroids = [((d[0] + d[2]) // 2, (d[1] + d[3]) // 2) for d in detections]
+    known = [index for index, track_id in enumerate(track_ids) if track_id in track_last_positions]
+    if known:
+        previous = points_array([track_last_positions[track_ids[index]] for index in known])
+        current = points_array(centroids if len(known) == len(centroids) else [centroids[index] for index in known])
+        for row, zone, direction in zone_geometry.crossings(previous, current):
+            _, _, _, _, track_id, class_name, _ = detections[known[row]]
+            if (track_id, zone) not in zone_counted:
+                zone_counted.add((track_id, zone))
+                zone_counts[zone] = zone_counts.get(zone, 0) + 1
+                if crossings is not None:
+                    crossings.append((track_id, class_name, zone, direction))
+            if track_id not in already_counted:
+                _add_count(shared_data, class_name)
+                already_counted.add(track_id)  # Marcar como contado
+
+    # Actualizar la última posición de cada track
+    track_last_positions.update(zip(track_ids, centroids))
 
-    # Crear una copia del frame para anotaciones
-    annotated_frame = frame.copy()
-
-    # Dimensiones del frame
-    height, width = annotated_frame.shape[:2]
-
-    if line_orientation == "horizontal":
-        # Línea horizontal a 2/3 de la altura
-        line_pos = int(height * 2 / 3)
-        cv2.line(annotated_frame, (0, line_pos), (width, line_pos), (0, 255, 255), 2)
-    elif line_orientation == "vertical":
-        # Líneas verticales a 1/4 y 3/4 del ancho
-        line_left = int(width * 1 / 4)
-        line_right = int(width * 3 / 4)
-        cv2.line(annotated_frame, (line_left, 0), (line_left, height), (0, 255, 255), 2)
-        cv2.line(
-            annotated_frame, (line_right, 0), (line_right, height), (0, 255, 255), 2
+
+def draw_detections(frame, detections):
+    """Dibuja la caja, la etiqueta y el centro de cada detección"""
+    for x1, y1, x2, y2, track_id, class_name, confidence in detections:
+        centroid = ((x1 + x2) // 2, (y1 + y2) // 2)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(
+            frame,
+            f"{class_name} {track_id} {confidence:.2f}",
+            (x1, y1 - 10),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.9,
+            (0, 255, 0),
+            2,
         )
-    else:
-        raise ValueError("line_orientation debe ser 'horizontal' o 'vertical'")
-
-    # Procesar tracking y detecciones
-    if results[0].boxes.id is not None:
-        for box, track_id, cls_id, conf in zip(
-            results[0].boxes.xyxy,
-            results[0].boxes.id,
-            results[0].boxes.cls,
-            results[0].boxes.conf,
-        ):
-            # Obtener coordenadas de la caja
-            x1, y1, x2, y2 = map(int, box)
-
-            # Calcular el centro de la caja
-            centroid = ((x1 + x2) // 2, (y1 + y2) // 2)
-
-            # Solo considerar detecciones con ID válido
-            cls_id = int(cls_id)
-
-            # Filtrar por clase
-            if cls_id not in DETECTION_CLASSES:
-                continue
-
-            # Obtener el nombre de la clase desde el modelo
-            class_name = model.names[cls_id] if hasattr(model, "names") else str(cls_id)
-            # Obtener la confianza de la detección
-            confidence = float(conf)
-
-            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            cv2.putText(
-                annotated_frame,
-                f"{class_name} {int(track_id)} {confidence:.2f}",
-                (x1, y1 - 10),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.9,
-                (0, 255, 0),
-                2,
-            )
-            cv2.circle(annotated_frame, centroid, 4, (0, 0, 255), -1)
-
-            # Solo cuenta si cruza las líneas
-            # según la orientación de la línea
-            # Si es horizontal:
-            if line_orientation == "horizontal":
-                # Obtener la posición anterior del objeto
-                prev_pos = track_last_positions.get(int(track_id), None)
-                if (
-                    prev_pos is not None  # Si existe una posición anterior
-                    and prev_pos < line_pos  # Estaba por encima de la línea
-                    and centroid[1] >= line_pos  # Ahora está por debajo
-                    and track_id not in already_counted  # No se ha contado ya
-                ):
-                    total_count += 1  # Incrementar el contador
-                    # Incrementar el contador específico según la clase
-                    if class_name.lower() in ['car']: # Si es coche
-                        car_count += 1 # Incrementar contador de coches
-                    elif class_name.lower() in ['person']:
-                        person_count += 1 # Incrementar contador de persona
-                    elif class_name.lower() in ['bicycle']:
-                        bici_count += 1 # Incrementar contador de bicicleta
-                    already_counted.add(track_id) # Marcar como contado
-                track_last_positions[int(track_id)] = centroid[1] # Actualizar la última posición
-            elif line_orientation == "vertical": # Si es vertical:
-                prev_pos = track_last_positions.get(int(track_id), None) # Posición anterior
-                if (
-                    prev_pos is not None
-                    and prev_pos > line_left
-                    and centroid[0] <= line_left
-                    and track_id not in already_counted
-                ):
-                    total_count += 1
-                    if class_name.lower() in ['car']:
-                        car_count += 1
-                    elif class_name.lower() in ['person']:
-                        person_count += 1
-                    elif class_name.lower() in ['bicycle']:
-                        bici_count += 1
-                    already_counted.add(track_id)
-                elif (
-                    prev_pos is not None
-                    and prev_pos < line_right
-                    and centroid[0] >= line_right
-                    and track_id not in already_counted
-                ):
-                    total_count += 1
-                    if class_name.lower() in ['car']:
-                        car_count += 1
-                    elif class_name.lower() in ['person']:
-                        person_count += 1
-                    elif class_name.lower() in ['bicycle']:
-                        bici_count += 1
-                    already_counted.add(track_id)
-                track_last_positions[int(track_id)] = centroid[0]
-
-    # Mostrar contadores en el frame
-    cv2.putText(
-        annotated_frame,
-        f"Total: {total_count}",
-        (10, 30),
-        cv2.FONT_HERSHEY_SIMPLEX,
-        1,
-        (0, 0, 255),
-        2,
-    )
-    cv2.putText(
-        annotated_frame,
-        f"Coches: {car_count}",
-        (10, 70),
-        cv2.FONT_HERSHEY_SIMPLEX,
-        0.7,
-        (0, 255, 0),
-        2,
-    )
-    cv2.putText(
-        annotated_frame,
-        f"Personas: {person_count}",
-        (10, 110),
-        cv2.FONT_HERSHEY_SIMPLEX,
-        0.7,
-        (255, 0, 0),
-        2,
-    )
-    cv2.putText(
-        annotated_frame,
-        f"Bicis: {bici_count}",
-        (10, 150),
-        cv2.FONT_HERSHEY_SIMPLEX,
-        0.7,
-        (0, 165, 255),
-        2,
-    )
+        cv2.circle(frame, centroid, 4, (0, 0, 255), -1)
 
-    # Actualizar variables compartidas
-    shared_data["total_count"] = total_count
-    shared_data["car_count"] = car_count
-    shared_data["person_count"] = person_count
-    shared_data["bici_count"] = bici_count
-    shared_data["already_counted"] = already_counted
-    shared_data["track_last_positions"] = track_last_positions
 
-    return annotated_frame, car_count, person_count, bici_count
+# Texto, posición, escala y color de cada contador que se muestra en el frame
+COUNTER_OVERLAYS = (
+    ("Total", "total_count", (10, 30), 1, (0, 0, 255)),
+    ("Coches", "car_count", (10, 70), 0.7, (0, 255, 0)),
+    ("Personas", "person_count", (10, 110), 0.7, (255, 0, 0)),
+    ("Bicis", "bici_count", (10, 150), 0.7, (0, 165, 255)),
+)
+
+
+def draw_counters(frame, shared_data):
+    """Muestra los contadores en el frame"""
+    for label, key, position, scale, color in COUNTER_OVERLAYS:
+        cv2.putText(
+            frame,
+            f"{label}: {shared_data.get(key, 0)}",
+            position,
+            cv2.FONT_HERSHEY_SIMPLEX,
+            scale,
+            color,
+            2,
+        )
@@ -0,0 +1,234 @@
+from itertools import chain
+
+import cv2
+import numpy
+
+ZONE_TYPES = ("line", "polygon")
+LINE_DIRECTIONS = ("both", "forward", "backward")  # forward: del lado negativo al positivo
+POLYGON_DIRECTIONS = ("both", "in", "out")
+
+ZONE_COLOR = (0, 255, 255)  # Color de las líneas y polígonos en el overlay
+
+
+class Zone:
+
+    def __init__(self, name, type, points, direction="both"):
+        """
+        Zona de conteo: una línea (segmento) o un polígono
+
+        Las coordenadas son fracciones del ancho y el alto del frame (0-1), para que
+        la misma configuración sirva a cualquier resolución. En una línea de a a b
+        el lado positivo es el de la derecha según se avanza de a a b (con la y hacia
+        abajo): 'forward' cuenta los cruces del lado negativo al positivo. En un
+        polígono 'in' cuenta las entradas y 'out' las salidas.
+
+        Args:
+            name: Nombre de la zona (aparece en los eventos y en el overlay)
+            type: 'line' o 'polygon'
+            points: [[x, y], ...] (dos puntos en una línea, tres o más en un polígono)
+            direction: Sentido que se cuenta
+        """
+        if type not in ZONE_TYPES:
+            raise ValueError(f"El tipo de la zona {name} debe ser uno de {ZONE_TYPES}")
+        directions = LINE_DIRECTIONS if type == "line" else POLYGON_DIRECTIONS
+        if direction not in directions:
+            raise ValueError(f"El sentido de la zona {name} debe ser uno de {directions}")
+        points = numpy.asarray(points, dtype=numpy.float64)
+        if points.ndim != 2 or points.shape[1] != 2 or len(points) < (2 if type == "line" else 3):
+            raise ValueError(f"Puntos no válidos en la zona {name}")
+        if type == "line" and len(points) != 2:
+            raise ValueError(f"La línea {name} debe tener dos puntos")
+        self.name = name
+        self.type = type
+        self.points = points
+        self.direction = direction
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config["name"], config.get("type", "line"), config["points"], config.get("direction", "both"))
+
+
+class ZoneSet:
+
+    def __init__(self, zones):
+        """
+        Conjunto de zonas de una cámara con su geometría precalculada por resolución
+
+        Args:
+            zones: Lista de Zone
+        """
+        names = [zone.name for zone in zones]
+        if len(set(names)) != len(names):
+            raise ValueError("Los nombres de las zonas deben ser únicos")
+        self.zones = zones
+        self.lines = [zone for zone in zones if zone.type == "line"]
+        self.polygons = [zone for zone in zones if zone.type == "polygon"]
+        self._geometry = {}  # (ancho, alto) -> ZoneGeometry
+
+    @classmethod
+    def from_config(cls, zones_config):
+        """Crea el conjunto a partir de ZONES en model.json"""
+        return cls([Zone.from_config(config) for config in zones_config])
+
+    def geometry(self, width, height):
+        """Geometría en píxeles para una resolución (se calcula una vez)"""
+        key = (width, height)
+        if key not in self._geometry:
+            self._geometry[key] = ZoneGeometry(self, width, height)
+        return self._geometry[key]
+
+
+# Zonas equivalentes a LINE_ORIENTATION: una línea horizontal a 2/3 de la altura que
+# cuenta hacia abajo, o dos verticales a 1/4 y 3/4 del ancho que cuentan hacia fuera
+LEGACY_ZONES = {
+    "horizontal": [
+        {"name": "horizontal", "points": [[0, 2 / 3], [1, 2 / 3]], "direction": "forward"},
+    ],
+    "vertical": [
+        {"name": "left", "points": [[0.25, 0], [0.25, 1]], "direction": "forward"},
+        {"name": "right", "points": [[0.75, 1], [0.75, 0]], "direction": "forward"},
+    ],
+}
+_legacy_zone_sets = {}
+
+
+def legacy_zones(line_orientation):
+    """ZoneSet equivalente a LINE_ORIENTATION ('horizontal' o 'vertical')"""
+    if line_orientation not in LEGACY_ZONES:
+        raise ValueError("line_orientation debe ser 'horizontal' o 'vertical'")
+    if line_orientation not in _legacy_zone_sets:
+        _legacy_zone_sets[line_orientation] = ZoneSet.from_config(LEGACY_ZONES[line_orientation])
+    return _legacy_zone_sets[line_orientation]
+
+
+def points_array(points):
+    """Array N x 2 a partir de una lista de tuplas (x, y); fromiter evita crear un objeto por tupla"""
+    return numpy.fromiter(chain.from_iterable(points), dtype=numpy.float64, count=2 * len(points)).reshape(-1, 2)
+
+
+def _to_pixels(points, size):
+    # Misma conversión que las líneas originales (int(tamaño * fracción)); el margen
+    # evita que 2/3 * 384 = 255.999... quede un píxel por debajo
+    return numpy.floor(points * size + 1e-9)
+
+
+class ZoneGeometry:
+
+    def __init__(self, zone_set, width, height):
+        """Segmentos, polígonos y overlay de las zonas en píxeles para un tamaño de frame"""
+        self.width = width
+        self.height = height
+        scale = numpy.array([width, height], dtype=numpy.float64)
+
+        # Líneas: extremos a y b (L x 2) y sentidos admitidos
+        self.line_names = [zone.name for zone in zone_set.lines]
+        lines = numpy.array([_to_pixels(zone.points, scale) for zone in zone_set.lines]).reshape(-1, 2, 2)
+        self.line_a = lines[:, 0]
+        self.line_b = lines[:, 1]
+        self.line_directions = [
+            {"forward": zone.direction in ("both", "forward"), "backward": zone.direction in ("both", "backward")}
+            for zone in zone_set.lines
+        ]
+        # Normal y desplazamiento de cada línea: el lado de un punto p es p·normal - offset
+        direction = self.line_b - self.line_a
+        self.line_normal = numpy.stack([-direction[:, 1], direction[:, 0]])  # 2 x L
+        self.line_offset = (self.line_a * self.line_normal.T).sum(axis=1)
+
+        # Polígonos: aristas de todos los polígonos juntas, con el polígono de cada una
+        self.polygon_names = [zone.name for zone in zone_set.polygons]
+        self.polygons = [_to_pixels(zone.points, scale) for zone in zone_set.polygons]
+        starts, ends, owners = [], [], []
+        for index, polygon in enumerate(self.polygons):
+            starts.append(polygon)
+            ends.append(numpy.roll(polygon, -1, axis=0))
+            owners.append(numpy.full(len(polygon), index))
+        self.edge_start = numpy.concatenate(starts) if starts else numpy.zeros((0, 2))
+        self.edge_end = numpy.concatenate(ends) if ends else numpy.zeros((0, 2))
+        self.edge_owner = numpy.concatenate(owners) if owners else numpy.zeros(0, dtype=int)
+        self.polygon_directions = [
+            {"in": zone.direction in ("both", "in"), "out": zone.direction in ("both", "out")}
+            for zone in zone_set.polygons
+        ]
+
+        self._build_drawing()
+
+    def _build_drawing(self):
+        """Extremos, vértices y posición de las etiquetas en enteros, calculados una vez"""
+        self.draw_lines = [
+            (tuple(a), tuple(b)) for a, b in zip(self.line_a.astype(int).tolist(), self.line_b.astype(int).tolist())
+        ]
+        self.draw_polygons = []
+        for name, polygon in zip(self.polygon_names, self.polygons):
+            points = polygon.astype(numpy.int32).reshape(-1, 1, 2)
+            x, y = points[:, 0].min(axis=0)
+            self.draw_polygons.append((name, points, (int(x) + 4, int(y) + 18)))
+
+    def draw(self, frame):
+        """Dibuja las zonas sobre el frame (solo se tocan los píxeles de las líneas)"""
+        for a, b in self.draw_lines:
+            cv2.line(frame, a, b, ZONE_COLOR, 2)
+        for name, points, origin in self.draw_polygons:
+            cv2.polylines(frame, [points], True, ZONE_COLOR, 2)
+            cv2.putText(frame, name, origin, cv2.FONT_HERSHEY_SIMPLEX, 0.6, ZONE_COLOR, 2)
+
+    def crossings(self, previous, current):
+        """
+        Cruces contables de todas las zonas por el movimiento de cada punto
+
+        El lado de cada punto respecto a cada línea y su pertenencia a cada polígono
+        se calculan a la vez para todos los puntos y zonas (N x L y N x P); solo los
+        pocos pares que cambian de lado se comprueban uno a uno.
+
+        Args:
+            previous: Posiciones anteriores (N x 2)
+            current: Posiciones actuales (N x 2)
+
+        Returns:
+            Lista de (índice del punto, nombre de la zona, sentido) con sentido
+            'forward' o 'backward' en las líneas e 'in' u 'out' en los polígonos
+        """
+        found = []
+        if len(previous) == 0:
+            return found
+        if self.line_names:
+            side_before = previous @ self.line_normal - self.line_offset
+            side_after = current @ self.line_normal - self.line_offset
+            changed = ((side_before < 0) & (side_after >= 0)) | ((side_before > 0) & (side_after <= 0))
+            if changed.any():
+                for row, line in zip(*numpy.nonzero(changed)):
+                    direction = "forward" if side_before[row, line] < 0 else "backward"
+                    if self.line_directions[line][direction] and self._within(previous[row], current[row], line):
+                        found.append((row, self.line_names[line], direction))
+        if self.polygon_names:
+            before = self.inside_polygons(previous)
+            after = self.inside_polygons(current)
+            changed = before != after
+            if changed.any():
+                for row, polygon in zip(*numpy.nonzero(changed)):
+                    direction = "in" if after[row, polygon] else "out"
+                    if self.polygon_directions[polygon][direction]:
+                        found.append((row, self.polygon_names[polygon], direction))
+        return found
+
+    def _within(self, start, end, line):
+        """Si los extremos de la línea quedan a ambos lados del movimiento (el cruce cae dentro del segmento)"""
+        dx, dy = end - start
+        a_x, a_y = self.line_a[line] - start
+        b_x, b_y = self.line_b[line] - start
+        return (dx * a_y - dy * a_x) * (dx * b_y - dy * b_x) <= 0
+
+    def inside_polygons(self, points):
+        """Máscara N x P de los puntos dentro de cada polígono (regla par-impar vectorizada)"""
+        if len(self.polygon_names) == 0 or len(points) == 0:
+            return numpy.zeros((len(points), len(self.polygon_names)), dtype=bool)
+        x = points[:, 0:1]
+        y = points[:, 1:2]
+        x1, y1 = self.edge_start[None, :, 0], self.edge_start[None, :, 1]
+        x2, y2 = self.edge_end[None, :, 0], self.edge_end[None, :, 1]
+        straddles = (y1 > y) != (y2 > y)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        hits = straddles & (x < x_cross)  # N x aristas
+        counts = numpy.zeros((len(points), len(self.polygon_names)), dtype=int)
+        numpy.add.at(counts.T, self.edge_owner, hits.T.astype(int))
+        return counts % 2 == 1
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from trackers import IoUTracker  # noqa: E402
+
+SPEED = 20  # Píxeles por frame
+SIZE = 40
+
+
+def box(frame):
+    x = 100 + SPEED * frame
+    return [[x, 100, x + SIZE, 100 + SIZE]]
+
+
+@pytest.mark.parametrize("dropped", [1, 4, 10])
+def test_iou_tracker_keeps_id_while_occluded(dropped):
+    tracker = IoUTracker()
+    ids = set()
+    for frame in range(5):
+        ids.update(tracker.update(box(frame), [2], [0.9]).id.tolist())
+    for _ in range(dropped):
+        assert tracker.update([], [], []).id is None
+    # Reaparece donde le lleva su velocidad, lejos de la última caja vista
+    reappeared = tracker.update(box(5 + dropped), [2], [0.9])
+    assert ids == {1.0}
+    assert reappeared.id.tolist() == [1.0]
+
+
+def test_iou_tracker_drops_track_after_buffer():
+    tracker = IoUTracker(track_buffer=3)
+    tracker.update(box(0), [2], [0.9])
+    for _ in range(4):
+        tracker.update([], [], [])
+    assert tracker.update(box(0), [2], [0.9]).id.tolist() == [2.0]
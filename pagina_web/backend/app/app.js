@@ -33,6 +33,14 @@ app.use(bodyParser.urlencoded({ extended: true }));
 app.use(express.static(path.join(__dirname, '../../frontend')));
 app.use('/video', videos); 
 app.use('/videos', express.static(path.join(__dirname, '../videos')));
+// Vídeo en directo en HLS que escribe el detector (LIVE_PATH en video.json)
+const liveDir = process.env.LIVE_DIR || path.join(__dirname, '../live');
+app.use('/live', express.static(liveDir, {
+    setHeaders: (res, filePath) => {
+        // La lista cambia con cada segmento: no se debe cachear
+        if (filePath.endsWith('.m3u8')) res.setHeader('Cache-Control', 'no-cache');
+    }
+}));
 app.use('/gps', gps);
 
 // Ruta para la página index.html
@@ -1,17 +1,31 @@
 let lastGPS = null;
 const TIMEOUT = 10000; // 10 segundos para considerar la coordenada "reciente"
 
+// Acepta una posición ({ latitud, longitud }) o un lote ({ fixes: [...] })
 function saveGPS(req, res) {
-    const { latitud, longitud } = req.body;
+    const fixes = Array.isArray(req.body.fixes) ? req.body.fixes : [req.body];
+    const valid = fixes.filter((fix) => fix && fix.latitud && fix.longitud);
 
-    if (!latitud || !longitud) {
+    if (valid.length === 0) {
         return res.status(400).json({ error: "Missing lat/lon" });
     }
 
-    lastGPS = { latitud, longitud, timestamp: Date.now() };
-    console.log("GPS recibido:", lastGPS);
+    // La última posición del lote es la más reciente. timestamp es la hora de la
+    // posición según el reloj de la Raspberry (sin RTC, puede ir desfasado): solo
+    // se muestra y sirve para ordenar. La frescura se mide con receivedAt, del
+    // reloj del servidor
+    const last = valid[valid.length - 1];
+    const now = Date.now();
+    const timestamp = last.timestamp ? Math.round(last.timestamp * 1000) : now;
+    // Un lote reenviado con posiciones antiguas no pisa la actual; si la actual ya
+    // no es reciente se acepta cualquiera (p. ej. tras corregirse el reloj de la Raspberry)
+    const fresh = lastGPS && now - lastGPS.receivedAt <= TIMEOUT;
+    if (!fresh || timestamp >= lastGPS.timestamp) {
+        lastGPS = { latitud: last.latitud, longitud: last.longitud, timestamp, receivedAt: now };
+    }
+    console.log(`GPS recibido: ${valid.length} posiciones, última:`, lastGPS);
 
-    res.json({ status: "OK" });
+    res.json({ status: "OK", received: valid.length });
 }
 
 // Devuelve la última coordenada solo si es reciente
@@ -21,7 +35,7 @@ function getGPS(req, res) {
     }
 
     const now = Date.now();
-    if (now - lastGPS.timestamp > TIMEOUT) {
+    if (now - lastGPS.receivedAt > TIMEOUT) {
         // La coordenada ya no es reciente → consideramos que no hay datos
         return res.status(404).json({ error: "No recent GPS data" });
     }
@@ -20,150 +20,73 @@ module.exports.get = async (req, res,next) => {
 };
 
 
-// Variables para la grabación de frames
+// Últimas métricas recibidas (se guardan con cada segmento grabado)
 let lastMetricCarCount = 0;
 let lastMetricPersonCount = 0;
 let lastMetricBiciCount = 0;
-let frameCount = 0;
-let frameFiles = [];
-let staleTimer = null;
-const STALE_MS = 30000;
 const ffmpeg = require('fluent-ffmpeg');
 const ffmpegPath = require('ffmpeg-static');
-const ffprobePath = require('ffprobe-static').path;
 ffmpeg.setFfmpegPath(ffmpegPath);
-ffmpeg.setFfprobePath(ffprobePath);
 
 
-// Manejar un frame recibido
+// Manejar un frame recibido: solo se actualizan las métricas. La grabación la
+// hace el detector en segmentos de vídeo (ver registerSegment)
 module.exports.handleFrame = (frameData, metric_car_count, metric_person_count, metric_bici_count) => {
-    // Directorio de uploads
-    const uploadsDir = path.join(__dirname, '../../uploads');
-    // Crea el directorio si no existe
-    if (!fs.existsSync(uploadsDir)) fs.mkdirSync(uploadsDir);
-
-    // Guarda cada frame con nombre secuencial
-    const filePath = path.join(uploadsDir, `frame_${String(frameCount).padStart(5, '0')}.jpg`);
-    // Escribe el archivo en el sistema
-    fs.writeFileSync(filePath, Buffer.from(frameData.replace(/^data:image\/jpeg;base64,/, ''), 'base64'));
-    // Agrega el archivo a la lista
-    frameFiles.push(filePath);
-    // Incrementa el contador de frames
-    frameCount++;
+    module.exports.handleMetrics(metric_car_count, metric_person_count, metric_bici_count);
+};
 
-    // Actualiza el conteo
+// Manejar solo las métricas (el detector no sube frames)
+module.exports.handleMetrics = (metric_car_count, metric_person_count, metric_bici_count) => {
     lastMetricCarCount = metric_car_count;
     lastMetricPersonCount = metric_person_count;
     lastMetricBiciCount = metric_bici_count;
-
-    if (staleTimer) clearTimeout(staleTimer);
-    // Si no llegan nuevos frames en STALE_MS tiempo guarda el vídeo
-    staleTimer = setTimeout(async () => {
-    const tempPath = await exports.framesToVideo();
-    if (tempPath) {
-        await exports.registerVideo(tempPath);
-    }
-}, STALE_MS);
 };
 
-// Función para guardar el vídeo a partir de los frames capturados
-module.exports.framesToVideo = async () => {
-    if (frameFiles.length === 0) return null;
-    const uploadsDir = path.join(__dirname, '../../uploads');
-    const fileName = `video_${Date.now()}.avi`;
-    const relativePath = path.join('uploads', fileName);
-    const inputPattern = path.join(uploadsDir, 'frame_%05d.jpg');
+// Registrar un segmento de vídeo grabado por el detector (POST /video/segments)
+module.exports.registerSegment = async (req, res) => {
+    const file = req.files && req.files.video;
+    if (!file) return res.status(400).json({ message: 'No video provided' });
 
-    // Crea el video a partir de los frames
-    await new Promise((resolve, reject) => {
-        ffmpeg(inputPattern)
-            .inputFPS(20)
-            .output(relativePath)
-            .on('end', resolve)
-            .on('error', reject)
-            .run();
-    });
+    const videosDir = path.join(__dirname, '../../videos');
+    if (!fs.existsSync(videosDir)) fs.mkdirSync(videosDir);
+
+    const fileName = path.basename(file.name);
+    const finalPath = path.join(videosDir, fileName);
+    try {
+        if (req.body.codec === 'avc1') {
+            // Ya es H.264: se guarda tal cual
+            await file.mv(finalPath);
+        } else {
+            // Otro códec (p. ej. mp4v): una sola conversión a H.264 para el navegador
+            const tempPath = path.join(videosDir, `tmp_${fileName}`);
+            await file.mv(tempPath);
+            await new Promise((resolve, reject) => {
+                ffmpeg(tempPath)
+                    .output(finalPath)
+                    .videoCodec('libx264')
+                    .on('end', resolve)
+                    .on('error', reject)
+                    .run();
+            });
+            fs.unlinkSync(tempPath);
+        }
+    } catch (err) {
+        console.error('Error guardando el segmento:', err);
+        return res.status(500).json({ message: 'Error saving segment' });
+    }
 
-    // "Guarda" el video en la base de datos
+    const start = Number(req.body.start);
+    const end = Number(req.body.end);
     const video = await Video.create({
         nombre: fileName,
-        fecha_hora: new Date(),
+        fecha_hora: Number.isFinite(start) ? new Date(start * 1000) : new Date(),
         metrica_coches: lastMetricCarCount,
         metrica_personas: lastMetricPersonCount,
         metrica_bici: lastMetricBiciCount,
-        duracion: 0,
-        ruta_archivo: relativePath,
-        procesado: false
-    });
-
-    // Limpia los frames temporales
-    for (let i = 0; i < frameCount; i++) {
-        const f = path.join(uploadsDir, `frame_${String(i).padStart(5, '0')}.jpg`);
-        if (fs.existsSync(f)) fs.unlinkSync(f);
-    }
-    frameFiles = [];
-    frameCount = 0;
-
-    return relativePath;
-};
-
-
-module.exports.registerVideo = async (outputPath) => {
-     const fileName = path.basename(outputPath);
-    const videosDir = path.join(__dirname, '../../videos');
-    const relativePath = path.join('videos', fileName.replace('.avi', '.mp4'));
-    const finalPath = path.join(videosDir, fileName.replace('.avi', '.mp4'));
-
-    // Crea el directorio si no existe
-    if (!fs.existsSync(videosDir)) fs.mkdirSync(videosDir);
-
-    // Convierte a MP4
-    await new Promise((resolve, reject) => {
-        ffmpeg(path.join(__dirname, '../../', outputPath))
-            .output(finalPath)
-            .videoCodec('libx264')
-            .on('end', resolve)
-            .on('error', reject)
-            .run();
+        duracion: Number.isFinite(end - start) ? Math.round(end - start) : 0,
+        ruta_archivo: path.join('videos', fileName),
+        procesado: 1
     });
-
-    // Borra el archivo temporal
-    fs.unlinkSync(path.join(__dirname, '../../', outputPath));
-
-    // Usa la ruta absoluta para ffprobe
-    const absolutePath = path.resolve(finalPath);
-
-    // Verifica que el archivo existe y no está vacío
-    if (!fs.existsSync(absolutePath) || fs.statSync(absolutePath).size === 0) {
-        console.error('El archivo de vídeo no existe o está vacío:', absolutePath);
-        return;
-    }
-
-    const duracion = await getVideoDuration(absolutePath);
-
-    // Busca el vídeo por nombre
-    const video = await Video.findOne({ where: { nombre: fileName } });
-    if (video) {
-        video.nombre = fileName.replace('.avi', '.mp4');
-        video.duracion = duracion;
-        video.ruta_archivo = relativePath;
-        video.procesado = 1;
-        await video.save();
-        console.log('Vídeo actualizado en la base de datos:', relativePath);
-    } else {
-        console.warn('No se encontró el registro del vídeo para actualizar.');
-    }
+    console.log('Segmento registrado en la base de datos:', video.ruta_archivo);
+    res.status(201).json(video);
 };
-
-
-// Función auxiliar para obtener la duración del video
-async function getVideoDuration(filePath) {
-    return new Promise((resolve, reject) => {
-        ffmpeg.ffprobe(filePath, (err, metadata) => {
-            if (err) return reject(err);
-            resolve(Math.round(metadata.format.duration)); // duración en segundos
-        });
-    });
-}
-
-
@@ -1,4 +1,5 @@
 const express = require('express');
+const fileUpload = require('express-fileupload'); // Para recibir los segmentos grabados
 const router = express.Router();
 const videoController = require('../controllers/video.controller.js'); 
 let io = null;
@@ -15,16 +16,24 @@ function setSocket(socketIo) {
 // Rutas REST para videos
 router.get('/', videoController.getAll);       // Obtener todos los videos
 router.get('/:id', videoController.get);      // Obtener video por ID
+router.post('/segments', fileUpload(), videoController.registerSegment); // Segmento grabado por el detector
 
 router.post('/', async (req, res) => {
     const { frame, metric_car_count, metric_person_count, metric_bici_count } = req.body;
     console.log('Recibido:', { frame: !!frame, metric_car_count, metric_person_count, metric_bici_count }); // Muestra si llega el dato
-    if (!frame) return res.status(400).json({ message: 'No frame provided' });
+    // Sin frame se aceptan solo métricas (modo de subida "metadata" del detector)
+    const hasMetrics = [metric_car_count, metric_person_count, metric_bici_count].some(v => v !== undefined);
+    if (!frame && !hasMetrics) return res.status(400).json({ message: 'No frame or metrics provided' });
 
-    // Emitir con el nombre de evento que el frontend ya espera: "frame"
     if (io) {
-        io.emit('frame', { frame, metric_car_count, metric_person_count, metric_bici_count });
-        videoController.handleFrame(frame, metric_car_count, metric_person_count, metric_bici_count); //Llama al controlador para guardar frame
+        if (frame) {
+            // Emitir con el nombre de evento que el frontend ya espera: "frame"
+            io.emit('frame', { frame, metric_car_count, metric_person_count, metric_bici_count });
+            videoController.handleFrame(frame, metric_car_count, metric_person_count, metric_bici_count); //Llama al controlador para actualizar las métricas
+        } else {
+            io.emit('metrics', { metric_car_count, metric_person_count, metric_bici_count });
+            videoController.handleMetrics(metric_car_count, metric_person_count, metric_bici_count);
+        }
         return res.sendStatus(200);
     } else {
         // Si no hay socket conectado al servidor todavía, devolver 503